@@ -1,15 +1,62 @@
 # admin_utils.py
 
-from telegram import Update
+import threading
+import time
+from telegram import ParseMode, Update
 from telegram.ext import CallbackContext
-from report_generator import ReportGenerator
-from config import ADMIN_IDS
+from report_jobs import CANCELLED, DONE, ReportJob, ReportJobQueue
+from report_scheduler import ReportScheduler
+from report_store import ReportArtifactStore
+from telegram_files import TelegramFileCache
+from quick_summary import build_quick_summary
+from report_progress import ReportCancelled
+from live_summary import CHANNEL_SECTION_TITLES, LiveSummary
+from database import PERIOD_MAPPING, date_range_to_epoch
+from ollama_health import OllamaHealth
+from metrics import metrics, read_exported
+from config import ADMIN_IDS, REPORT_SETTINGS, REPORT_WORKERS
 import logging
 
-# Инициализация генератора отчетов
-report_generator = ReportGenerator()
 logger = logging.getLogger(__name__)
 
+# Генератор отчетов (pandas, matplotlib, пул графиков) создаётся при первом
+# использовании или фоновым прогревом, чтобы не задерживать запуск бота
+_report_generator = None
+_report_generator_lock = threading.Lock()
+ollama_health = OllamaHealth()
+# Кэш готовых отчётов общий для генератора и быстрой выдачи в /report
+report_store = ReportArtifactStore()
+# Отчёт, уже загруженный в Telegram, повторно отправляется по file_id
+telegram_files = TelegramFileCache()
+
+def get_report_generator():
+    """Ленивая инициализация генератора отчетов"""
+    global _report_generator
+    with _report_generator_lock:
+        if _report_generator is None:
+            started = time.perf_counter()
+            if REPORT_WORKERS["processes"]:
+                # Сборка в отдельных процессах (run_all.py): тяжёлые модули боту не нужны
+                from report_worker import RemoteReportGenerator
+                _report_generator = RemoteReportGenerator()
+            else:
+                from report_generator import ReportGenerator
+                _report_generator = ReportGenerator(store=report_store)
+            logger.info(f"Генератор отчетов готов за {time.perf_counter() - started:.2f} с")
+        return _report_generator
+
+def _warm_up() -> None:
+    """Импорт генератора отчётов и загрузка модели в Ollama до первого /report"""
+    get_report_generator().warm_up()
+
+def start_background_services(job_queue=None) -> None:
+    """Фоновая проверка Ollama, плановая сборка отчётов и (по настройке) прогрев генератора и модели"""
+    ollama_health.start()
+    if job_queue is not None:
+        report_scheduler.start(job_queue)
+    if REPORT_SETTINGS["warm_up"]:
+        threading.Thread(target=_warm_up, name="report-warm-up", daemon=True).start()
+
 def is_admin(user_id: int) -> bool:
     """Проверяет, является ли пользователь администратором"""
     return user_id in ADMIN_IDS
@@ -23,7 +70,12 @@ def admin_help(update: Update, context: CallbackContext):
     update.message.reply_text(
         "🔐 Админ-команды:\n"
         "/report <период> — отчёт (daily/week/month/year)\n"
+        "/quick [период] — мгновенная сводка с изменением к прошлому периоду\n"
         "/report_range <начало> <конец> — отчёт за диапазон дат\n"
+        "/report_channels <период> | <начало> <конец> — сравнение каналов\n"
+        "/jobs — очередь сборки отчётов\n"
+        "/cancel — отменить ожидаемые отчёты\n"
+        "/stats — время этапов и счётчики\n"
         "/admin — список команд"
     )
 
@@ -36,6 +88,63 @@ def _check_admin_access(func):
         return func(update, context)
     return wrapper
 
+def _deliver_report(job: ReportJob) -> None:
+    """Отправляет готовый отчёт (или ошибку) всем, кто его ждал"""
+    metrics.observe("report_job_queued", job.started - job.created)
+    metrics.observe("report_job_run", job.finished - job.started)
+    metrics.inc({DONE: "report_jobs_done", CANCELLED: "report_jobs_cancelled"}.get(job.status, "report_jobs_failed"))
+    for bot, chat_id in job.subscribers:
+        try:
+            if job.status == DONE:
+                telegram_files.send_document(bot, chat_id, job.result)
+            elif isinstance(job.error, ValueError):
+                bot.send_message(chat_id=chat_id, text=f"⚠️ Ошибка входных данных: {job.error}")
+            else:
+                bot.send_message(chat_id=chat_id, text=f"❌ Ошибка генерации отчета (задача #{job.id})")
+        except Exception as e:
+            logger.error(f"Не удалось доставить отчёт #{job.id} в чат {chat_id}: {e}")
+    if job.status == CANCELLED:
+        logger.info(f"Report job #{job.id} cancelled")
+    elif isinstance(job.error, ValueError):
+        logger.error(f"Validation error in report job #{job.id}: {job.error}")
+    elif job.error is not None:
+        logger.critical(f"Report job #{job.id} failed: {job.error}", exc_info=job.error)
+
+# Сборка идёт в пуле потоков, обработчики команд только ставят задачи
+report_jobs = ReportJobQueue(on_finish=_deliver_report)
+report_scheduler = ReportScheduler(report_jobs, report_store, get_report_generator)
+
+def _with_live_summary(build, sections=None):
+    """
+    Оборачивает сборку отчёта: текст LLM-разделов по мере генерации
+    показывается получателям в «живой» сводке, итог дописывается в неё же
+    """
+    def run(job: ReportJob) -> str:
+        live = LiveSummary(job.id, job.subscribers, sections=sections)
+        job.progress.subscribe(live.on_section)
+        try:
+            result = build(job.progress)
+        except ReportCancelled:
+            live.finish(f"🛑 Отчёт #{job.id} отменён")
+            raise
+        except Exception:
+            live.finish(f"❌ Отчёт #{job.id}: ошибка сборки")
+            raise
+        live.finish(f"✅ Отчёт #{job.id} готов, документ — следующим сообщением")
+        return result
+    return run
+
+def _enqueue_report(update: Update, context: CallbackContext, key, description: str, build, sections=None) -> None:
+    job, joined = report_jobs.submit(
+        key, description, _with_live_summary(build, sections), (context.bot, update.effective_chat.id))
+    metrics.inc("report_requests_joined" if joined else "report_requests")
+    if joined:
+        update.message.reply_text(f"⏳ Такой отчёт уже собирается (задача #{job.id}), пришлю его, как только будет готов.")
+    else:
+        update.message.reply_text(f"⏳ Задача #{job.id} принята: {description}. Отчёт придёт отдельным сообщением.")
+    if ollama_health.available is False:
+        update.message.reply_text("⚠️ Ollama сейчас недоступна: текстовые разделы отчёта могут быть заменены заглушками.")
+
 @_check_admin_access
 def generate_admin_report(update: Update, context: CallbackContext):
     """Генерация периодического отчета"""
@@ -44,17 +153,42 @@ def generate_admin_report(update: Update, context: CallbackContext):
         return
 
     period = context.args[0].lower()
-    try:
-        # Используем метод класса ReportGenerator
-        path = report_generator.generate_report(period)
-        with open(path, "rb") as doc:
-            update.message.reply_document(document=doc)
-    except ValueError as ve:
-        update.message.reply_text(f"⚠️ Ошибка входных данных: {ve}")
-        logger.error(f"Validation error: {ve}")
-    except Exception as e:
-        update.message.reply_text("❌ Ошибка генерации отчета")
-        logger.critical(f"Report generation failed: {e}", exc_info=True)
+    if period not in PERIOD_MAPPING:
+        update.message.reply_text(f"⚠️ Ошибка входных данных: Недопустимый период: {period}")
+        return
+
+    # Свежий заранее собранный отчёт отдаём сразу, без очереди
+    prebuilt = report_scheduler.fresh(period)
+    if prebuilt is not None:
+        path, entry = prebuilt
+        metrics.inc("report_requests_prebuilt")
+        age = int(time.time() - entry["created"]) // 60
+        telegram_files.send_document(
+            context.bot, update.effective_chat.id, path,
+            caption=f"📄 Готовый отчёт за период {period} (собран {age} мин назад)"
+        )
+        return
+
+    _enqueue_report(
+        update, context,
+        key=("period", period),
+        description=f"отчёт за период {period}",
+        build=lambda progress: get_report_generator().generate_report(period, progress)
+    )
+
+@_check_admin_access
+def quick_summary(update: Update, context: CallbackContext):
+    """Мгновенная сводка за период по предагрегатам: без графиков, LLM и docx"""
+    period = context.args[0].lower() if context.args else "daily"
+    if period not in PERIOD_MAPPING:
+        update.message.reply_text(f"⚠️ Ошибка входных данных: Недопустимый период: {period}")
+        return
+
+    text, sparkline = build_quick_summary(period)
+    if sparkline is not None:
+        update.message.reply_photo(photo=sparkline, caption=text, parse_mode=ParseMode.HTML)
+    else:
+        update.message.reply_text(text, parse_mode=ParseMode.HTML)
 
 @_check_admin_access
 def generate_range_report(update: Update, context: CallbackContext):
@@ -65,13 +199,77 @@ def generate_range_report(update: Update, context: CallbackContext):
 
     start_date, end_date = context.args
     try:
-        # Используем метод класса ReportGenerator
-        path = report_generator.generate_report_by_date_range(start_date, end_date)
-        with open(path, "rb") as doc:
-            update.message.reply_document(document=doc)
+        date_range_to_epoch(start_date, end_date)
     except ValueError as ve:
         update.message.reply_text(f"⚠️ Некорректные даты: {ve}")
         logger.warning(f"Date validation failed: {ve}")
-    except Exception as e:
-        update.message.reply_text("❌ Ошибка генерации отчета")
-        logger.critical(f"Range report failed: {e}", exc_info=True)
+        return
+
+    _enqueue_report(
+        update, context,
+        key=("range", start_date, end_date),
+        description=f"отчёт {start_date} — {end_date}",
+        build=lambda progress: get_report_generator().generate_report_by_date_range(start_date, end_date, progress)
+    )
+
+@_check_admin_access
+def generate_channels_report(update: Update, context: CallbackContext):
+    """Сравнительный отчёт по всем каналам за период или диапазон дат"""
+    if len(context.args) == 1:
+        period = context.args[0].lower()
+        if period not in PERIOD_MAPPING:
+            update.message.reply_text(f"⚠️ Ошибка входных данных: Недопустимый период: {period}")
+            return
+        key, description = ("channels", period), f"сравнение каналов за период {period}"
+        build = lambda progress: get_report_generator().generate_channels_report(period, progress)
+    elif len(context.args) == 2:
+        start_date, end_date = context.args
+        try:
+            date_range_to_epoch(start_date, end_date)
+        except ValueError as ve:
+            update.message.reply_text(f"⚠️ Некорректные даты: {ve}")
+            return
+        key, description = ("channels", start_date, end_date), f"сравнение каналов {start_date} — {end_date}"
+        build = lambda progress: get_report_generator().generate_channels_report_by_date_range(start_date, end_date, progress)
+    else:
+        update.message.reply_text(
+            "⚠️ Использование: /report_channels <период> или /report_channels <начало> <конец>\nФормат дат: YYYY-MM-DD")
+        return
+
+    _enqueue_report(update, context, key=key, description=description, build=build, sections=CHANNEL_SECTION_TITLES)
+
+@_check_admin_access
+def show_jobs(update: Update, context: CallbackContext):
+    """Состояние очереди сборки отчётов"""
+    active, finished = report_jobs.snapshot()
+    lines = [f"🧾 Очередь отчётов (воркеров: {report_jobs.workers})", ollama_health.describe()]
+    if _report_generator is not None:
+        lines.append(_report_generator.describe())
+    lines.append("Активные:" if active else "Активных задач нет.")
+    lines += [f"• {job.describe()}" for job in active]
+    if finished:
+        lines.append("Недавние:")
+        lines += [f"• {job.describe()}" for job in reversed(finished)]
+    update.message.reply_text("\n".join(lines))
+
+@_check_admin_access
+def cancel_report(update: Update, context: CallbackContext):
+    """Отмена ожидаемых в этом чате отчётов"""
+    jobs = report_jobs.cancel((context.bot, update.effective_chat.id))
+    if not jobs:
+        update.message.reply_text("Нет отчётов, ожидающих отправки в этот чат.")
+        return
+    lines = ["🛑 Отменено:"]
+    for job in jobs:
+        note = "сборка остановлена" if job.progress.cancelled.is_set() else "ждут другие получатели, сборка продолжается"
+        lines.append(f"• #{job.id} {job.description} — {note}")
+    update.message.reply_text("\n".join(lines))
+
+@_check_admin_access
+def show_stats(update: Update, context: CallbackContext):
+    """Метрики этапов бота и, при включённом экспорте, других процессов"""
+    lines = [metrics.render_text()]
+    for process, values in read_exported(exclude="bot").items():
+        lines.append(f"\n📡 {process}:")
+        lines += [f"• {value}" for value in values] or ["• нет данных"]
+    update.message.reply_text("\n".join(lines)[:4000])
@@ -0,0 +1,111 @@
+# backfill.py
+
+import asyncio
+import logging
+import time
+from typing import Iterable, List, Optional
+
+from telethon import utils
+from telethon.errors import FloodWaitError
+
+from config import BACKFILL_SETTINGS
+from database import get_backfill_checkpoint, make_engagement_row, save_backfill_batch
+from ingestion import message_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveThrottle:
+    """
+    Пауза между запросами истории: удваивается после каждого FloodWait
+    и плавно уменьшается после серии спокойных пачек
+    """
+
+    def __init__(self, settings: dict):
+        self.min_delay = settings["min_delay"]
+        self.max_delay = settings["max_delay"]
+        self.calm_batches = settings["calm_batches"]
+        self.delay = self.min_delay
+        self._calm = 0
+
+    def on_flood(self) -> None:
+        self.delay = min(self.max_delay, max(self.delay * 2, 0.5))
+        self._calm = 0
+
+    def on_batch(self) -> None:
+        self._calm += 1
+        if self._calm >= self.calm_batches and self.delay > self.min_delay:
+            self.delay = max(self.min_delay, self.delay / 2)
+            self._calm = 0
+
+
+async def backfill_channel(client, channel, settings: Optional[dict] = None) -> int:
+    """
+    Догружает историю канала от контрольной точки к новым сообщениям.
+
+    Сообщения идут по возрастанию ID (iter_messages(reverse=True, min_id=...)),
+    пишутся пачками по batch_size одной транзакцией вместе с контрольной
+    точкой. После FloodWait ждём указанное время, увеличиваем паузу между
+    запросами и продолжаем с последней сохранённой точки.
+    """
+    settings = settings or BACKFILL_SETTINGS
+    loop = asyncio.get_running_loop()
+    entity = await client.get_entity(channel)
+    channel_key = str(utils.get_peer_id(entity))
+    last_id = await loop.run_in_executor(None, get_backfill_checkpoint, channel_key)
+    throttle = AdaptiveThrottle(settings)
+    total = 0
+    started = time.monotonic()
+    logger.info(f"Догрузка канала {channel_key} с сообщения {last_id}")
+
+    async def flush(batch: List, batch_last_id: int) -> None:
+        nonlocal last_id, total
+        if batch_last_id <= last_id:
+            return
+        written = await loop.run_in_executor(None, save_backfill_batch, batch, channel_key, batch_last_id)
+        last_id = batch_last_id
+        total += written
+        batch.clear()
+        throttle.on_batch()
+        rate = total / max(time.monotonic() - started, 1e-6)
+        logger.info(f"[{channel_key}] догружено {total} постов (до #{last_id}, {rate:.0f} пост/с, пауза {throttle.delay:.1f} с)")
+
+    while True:
+        batch: List = []
+        batch_last_id = last_id
+        try:
+            async for msg in client.iter_messages(entity, reverse=True, min_id=last_id, wait_time=throttle.delay):
+                batch_last_id = msg.id
+                # Служебные сообщения (закреп, смена названия) метрик не имеют
+                if getattr(msg, "action", None) is None:
+                    views, forwards, replies = message_metrics(msg)
+                    batch.append(make_engagement_row(
+                        post_id=str(msg.id),
+                        likes=views,
+                        comments=replies,
+                        shares=forwards,
+                        channel=channel_key,
+                        date=msg.date.isoformat()
+                    ))
+                if len(batch) >= settings["batch_size"]:
+                    await flush(batch, batch_last_id)
+            await flush(batch, batch_last_id)
+            break
+        except FloodWaitError as e:
+            await flush(batch, batch_last_id)
+            throttle.on_flood()
+            logger.warning(f"[{channel_key}] FloodWait {e.seconds} с, новая пауза {throttle.delay:.1f} с")
+            await asyncio.sleep(e.seconds)
+
+    logger.info(f"Догрузка канала {channel_key} завершена: {total} постов за {time.monotonic() - started:.0f} с")
+    return total
+
+
+async def backfill(client, channels: Iterable, settings: Optional[dict] = None) -> int:
+    """Последовательно догружает историю каналов"""
+    # FloodWait обрабатываем сами (адаптивная пауза), а не встроенным сном Telethon
+    client.flood_sleep_threshold = 0
+    total = 0
+    for channel in channels:
+        total += await backfill_channel(client, channel, settings)
+    return total
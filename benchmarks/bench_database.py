@@ -0,0 +1,94 @@
+# benchmarks/bench_database.py
+"""
+Сравнение скорости вставки и выборки по диапазону дат:
+старый режим (новое соединение на запрос, журнал отката)
+против постоянных соединений в режиме WAL.
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_database --rows 20000
+"""
+
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+
+def _legacy_execute(db_path: str, query: str, params: tuple = (), commit: bool = False):
+    """Поведение execute_query до менеджера соединений"""
+    conn = sqlite3.connect(db_path, timeout=10)
+    try:
+        cursor = conn.execute(query, params)
+        if commit:
+            conn.commit()
+        return cursor.fetchall()
+    finally:
+        conn.close()
+
+
+def _make_rows(count: int):
+    start = datetime(2025, 1, 1)
+    for i in range(count):
+        date = (start + timedelta(minutes=7 * i)).isoformat()
+        yield (str(i), random.randint(0, 5000), random.randint(0, 300), random.randint(0, 100), date, "bench")
+
+
+def _measure(label: str, count: int, func) -> float:
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed if elapsed else float("inf")
+    print(f"{label:<34} {count:>8} оп. за {elapsed:8.3f} с  ({rate:,.0f} оп/с)")
+    return rate
+
+
+def run(rows: int, queries: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench_db_")
+    os.environ["ENGAGEMENT_DB_PATH"] = os.path.join(workdir, "after.db")
+    import database  # путь к БД берётся из окружения при импорте
+
+    legacy_path = os.path.join(workdir, "before.db")
+    _legacy_execute(legacy_path, """
+    CREATE TABLE engagement_data (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        post_id TEXT NOT NULL UNIQUE,
+        likes INTEGER, comments INTEGER, shares INTEGER,
+        date TEXT NOT NULL, channel TEXT NOT NULL
+    )""", commit=True)
+    database.create_engagement_table()
+
+    data = list(_make_rows(rows))
+    insert_sql = ("INSERT OR REPLACE INTO engagement_data "
+                  "(post_id, likes, comments, shares, date, channel) VALUES (?, ?, ?, ?, ?, ?)")
+    range_sql = "SELECT * FROM engagement_data WHERE date BETWEEN ? AND ? ORDER BY date ASC"
+    ranges = []
+    for _ in range(queries):
+        day = datetime(2025, 1, 1) + timedelta(days=random.randint(0, max(rows * 7 // 1440 - 2, 1)))
+        ranges.append((day.date().isoformat(), (day + timedelta(days=1)).date().isoformat()))
+
+    results = {}
+    print("== до: соединение на запрос, rollback journal ==")
+    results["insert_before"] = _measure("insert (по одной строке)", rows, lambda: [
+        _legacy_execute(legacy_path, insert_sql, row, commit=True) for row in data])
+    results["range_before"] = _measure("range query (сутки)", queries, lambda: [
+        _legacy_execute(legacy_path, range_sql, (f"{a}T00:00:00", f"{b}T23:59:59.999")) for a, b in ranges])
+
+    print("== после: постоянное соединение, WAL ==")
+    results["insert_after"] = _measure("insert (по одной строке)", rows, lambda: [
+        database.insert_engagement_data(r[0], r[1], r[2], r[3], r[5], r[4]) for r in data])
+    results["range_after"] = _measure("range query (сутки)", queries, lambda: [
+        database.get_engagement_data_by_range(a, b) for a, b in ranges])
+
+    database.close_all_connections()
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+    run(args.rows, args.queries)
@@ -0,0 +1,64 @@
+# benchmarks/bench_startup.py
+"""
+Время запуска бота до готовности к приёму команд (start_polling):
+ленивая загрузка модулей отчётов против прежней схемы, где
+ReportGenerator создавался при импорте admin_utils (pandas, matplotlib,
+seaborn, пул графиков и проверка Ollama).
+
+Каждый замер — отдельный чистый процесс интерпретатора, сеть Telegram
+не используется (Updater создаётся, но опрос не запускается).
+
+Запуск из корня проекта:
+    python -m benchmarks.bench_startup --repeat 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Фиктивный токен нужного формата: Updater проверяет его синтаксис без сети
+_PROBE = """
+import time
+started = time.perf_counter()
+import config
+config.API_TOKEN = "123456:" + "A" * 35
+import bot
+updater = bot.build_updater()
+if {eager}:
+    import admin_utils
+    admin_utils.ollama_health.check()
+    admin_utils.get_report_generator()
+print(time.perf_counter() - started)
+"""
+
+
+def _measure(eager: bool, workdir: str) -> float:
+    env = dict(os.environ, ENGAGEMENT_DB_PATH=os.path.join(workdir, "startup.db"))
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+    output = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(eager=eager)],
+        cwd=workdir, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def run(repeat: int) -> dict:
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    results = {}
+    for label, eager in (("lazy", False), ("eager", True)):
+        timings = [_measure(eager, workdir) for _ in range(repeat)]
+        results[label] = statistics.median(timings)
+        title = "ленивая загрузка" if not eager else "генератор при импорте"
+        print(f"{title:<24} медиана {results[label] * 1000:8.0f} мс  "
+              f"(мин {min(timings) * 1000:.0f}, макс {max(timings) * 1000:.0f}, запусков {repeat})")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.repeat)
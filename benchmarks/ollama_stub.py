@@ -0,0 +1,119 @@
+# benchmarks/ollama_stub.py
+"""
+Локальная замена Ollama для бенчмарков: POST /api/generate отвечает
+фиксированным текстом после настраиваемой задержки (latency ± jitter),
+GET / — как настоящий сервер ("Ollama is running"). При "stream": true
+(по умолчанию, как в Ollama) ответ идёт NDJSON-потоком по словам,
+задержка распределяется между ними.
+
+Отдельный запуск:
+    python -m benchmarks.ollama_stub --port 18434 --latency 1.5
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+STUB_TEXT = "Синтетический ответ модели для бенчмарка."
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    server: "OllamaStub"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _reply(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self) -> None:
+        self._reply(200, b"Ollama is running", "text/plain")
+
+    def do_POST(self) -> None:
+        if self.path != "/api/generate":
+            self._reply(404, b"not found", "text/plain")
+            return
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        delay = self.server.delay()
+        self.server.count()
+        if request.get("stream", True):
+            self._stream(request, delay)
+            return
+        time.sleep(delay)
+        payload = {
+            "model": request.get("model"),
+            "response": STUB_TEXT,
+            "done": True,
+            "eval_count": len(STUB_TEXT.split()),
+            "eval_duration": int(delay * 1e9)
+        }
+        self._reply(200, json.dumps(payload, ensure_ascii=False).encode("utf-8"), "application/json")
+
+    def _write_chunk(self, data: dict) -> None:
+        line = json.dumps(data, ensure_ascii=False).encode("utf-8") + b"\n"
+        self.wfile.write(f"{len(line):X}\r\n".encode("ascii") + line + b"\r\n")
+        self.wfile.flush()
+
+    def _stream(self, request: dict, delay: float) -> None:
+        # Как Ollama: chunked transfer encoding, одна JSON-строка на чанк
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        words = STUB_TEXT.split(" ")
+        for i, word in enumerate(words):
+            time.sleep(delay / len(words))
+            self._write_chunk({"model": request.get("model"), "response": word if i == 0 else " " + word, "done": False})
+        self._write_chunk({"model": request.get("model"), "response": "", "done": True,
+                           "eval_count": len(words), "eval_duration": int(delay * 1e9)})
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class OllamaStub(ThreadingHTTPServer):
+    """HTTP-заглушка /api/generate; запускается в фоновом потоке"""
+
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.5, jitter: float = 0.0, seed: int = 42):
+        super().__init__(("127.0.0.1", port), _StubHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/api/generate"
+
+    def delay(self) -> float:
+        with self._lock:
+            return max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+
+    def count(self) -> None:
+        with self._lock:
+            self.requests += 1
+
+    def start(self) -> "OllamaStub":
+        threading.Thread(target=self.serve_forever, name="ollama-stub", daemon=True).start()
+        return self
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=18434)
+    parser.add_argument("--latency", type=float, default=0.5, help="задержка ответа, секунд")
+    parser.add_argument("--jitter", type=float, default=0.0, help="разброс задержки, секунд")
+    args = parser.parse_args()
+
+    stub = OllamaStub(args.port, args.latency, args.jitter)
+    print(f"Заглушка Ollama: {stub.url} (задержка {args.latency} ± {args.jitter} с)")
+    stub.serve_forever()
@@ -0,0 +1,249 @@
+# benchmarks/run_suite.py
+"""
+Набор воспроизводимых бенчмарков на синтетических данных:
+
+    insert  — пропускная способность insert_engagement_data / _many;
+    queries — get_engagement_data*, предагрегаты и потоковая статистика;
+    charts  — отрисовка графиков (в потоке, в пуле, с мемоизацией);
+    report  — сквозной generate_report с локальной заглушкой Ollama.
+
+Всё выполняется во временном каталоге (своя БД, кэши отчётов и LLM),
+рабочие данные не затрагиваются. Результаты сохраняются в JSON вместе
+с хэшем коммита, чтобы сравнивать прогоны между версиями.
+
+Запуск из корня проекта:
+    python -m benchmarks.run_suite --rows 200000 --channels 20 --output bench.json
+    python -m benchmarks.run_suite --only queries,charts --compare bench.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from benchmarks.ollama_stub import OllamaStub
+from benchmarks.synthetic_data import generate_rows
+
+SUITES = ["insert", "queries", "charts", "report"]
+
+
+def _timings(func: Callable, repeat: int) -> Dict[str, float]:
+    """Медиана / p95 / минимум времени вызова, миллисекунд"""
+    samples: List[float] = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 3),
+        "min_ms": round(samples[0], 3),
+        "runs": repeat
+    }
+
+
+def _print(name: str, result: dict) -> None:
+    extra = "  ".join(f"{k}={v}" for k, v in result.items() if k not in ("median_ms", "p95_ms", "min_ms", "runs"))
+    if "median_ms" in result:
+        print(f"{name:<40} медиана {result['median_ms']:10.1f} мс  p95 {result['p95_ms']:10.1f} мс  {extra}")
+    else:
+        print(f"{name:<40} {extra}")
+
+
+def bench_insert(args, database) -> dict:
+    results = {}
+    started = time.perf_counter()
+    for batch in generate_rows(args.rows, args.channels, args.span_days, seed=args.seed):
+        database.insert_engagement_data_many(batch)
+    elapsed = time.perf_counter() - started
+    results["insert_many"] = {"rows": args.rows, "seconds": round(elapsed, 3), "rows_per_s": round(args.rows / elapsed)}
+
+    single = min(args.rows, args.single_inserts)
+    now = datetime.now(timezone.utc)
+    started = time.perf_counter()
+    for i in range(single):
+        date = (now - timedelta(minutes=i)).isoformat()
+        database.insert_engagement_data(f"single_{i}", i % 500, i % 30, i % 10, "bench_single", date)
+    elapsed = time.perf_counter() - started
+    results["insert_single"] = {"rows": single, "seconds": round(elapsed, 3), "rows_per_s": round(single / elapsed)}
+    return results
+
+
+def bench_queries(args, database) -> dict:
+    from engagement_stats import EngagementSummary
+
+    results = {}
+    for period in database.PERIOD_MAPPING:
+        rows = len(database.get_engagement_data(period))
+        results[f"get_engagement_data[{period}]"] = dict(
+            _timings(lambda: database.get_engagement_data(period), args.repeat), rows=rows)
+
+    channel = "bench_channel_0"
+    rows = len(database.get_engagement_data("month", channel))
+    results["get_engagement_data[month,channel]"] = dict(
+        _timings(lambda: database.get_engagement_data("month", channel), args.repeat), rows=rows)
+
+    rng = random.Random(args.seed)
+    today = datetime.now(timezone.utc).date()
+    ranges = []
+    for _ in range(args.repeat):
+        start = today - timedelta(days=rng.randint(7, max(args.span_days, 8)))
+        ranges.append((start.isoformat(), (start + timedelta(days=7)).isoformat()))
+    queue = iter(ranges)
+    results["get_engagement_data_by_range[7d]"] = _timings(
+        lambda: database.get_engagement_data_by_range(*next(queue)), args.repeat)
+
+    results["get_rollup_data[year,daily]"] = _timings(
+        lambda: database.get_rollup_data("year", granularity="daily"), args.repeat)
+
+    start_ts, end_ts = database.period_to_epoch("year")
+    results["streaming_summary[year]"] = _timings(
+        lambda: EngagementSummary.from_stream(database.iter_engagement_metrics_between(start_ts, end_ts)),
+        max(1, args.repeat // 5))
+    return results
+
+
+def bench_charts(args, generator) -> dict:
+    from charts import ChartRenderer
+
+    summary, _ = generator._analyze_period("month")
+    results = {}
+    original = generator.charts
+    try:
+        for label, workers in (("charts_inline_cold", 0), ("charts_pool_cold", args.chart_workers)):
+            generator.charts = ChartRenderer(workers=workers, cache_size=0)
+            results[label] = dict(_timings(lambda: generator._render_charts(summary), args.repeat), workers=workers)
+            generator.charts.shutdown()
+        generator.charts = ChartRenderer(workers=0)
+        generator._render_charts(summary)
+        results["charts_memoized"] = _timings(lambda: generator._render_charts(summary), args.repeat)
+    finally:
+        generator.charts = original
+    return results
+
+
+def bench_report(args, generator, stub: OllamaStub) -> dict:
+    from report_store import ReportArtifactStore
+    from config import REPORT_STORE_SETTINGS
+
+    results = {}
+    runs = max(1, args.repeat // 5)
+    for period in args.periods:
+        def cold():
+            # Новый каталог кэша на каждый прогон: отчёт собирается целиком
+            generator.store = ReportArtifactStore(dict(REPORT_STORE_SETTINGS, dir=tempfile.mkdtemp(dir=".")))
+            generator.generate_report(period)
+
+        requests_before = stub.requests
+        results[f"generate_report[{period}]"] = dict(
+            _timings(cold, runs), llm_requests=(stub.requests - requests_before) // runs)
+        results[f"generate_report_cached[{period}]"] = _timings(lambda: generator.generate_report(period), args.repeat)
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _compare(results: dict, baseline_path: str) -> None:
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\n== сравнение с {baseline_path} (коммит {baseline['meta'].get('commit')}) ==")
+    for suite, items in results.items():
+        for name, result in items.items():
+            old = baseline["results"].get(suite, {}).get(name, {})
+            for metric in ("median_ms", "rows_per_s"):
+                if metric in result and old.get(metric):
+                    print(f"{name:<40} {metric:<11} {old[metric]:>12} → {result[metric]:>12}  "
+                          f"(x{result[metric] / old[metric]:.2f})")
+
+
+def run(args) -> dict:
+    suites = args.only.split(",") if args.only else SUITES
+    workdir = tempfile.mkdtemp(prefix="bench_suite_")
+    os.environ["ENGAGEMENT_DB_PATH"] = os.path.join(workdir, "bench.db")
+    os.chdir(workdir)  # кэши отчётов и LLM — относительные пути из config.py
+
+    stub = OllamaStub(latency=args.latency, jitter=args.jitter, seed=args.seed).start()
+    import config
+    config.OLLAMA_API_URL = stub.url  # до импорта report_generator
+    import database  # путь к БД берётся из окружения при импорте
+
+    database.create_engagement_table()
+    results: Dict[str, dict] = {}
+    if "insert" in suites:
+        results["insert"] = bench_insert(args, database)
+    else:
+        for batch in generate_rows(args.rows, args.channels, args.span_days, seed=args.seed):
+            database.insert_engagement_data_many(batch)
+
+    if "queries" in suites:
+        results["queries"] = bench_queries(args, database)
+
+    if "charts" in suites or "report" in suites:
+        from report_generator import ReportGenerator
+        generator = ReportGenerator(use_llm_cache=False)
+        if "charts" in suites:
+            results["charts"] = bench_charts(args, generator)
+        if "report" in suites:
+            results["report"] = bench_report(args, generator, stub)
+        generator.charts.shutdown()
+
+    database.close_all_connections()
+    stub.shutdown()
+    for suite, items in results.items():
+        print(f"== {suite} ==")
+        for name, result in items.items():
+            _print(name, result)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "params": {k: v for k, v in vars(args).items() if k not in ("output", "compare")}
+        },
+        "results": results
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="строк синтетических данных (1k–10M)")
+    parser.add_argument("--channels", type=int, default=20)
+    parser.add_argument("--span-days", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=10, help="повторов каждого замера")
+    parser.add_argument("--single-inserts", type=int, default=2000, help="вставок по одной строке")
+    parser.add_argument("--chart-workers", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.5, help="задержка заглушки Ollama, секунд")
+    parser.add_argument("--jitter", type=float, default=0.1)
+    parser.add_argument("--periods", type=lambda s: s.split(","), default=["daily", "week", "month"])
+    parser.add_argument("--only", help=f"через запятую: {','.join(SUITES)}")
+    parser.add_argument("--output", help="куда сохранить JSON с результатами")
+    parser.add_argument("--compare", help="JSON предыдущего прогона для сравнения")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output) if args.output else None
+    compare = os.path.abspath(args.compare) if args.compare else None
+    report = run(args)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\nРезультаты сохранены: {output}")
+    if compare:
+        _compare(report["results"], compare)
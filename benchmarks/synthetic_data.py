@@ -0,0 +1,90 @@
+# benchmarks/synthetic_data.py
+"""
+Генератор синтетических данных engagement_data для бенчмарков.
+
+Посты равномерно распределены по дням в окне span_days, заканчивающемся
+текущим моментом (чтобы периоды daily/week/month/year были непустыми),
+с суточным профилем публикаций. Лайки — логнормальные с масштабом
+канала, комментарии и репосты коррелируют с лайками.
+
+Запуск из корня проекта (путь к БД обязателен, рабочую базу не трогаем):
+    python -m benchmarks.synthetic_data --db /tmp/bench.db --rows 1000000 --channels 50
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timezone
+from typing import Iterator, List, Tuple
+
+import numpy as np
+
+# Доля публикаций по часам суток (UTC): ночью тихо, пики утром и вечером
+HOUR_WEIGHTS = np.array([
+    1, 1, 1, 1, 1, 2, 4, 6, 8, 8, 7, 6,
+    6, 6, 6, 6, 7, 8, 9, 9, 8, 6, 4, 2
+], dtype=float)
+
+
+def generate_rows(
+    rows: int,
+    channels: int = 10,
+    span_days: int = 400,
+    batch_size: int = 50000,
+    seed: int = 42,
+    end_ts: int = None
+) -> Iterator[List[Tuple]]:
+    """
+    Пачки строк в формате make_engagement_row:
+    (post_id, likes, comments, shares, date, channel, ts)
+    """
+    rng = np.random.default_rng(seed)
+    end_ts = int(end_ts or time.time())
+    first_day = (end_ts - span_days * 86400) // 86400 * 86400
+    channel_names = np.array([f"bench_channel_{i}" for i in range(channels)])
+    channel_scale = rng.uniform(4.0, 7.0, channels)
+    hour_p = HOUR_WEIGHTS / HOUR_WEIGHTS.sum()
+
+    produced = 0
+    while produced < rows:
+        n = min(batch_size, rows - produced)
+        channel_idx = rng.integers(0, channels, n)
+        ts = (first_day + rng.integers(0, span_days, n) * 86400
+              + rng.choice(24, n, p=hour_p) * 3600 + rng.integers(0, 3600, n))
+        ts = np.minimum(ts, end_ts - 1)
+        likes = rng.lognormal(channel_scale[channel_idx], 1.0).astype(np.int64)
+        comments = rng.binomial(likes, 0.03)
+        shares = rng.poisson(likes * 0.01 + 0.5)
+
+        batch = [
+            (str(produced + i), int(l), int(c), int(s),
+             datetime.fromtimestamp(int(t), timezone.utc).isoformat(), str(ch), int(t))
+            for i, (l, c, s, t, ch) in enumerate(zip(likes, comments, shares, ts, channel_names[channel_idx]))
+        ]
+        produced += n
+        yield batch
+
+
+def populate(rows: int, channels: int = 10, span_days: int = 400, seed: int = 42) -> float:
+    """Заполняет базу из ENGAGEMENT_DB_PATH; возвращает время вставки, секунд"""
+    import database  # путь к БД берётся из окружения при импорте
+
+    database.create_engagement_table()
+    started = time.perf_counter()
+    for batch in generate_rows(rows, channels, span_days, seed=seed):
+        database.insert_engagement_data_many(batch)
+    return time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True, help="путь к создаваемой базе")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--channels", type=int, default=10)
+    parser.add_argument("--span-days", type=int, default=400)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    os.environ["ENGAGEMENT_DB_PATH"] = args.db
+    elapsed = populate(args.rows, args.channels, args.span_days, args.seed)
+    print(f"{args.rows} строк, {args.channels} каналов за {elapsed:.1f} с ({args.rows / elapsed:,.0f} строк/с)")
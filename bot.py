@@ -3,10 +3,13 @@
 import logging
 from telegram import Update
 from telegram.ext import Updater, CommandHandler, CallbackContext
-from admin_utils import admin_help, generate_admin_report, generate_range_report
-from database import create_engagement_table
+from admin_utils import (
+    admin_help, cancel_report, generate_admin_report, generate_channels_report, generate_range_report,
+    quick_summary, show_jobs, show_stats, start_background_services
+)
+from database import create_engagement_table, execute_query
+from metrics import start_exporter
 from config import API_TOKEN  # Импорт конфигурации
-import requests 
 # === Логирование ===
 logging.basicConfig(
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
@@ -26,10 +29,9 @@ def start(update: Update, context: CallbackContext) -> None:
         "Формат: /report_range 2025-05-01 2025-05-10\n\n"
         "📅 Все даты указываются в формате YYYY-MM-DD"
     )
-from database import execute_query
 
 def debug_show_data(update: Update, context: CallbackContext):
-    rows = execute_query("SELECT post_id, date, likes, comments, shares FROM engagement_data ORDER BY date DESC LIMIT 10")
+    rows = execute_query("SELECT post_id, date, likes, comments, shares FROM engagement_data ORDER BY ts DESC LIMIT 10")
     if not rows:
         update.message.reply_text("База пуста.")
     else:
@@ -42,7 +44,8 @@ def error_handler(update, context):
     logger.warning(f'⚠️ Ошибка: {context.error}')
 
 # === Главная функция ===
-def main():
+def build_updater() -> Updater:
+    """Инициализация базы и регистрация обработчиков (без тяжёлых модулей отчётов)"""
     # Инициализация базы данных
     create_engagement_table()
 
@@ -55,13 +58,24 @@ def main():
     dp.add_handler(CommandHandler("admin", admin_help))
     dp.add_handler(CommandHandler("report", generate_admin_report, pass_args=True))
     dp.add_handler(CommandHandler("report_range", generate_range_report, pass_args=True))
+    dp.add_handler(CommandHandler("report_channels", generate_channels_report, pass_args=True))
+    dp.add_handler(CommandHandler("quick", quick_summary, pass_args=True))
+    dp.add_handler(CommandHandler("jobs", show_jobs))
+    dp.add_handler(CommandHandler("cancel", cancel_report))
     dp.add_handler(CommandHandler("debug", debug_show_data))
+    dp.add_handler(CommandHandler("stats", show_stats))
 
     # Обработчик ошибок
     dp.add_error_handler(error_handler)
+    return updater
+
+def main():
+    updater = build_updater()
 
-    # Запуск бота
+    # Запуск бота: модули отчётов загружаются уже после начала приёма команд
     updater.start_polling()
+    start_background_services(updater.job_queue)
+    start_exporter("bot")
     updater.idle()
 
 if __name__ == '__main__':
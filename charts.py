@@ -0,0 +1,246 @@
+# charts.py
+
+import hashlib
+import io
+import json
+import logging
+import multiprocessing
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Hashable, Optional, Tuple
+
+import matplotlib
+matplotlib.use("Agg")
+import pandas as pd
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+import seaborn as sns
+
+from config import REPORT_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# Графики рисуются через объектный API Figure/Agg без глобального
+# состояния pyplot, поэтому их можно строить параллельно.
+# На вход — только агрегаты (простые dict/list), чтобы передавать их в процессы.
+
+
+def _new_figure(figsize: Tuple[float, float] = (6.4, 4.8), **subplots) -> Tuple[Figure, object]:
+    fig = Figure(figsize=figsize)
+    FigureCanvasAgg(fig)
+    return fig, fig.subplots(**subplots)
+
+
+def _to_png(fig: Figure) -> bytes:
+    stream = io.BytesIO()
+    fig.savefig(stream, format='png', bbox_inches='tight', dpi=120)
+    return stream.getvalue()
+
+
+def render_metric_comparison(payload: dict) -> bytes:
+    """payload: {"labels": [...], "values": [...]} — средние по метрикам"""
+    fig, ax = _new_figure()
+    sns.barplot(x=payload["labels"], y=payload["values"], hue=payload["labels"], palette="viridis", legend=False, ax=ax)
+    ax.set_title("Сравнение средних показателей")
+    ax.set_ylabel("Количество")
+    return _to_png(fig)
+
+
+def render_correlation_matrix(payload: dict) -> bytes:
+    """payload: {"labels": [...], "values": [[...], ...]} — матрица корреляций"""
+    fig, ax = _new_figure()
+    corr = pd.DataFrame(payload["values"], index=payload["labels"], columns=payload["labels"], dtype=float)
+    sns.heatmap(corr, annot=True, cmap='coolwarm', fmt=".2f", ax=ax)
+    ax.set_title("Корреляция между показателями")
+    return _to_png(fig)
+
+
+def render_weekly_trend(payload: dict) -> bytes:
+    """payload: {"labels": [...], "values": [...]} — сумма лайков по дням недели"""
+    fig, ax = _new_figure()
+    sns.lineplot(x=payload["labels"], y=payload["values"], sort=False, marker='o', ax=ax)
+    ax.set_title("Активность по дням недели")
+    return _to_png(fig)
+
+
+def render_channel_ranking(payload: dict) -> bytes:
+    """payload: {"labels": [...], "values": [...]} — вовлечённость поста по каналам, по убыванию"""
+    fig, ax = _new_figure(figsize=(6.4, max(3.0, 0.28 * len(payload["labels"]) + 1)))
+    ax.barh(payload["labels"][::-1], payload["values"][::-1], color=sns.color_palette("viridis", len(payload["labels"]))[::-1])
+    ax.set_title("Средняя вовлечённость поста по каналам")
+    ax.set_xlabel("Лайки + комментарии + репосты")
+    ax.tick_params(axis="y", labelsize=8)
+    return _to_png(fig)
+
+
+def render_channel_multiples(payload: dict) -> bytes:
+    """
+    payload: {"series": [[канал, [ts, ...], [значение, ...]], ...], "columns": n} —
+    малые графики динамики с общими шкалами для сравнения каналов. По X —
+    сутки от начала окна: подписи дат на каждом из десятков графиков
+    стоили бы больше самой отрисовки
+    """
+    series = payload["series"]
+    columns = min(payload["columns"], len(series))
+    rows = -(-len(series) // columns)
+    origin = min((xs[0] for _, xs, _ in series if xs), default=0)
+    fig, axes = _new_figure(figsize=(2.2 * columns, 1.5 * rows), nrows=rows, ncols=columns,
+                            sharex=True, sharey=True, squeeze=False)
+    for ax, (label, xs, ys) in zip(axes.flat, series):
+        ax.plot([(x - origin) / 86400 for x in xs], ys, linewidth=1)
+        ax.set_title(label, fontsize=8, pad=2)
+        ax.tick_params(labelsize=6)
+    for ax in axes.flat[len(series):]:
+        ax.set_visible(False)
+    for ax in axes[-1]:
+        ax.set_xlabel("сутки", fontsize=6)
+    fig.subplots_adjust(hspace=0.45, wspace=0.15)
+    return _to_png(fig)
+
+
+CHART_RENDERERS = {
+    "metric_comparison": render_metric_comparison,
+    "correlation_matrix": render_correlation_matrix,
+    "weekly_trend": render_weekly_trend,
+    "channel_ranking": render_channel_ranking,
+    "channel_multiples": render_channel_multiples
+}
+
+
+def _render(kind: str, payload: dict) -> bytes:
+    return CHART_RENDERERS[kind](payload)
+
+
+def _warm_up() -> bool:
+    """Прогрев воркера: первый рисунок оплачивает загрузку шрифтов и кэшей"""
+    fig, ax = _new_figure()
+    ax.plot([0, 1], [0, 1])
+    _to_png(fig)
+    return True
+
+
+def fingerprint(kind: str, payload: dict) -> str:
+    """Отпечаток входных агрегатов: одинаковые данные — одинаковый PNG"""
+    data = json.dumps([kind, payload], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class ChartRenderer:
+    """
+    Параллельная отрисовка графиков с мемоизацией.
+
+    При chart_workers > 0 (REPORT_SETTINGS) рисунки строятся в пуле
+    процессов, который создаётся и прогревается один раз. Процессы порождаются через
+    forkserver: fork многопоточного процесса бота мог бы унаследовать чужие
+    захваченные блокировки. Пул, сломанный падением воркера, пересоздаётся,
+    а графики текущего вызова дорисовываются в потоке вызова. Готовые PNG
+    хранятся в LRU-кэше по отпечатку агрегатов. Без forkserver (Windows)
+    используется пул потоков. По умолчанию (chart_workers = 0) графики
+    рисуются в текущем потоке: три рисунка отчёта не окупают передачу
+    данных и PNG между процессами (см. benchmarks/run_suite.py --only charts).
+    """
+
+    def __init__(self, workers: Optional[int] = None, cache_size: int = 128):
+        self.workers = REPORT_SETTINGS["chart_workers"] if workers is None else workers
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._pool: Optional[Executor] = None
+        self._pool_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if self.workers > 0:
+            self._pool = self._create_pool()
+
+    def _create_pool(self) -> Executor:
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            # Сервер один раз импортирует matplotlib, воркеры получают его готовым
+            context.set_forkserver_preload([__name__])
+            pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+        else:
+            pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="charts")
+        for future in [pool.submit(_warm_up) for _ in range(self.workers)]:
+            future.result()
+        logger.info(f"Пул отрисовки графиков готов: {self.workers} воркер(ов)")
+        return pool
+
+    def _replace_broken_pool(self, broken: Executor) -> None:
+        """Упавший воркер ломает весь ProcessPoolExecutor: пул создаётся заново"""
+        with self._pool_lock:
+            if self._pool is not broken:
+                # Уже пересоздан другим потоком
+                return
+            logger.warning("Пул отрисовки графиков сломан, создаётся заново")
+            broken.shutdown(wait=False, cancel_futures=True)
+            try:
+                self._pool = self._create_pool()
+            except Exception as e:
+                logger.error(f"Не удалось пересоздать пул графиков, рисуем в потоке вызова: {e}")
+                self._pool = None
+
+    def _submit(self, pool: Optional[Executor], kind: str, payload: dict) -> Optional[Future]:
+        if pool is None:
+            return None
+        try:
+            return pool.submit(_render, kind, payload)
+        except BrokenProcessPool:
+            self._replace_broken_pool(pool)
+            return None
+
+    def _cached(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            png = self._cache.get(key)
+            if png is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return png
+
+    def _remember(self, key: str, png: bytes) -> None:
+        with self._lock:
+            self._cache[key] = png
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def render_many(self, charts: Dict[Hashable, Tuple[str, dict]]) -> Dict[Hashable, io.BytesIO]:
+        """charts: {имя: (вид графика, агрегаты)} -> {имя: PNG-поток}"""
+        results: Dict[Hashable, bytes] = {}
+        pending = {}
+        pool = self._pool
+        for name, (kind, payload) in charts.items():
+            key = fingerprint(kind, payload)
+            png = self._cached(key)
+            if png is not None:
+                results[name] = png
+            else:
+                pending[name] = (key, kind, payload, self._submit(pool, kind, payload))
+
+        for name, (key, kind, payload, future) in pending.items():
+            png = None
+            if future is not None:
+                try:
+                    png = future.result()
+                except BrokenProcessPool:
+                    self._replace_broken_pool(pool)
+            if png is None:
+                # Без пула или после его поломки
+                png = _render(kind, payload)
+            results[name] = png
+            self._remember(key, png)
+
+        return {name: io.BytesIO(png) for name, png in results.items()}
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "cached": len(self._cache), "workers": self.workers}
+
+    def shutdown(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
@@ -1,51 +1,118 @@
 
-from telethon import TelegramClient, events
-from datetime import datetime
-from database import insert_engagement_data, create_engagement_table
-from config import API_TOKEN
-# === ЗАМЕНИ на своё ===
-api_id = 
-api_hash = ''
-channel = ''  # ID или username канала, например 'my_channel'
-
-# Создание таблицы вовлеченности (если ещё не создана)
-create_engagement_table()
-
-# Инициализация Telethon-клиента
-client = TelegramClient('telethon_session', api_id, api_hash).start(bot_token=API_TOKEN)
-
-
-@client.on(events.NewMessage(chats=channel))
-async def handler(event):
-    msg = event.message
-    post_id = str(msg.id)
-    date = msg.date.isoformat() 
-    
-    # Статистика
-    likes = msg.views or 0
-    shares = msg.forwards or 0
-    comments = msg.replies.replies if msg.replies else 0
-
-    # Запись в базу данных
-    insert_engagement_data(
-        post_id=post_id,
-        likes=likes,
-        comments=comments,
-        shares=shares,
-        channel=str(event.chat_id),
-        date=date
-    )
-    print(f"[✓] Пост {post_id} сохранён ({likes} просмотров, {comments} комментариев, {shares} репостов)")
+import argparse
 import logging
+import signal
+import sys
+from telethon import TelegramClient, events, utils
+from database import create_engagement_table
+from ingestion import WriteBehindBuffer, message_metrics
+from sampler import SnapshotSampler
+from backfill import backfill
+from ingest_writer import RemoteWriter
+from sharding import shard_channels
+from metrics import metrics, start_exporter
+from config import API_TOKEN, TELEGRAM_API_ID, TELEGRAM_API_HASH, COLLECTOR_CHANNELS
+
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - COLLECTOR - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
-logger.info("collector.py успешно запущен")
+
+
+def build_client(worker: int, workers: int, as_bot: bool = True) -> TelegramClient:
+    """Telethon-клиент воркера: у каждого воркера своя сессия"""
+    session = 'telethon_session' if workers == 1 else f'telethon_session_{worker}'
+    client = TelegramClient(session, TELEGRAM_API_ID, TELEGRAM_API_HASH)
+    # История каналов недоступна бот-аккаунтам: догрузке нужна пользовательская сессия
+    return client.start(bot_token=API_TOKEN) if as_bot else client.start()
+
+
+async def channel_keys(client: TelegramClient, channels: list) -> list:
+    """Ключи каналов в базе (peer id, как str(event.chat_id)) для имён и ссылок из настроек"""
+    return [str(utils.get_peer_id(await client.get_entity(channel))) for channel in channels]
+
+
+def run_worker(client: TelegramClient, channels: list, remote_writer: bool) -> None:
+    """Слушает новые посты своих каналов и переснимает метрики недавних"""
+    writer = RemoteWriter() if remote_writer else None
+    if writer:
+        # В многопроцессном режиме все воркеры пишут через единый писатель
+        write_buffer = WriteBehindBuffer(sink=writer.send_engagement).start()
+        sampler = SnapshotSampler(client, write_buffer, snapshot_sink=writer.send_snapshots)
+    else:
+        # Буфер отложенной записи: пачки вместо отдельного коммита на каждый пост
+        write_buffer = WriteBehindBuffer().start()
+        # Повторные замеры метрик: при публикации они почти всегда нулевые
+        sampler = SnapshotSampler(client, write_buffer)
+
+    async def handler(event):
+        msg = event.message
+        post_id = str(msg.id)
+        date = msg.date.isoformat()
+
+        # Статистика
+        likes, shares, comments = message_metrics(msg)
+        metrics.inc("collector_messages")
+
+        # Постановка в очередь на пакетную запись в базу данных
+        write_buffer.add(
+            post_id=post_id,
+            likes=likes,
+            comments=comments,
+            shares=shares,
+            channel=str(event.chat_id),
+            date=date
+        )
+        sampler.track(str(event.chat_id), msg.id, msg.date)
+        print(f"[✓] Пост {post_id} в очереди ({likes} просмотров, {comments} комментариев, {shares} репостов)")
+
+    client.add_event_handler(handler, events.NewMessage(chats=channels))
+
+    # SIGTERM от run_all.py превращаем в штатный выход, чтобы дописать очередь
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    # Только посты своего шарда: остальные замеряют другие воркеры
+    sampler.load_recent(client.loop.run_until_complete(channel_keys(client, channels)))
+    client.loop.create_task(sampler.run())
+    try:
+        client.run_until_disconnected()
+    finally:
+        write_buffer.close()
+        logger.info(f"Очередь записи сброшена: {write_buffer.stats()}")
+        logger.info(f"Статистика замеров: {sampler.stats()}")
+        if writer:
+            writer.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Сборщик метрик постов Telegram-каналов")
+    parser.add_argument("--backfill", action="store_true",
+                        help="догрузить историю каналов (с продолжением от контрольной точки) и выйти")
+    parser.add_argument("--channel", action="append",
+                        help="канал (можно несколько раз), по умолчанию — COLLECTOR_CHANNELS из config.py")
+    parser.add_argument("--worker", type=int, default=0, help="номер воркера (запускается run_all.py)")
+    parser.add_argument("--workers", type=int, default=1, help="всего воркеров")
+    parser.add_argument("--remote-writer", action="store_true",
+                        help="писать через единый процесс ingest_writer.py, а не напрямую в БД")
+    return parser.parse_args()
+
 
 if __name__ == '__main__':
+    args = parse_args()
+    logger.info("collector.py успешно запущен")
+
+    # Создание таблицы вовлеченности (если ещё не создана)
+    create_engagement_table()
+
+    channels = shard_channels(args.channel or COLLECTOR_CHANNELS, args.workers)[args.worker]
+    if not channels:
+        logger.warning(f"Воркеру {args.worker} не назначено ни одного канала")
+        sys.exit(0)
+
     print("📡 Подключаемся к Telegram...")
-    client.start()
-    print(f"✅ Подключено. Ожидаем посты из канала {channel}...\n")
-    client.run_until_disconnected()
+    client = build_client(args.worker, args.workers, as_bot=not args.backfill)
+    if args.backfill:
+        total = client.loop.run_until_complete(backfill(client, channels))
+        print(f"✅ Догрузка завершена: {total} постов")
+        sys.exit(0)
 
-    
-    
+    print(f"✅ Подключено. Ожидаем посты из каналов: {', '.join(map(str, channels))}...\n")
+    start_exporter(f"collector_{args.worker}", port_offset=1 + args.worker)
+    run_worker(client, channels, args.remote_writer)
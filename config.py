@@ -1,15 +1,194 @@
+import os
+
 # API-токен Telegram-бота
 API_TOKEN = ''  # Замените на ваш собственный API токен, полученный через BotFather
 # Добавить:
 ADMIN_IDS = []
+# Telethon-клиент сборщика (https://my.telegram.org)
+TELEGRAM_API_ID = 0
+TELEGRAM_API_HASH = ''
+# Отслеживаемые каналы (ID или username) и число процессов-сборщиков,
+# между которыми run_all.py распределяет каналы
+COLLECTOR_CHANNELS = []
+COLLECTOR_WORKERS = 1
+# Единый писатель в базу для воркеров сборщика (ingest_writer.py)
+INGEST_WRITER = {
+    "address": ("127.0.0.1", 6010),
+    "authkey": b"marketbot-ingest"
+}
+# Процессы сборки отчётов (report_worker.py): бот передаёт им сборку, чтобы
+# нагрузка отчётов распределялась по ядрам. Процесс i слушает порт address + i
+# и экспортирует метрики с port_offset 1 + COLLECTOR_WORKERS + i
+REPORT_WORKERS = {
+    "processes": 0,                  # 0 — отчёты собираются в процессе бота
+    "address": ("127.0.0.1", 6020),
+    "authkey": b"marketbot-reports",
+    "connect_timeout": 3             # Ожидание соединения с процессом, секунд
+}
+# Супервизор процессов (run_all.py)
+SUPERVISOR_SETTINGS = {
+    "backoff_initial": 1.0,    # Задержка первого перезапуска упавшего процесса, секунд
+    "backoff_max": 60.0,       # Предел экспоненциально растущей задержки, секунд
+    "stable_after": 60.0,      # Проработав столько секунд, процесс сбрасывает задержку к начальной
+    "stats_interval": 300,     # Период записи в лог аптайма и ресурсов процессов, секунд (0 — только по SIGUSR1)
+    "stop_timeout": 10         # Ожидание завершения процесса после SIGTERM, секунд
+}
 # Параметры базы данных
-DB_PATH = 'engagement_data.db'  # Путь к базе данных SQLite
+DB_PATH = os.environ.get('ENGAGEMENT_DB_PATH', 'engagement_data.db')  # Путь к базе данных SQLite
+DB_SETTINGS = {
+    "busy_timeout": 10,              # Ожидание блокировки записи, секунд
+    "synchronous": "NORMAL",         # В режиме WAL безопасно и без fsync на каждый коммит
+    "cache_size_kb": 20000,          # Кэш страниц на соединение
+    "mmap_size": 256 * 1024 * 1024,  # Отображение файла БД в память
+    "cached_statements": 256         # Кэш подготовленных выражений
+}
+# Горячие/холодные данные: строки старше hot_days переносятся в помесячные
+# архивы <dir>/engagement_YYYY_MM.db (partitions.py)
+ARCHIVE_SETTINGS = {
+    "dir": "archive",
+    "hot_days": 400,      # Горизонт горячей базы, дней (отчёт за год остаётся в ней целиком)
+    "time": "04:30",      # Ежедневный перенос в писателе (ingest_writer.py), UTC (None — только вручную)
+    "vacuum_hot": False   # Полный VACUUM горячей базы после переноса: держит блокировку записи всё время сжатия
+}
 
 # Настройки генерации отчетов
 OLLAMA_API_URL = "http://localhost:11434/api/generate"
 REPORT_SETTINGS = {
     "author": "Русскоязычный Аналитический Отдел",
     "font": "Times New Roman",
-    "font_size": 12
+    "font_size": 12,
+    "llm_concurrency": 2,     # Одновременных запросов к Ollama (общий лимит; делится между процессами отчётов)
+    "report_deadline": 180,   # Секунд на все LLM-разделы одного отчёта
+    "job_workers": 2,         # Параллельно собираемых отчётов в боте
+    "chart_workers": 0,       # Процессов отрисовки графиков (0 — в текущем потоке, быстрее для трёх рисунков)
+    "stream_chunk_size": 20000,  # Строк в пачке потокового подсчёта статистики
+    "warm_up": True,          # Загрузить генератор отчётов в фоне сразу после старта бота
+    "stream_llm": True,       # Читать ответы Ollama потоком и показывать их в «живой» сводке
+    "live_edit_interval": 3.0, # Минимальный интервал правки «живой» сводки в Telegram, секунд
+    "channels_per_chart": 16,  # Каналов на одном рисунке малых графиков (/report_channels)
+    "llm_channels": 40         # Каналов в сводном промпте сравнения (лучшие и худшие)
+}
+
+# Клиент Ollama для LLM-разделов отчётов (llm_client.py)
+LLM_SETTINGS = {
+    "model": "llama3",
+    "fallback_model": None,       # Меньшая модель на случай медленной основной (например, "llama3.2:3b"; None — без подмены)
+    "options": {"temperature": 0.5, "top_p": 0.9},
+    "num_ctx": 4096,              # Окно контекста модели, токенов
+    # Предел длины ответа по разделам отчёта, токенов
+    "num_predict": {
+        "default": 400,
+        "chart_1": 250,
+        "chart_2": 250,
+        "chart_3": 250,
+        "recommendations": 500,
+        "channels": 600
+    },
+    "keep_alive": "30m",          # Сколько Ollama держит модель в памяти после запроса
+    "warm_up": True,              # Загрузить модель вместе с прогревом генератора
+    "warm_up_timeout": 120,       # Таймаут загрузки модели, секунд
+    "connect_timeout": 3,         # Таймаут соединения, секунд
+    "call_timeout": 60,           # Предел одного запроса (сверху ограничен дедлайном отчёта), секунд
+    "slo_seconds": 40,            # Средняя задержка основной модели, выше которой запросы идут запасной
+    "probe_interval": 300,        # Пока запросы идут запасной, основной — пробный запрос не реже раза в столько секунд
+    "breaker_failures": 3,        # Ошибок подряд до приостановки запросов
+    "breaker_reset": 30           # Пауза перед пробным запросом, секунд
+}
+
+# Заблаговременная сборка стандартных отчётов (report_scheduler.py)
+REPORT_SCHEDULE_SETTINGS = {
+    "enabled": True,
+    "periods": ["daily", "week", "month", "year"],
+    "times": ["03:30"],          # Непиковое время плановой сборки всех периодов, UTC
+    "check_interval": 600,       # Проверка актуальности готовых отчётов, секунд (0 — только по расписанию)
+    "min_changed_rows": 50,      # Значительное изменение: новых/обновлённых строк не меньше
+    "min_changed_ratio": 0.05,   # ...и не меньше этой доли строк окна
+    # Готовый отчёт старше этого отдаётся уже не сразу, а после пересборки, секунд
+    "max_age": {"daily": 3 * 3600, "week": 12 * 3600, "month": 86400, "year": 86400},
+    "push_to": [],               # Чаты, куда рассылаются плановые отчёты (обычно ADMIN_IDS)
+    "push_periods": ["daily"]    # Какие периоды рассылать после плановой сборки
+}
+
+# Быстрая сводка /quick по предагрегатам (без LLM и docx)
+QUICK_SETTINGS = {
+    "sparkline": True,             # Прикладывать PNG-спарклайн вовлечённости
+    "sparkline_size": (3.0, 0.8)   # Размер спарклайна, дюймов (100 dpi)
+}
+
+# Локальная аналитика для промптов: аномалии, лучшие слоты публикаций
+ANALYTICS_SETTINGS = {
+    "window": 30,          # Предыдущих постов (или суток) канала в окне z-score
+    "z_threshold": 3.5,    # Порог робастного z-score для аномалии
+    "top_anomalies": 5,    # Аномалий в дайджесте
+    "best_slots": 3,       # Лучших и худших слотов «день × час» в дайджесте
+    "min_slot_posts": 3    # Минимум постов в слоте, чтобы его оценивать
+}
+
+# Фоновая проверка доступности Ollama (статус не мешает запуску бота)
+OLLAMA_HEALTH_SETTINGS = {
+    "interval": 60,   # Период проверки, секунд
+    "timeout": 3      # Таймаут одной проверки, секунд
+}
+
+
+# Метрики этапов (/stats в боте) и необязательный экспорт в формате Prometheus
+METRICS_SETTINGS = {
+    "dir": None,         # Каталог для файлов <процесс>.prom (None — не писать)
+    "interval": 15,      # Период перезаписи файлов, секунд
+    "http_port": None    # Порт HTTP-эндпоинта бота; сборщик i — порт + 1 + i (None — выключено)
+}
+
+# Пакетная запись данных сборщика (write-behind)
+INGEST_SETTINGS = {
+    "batch_size": 200,       # Сброс при накоплении указанного числа постов
+    "flush_interval": 2.0    # Максимальная задержка записи, секунд
+}
+
+# Повторные замеры метрик недавних постов
+SAMPLER_SETTINGS = {
+    "tick": 30,                  # Период проверки расписания, секунд
+    "requests_per_minute": 20,   # Бюджет запросов get_messages в минуту
+    "batch_size": 100,           # ID в одном запросе (максимум Telegram API)
+    # (возраст поста до, интервал между замерами), секунд.
+    # Старше последней границы пост больше не отслеживается.
+    "schedule": [
+        (6 * 3600, 10 * 60),
+        (24 * 3600, 30 * 60),
+        (3 * 86400, 2 * 3600),
+        (7 * 86400, 6 * 3600),
+        (30 * 86400, 24 * 3600)
+    ]
 }
 
+# Кэш ответов LLM (ключ — хэш модели, параметров и промпта)
+LLM_CACHE_SETTINGS = {
+    "enabled": True,
+    "path": "llm_cache.db",
+    "ttl": 24 * 3600,               # Время жизни ответа, секунд
+    "max_entries": 5000,
+    "max_bytes": 50 * 1024 * 1024   # Суммарный размер ответов
+}
+
+# Кэш готовых отчётов (.docx)
+REPORT_STORE_SETTINGS = {
+    "dir": "reports_cache",
+    "max_bytes": 200 * 1024 * 1024,   # Суммарный размер отчётов
+    "max_age": 7 * 86400,             # Максимальный возраст отчёта, секунд
+    "access_flush_interval": 60       # Как часто время обращений к отчётам записывается в индекс, секунд
+}
+
+# file_id отправленных в Telegram отчётов: повторная отправка без загрузки файла
+TELEGRAM_FILE_CACHE_SETTINGS = {
+    "enabled": True,
+    "path": "telegram_files.db",
+    "ttl": 30 * 86400,      # Время жизни записи, секунд
+    "max_entries": 2000
+}
+
+# Догрузка истории каналов (collector.py --backfill)
+BACKFILL_SETTINGS = {
+    "batch_size": 1000,   # Сообщений в одной транзакции / контрольной точке
+    "min_delay": 0.0,     # Пауза между запросами истории (100 сообщений), секунд
+    "max_delay": 10.0,    # Предел паузы после повторных FloodWait
+    "calm_batches": 5     # Столько пачек без FloodWait — и пауза уменьшается вдвое
+}
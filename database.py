@@ -1,38 +1,423 @@
 # database.py
 
+import heapq
+import itertools
+import os
 import sqlite3
 import logging
-from datetime import datetime
-from typing import List, Optional, Tuple
-from config import DB_PATH
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from operator import itemgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from config import ARCHIVE_SETTINGS, DB_PATH, DB_SETTINGS
+from metrics import metrics
+from partitions import (
+    ARCHIVE_ALIAS, ARCHIVE_TABLE, NOT_HIDDEN_SQL, create_archive_table, iter_archives,
+    list_partitions, month_bounds, overlapping_partitions, partition_path, vacuum_partition
+)
 
 logger = logging.getLogger(__name__)
 
+# Одно долгоживущее соединение на поток: открывать SQLite на каждый запрос
+# дорого, а разделять соединение между потоками небезопасно
+_local = threading.local()
+_connections: List[sqlite3.Connection] = []
+_connections_lock = threading.Lock()
+
+
+def _open_connection() -> sqlite3.Connection:
+    """Открывает соединение в режиме WAL с настроенными PRAGMA"""
+    conn = sqlite3.connect(
+        DB_PATH,
+        timeout=DB_SETTINGS["busy_timeout"],
+        cached_statements=DB_SETTINGS["cached_statements"],
+        check_same_thread=False
+    )
+    # WAL: читатели (бот) не ждут писателя (сборщик) и наоборот
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={DB_SETTINGS['synchronous']}")
+    conn.execute(f"PRAGMA cache_size=-{int(DB_SETTINGS['cache_size_kb'])}")
+    conn.execute(f"PRAGMA mmap_size={int(DB_SETTINGS['mmap_size'])}")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    # Нужно, чтобы INSERT OR REPLACE вызывал триггеры удаления (предагрегаты)
+    conn.execute("PRAGMA recursive_triggers=ON")
+    return conn
+
+
 def connect_db() -> sqlite3.Connection:
-    """Создаёт подключение к SQLite-базе с ожиданием при блокировке"""
-    return sqlite3.connect(DB_PATH, timeout=10)
+    """Возвращает соединение текущего потока (создаёт при первом обращении)"""
+    conn = getattr(_local, "conn", None)
+    # После fork соединение родителя использовать нельзя
+    if conn is None or _local.pid != os.getpid():
+        conn = _open_connection()
+        _local.conn = conn
+        _local.pid = os.getpid()
+        with _connections_lock:
+            _connections.append(conn)
+    return conn
+
+
+def close_db() -> None:
+    """Закрывает соединение текущего потока"""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        return
+    _local.conn = None
+    with _connections_lock:
+        if conn in _connections:
+            _connections.remove(conn)
+    conn.close()
+
+
+def close_all_connections() -> None:
+    """Закрывает соединения всех потоков (при остановке процесса)"""
+    with _connections_lock:
+        connections, _connections[:] = list(_connections), []
+    for conn in connections:
+        try:
+            conn.close()
+        except sqlite3.Error as e:
+            logger.warning(f"Не удалось закрыть соединение: {e}")
+    _local.conn = None
 
 
 def execute_query(query: str, params: tuple = (), commit: bool = False) -> Optional[List[Tuple]]:
     """Выполняет SQL-запрос с параметрами"""
     conn = connect_db()
     cursor = conn.cursor()
+    started = time.perf_counter()
     try:
         cursor.execute(query, params)
         if commit:
             conn.commit()
+        elif conn.in_transaction:
+            # Незафиксированные изменения не должны держать блокировку записи
+            conn.rollback()
         if query.strip().upper().startswith("SELECT"):
             return cursor.fetchall()
         return []
     except sqlite3.Error as e:
         conn.rollback()
+        metrics.inc("db_errors")
+        logger.error(f"SQL error: {e}", exc_info=True)
+        raise RuntimeError(f"Database error: {str(e)}") from e
+    finally:
+        cursor.close()
+        metrics.observe("db_query", time.perf_counter() - started)
+
+def execute_many(query: str, seq_of_params: Iterable[tuple]) -> int:
+    """Выполняет пакетный SQL-запрос в одной транзакции"""
+    conn = connect_db()
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    try:
+        cursor.executemany(query, seq_of_params)
+        conn.commit()
+        metrics.inc("db_rows_written", max(cursor.rowcount, 0))
+        return cursor.rowcount
+    except sqlite3.Error as e:
+        conn.rollback()
+        metrics.inc("db_errors")
         logger.error(f"SQL error: {e}", exc_info=True)
         raise RuntimeError(f"Database error: {str(e)}") from e
     finally:
-        conn.close()
+        cursor.close()
+        metrics.observe("db_write_batch", time.perf_counter() - started)
+
+def to_epoch(date: str) -> int:
+    """
+    Переводит ISO-дату в секунды Unix.
+    Даты без часового пояса (datetime.utcnow) считаются UTC,
+    даты Telethon содержат смещение и учитываются как есть.
+    """
+    dt = datetime.fromisoformat(date)
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def _migration_epoch_ts(conn: sqlite3.Connection) -> None:
+    """Целочисленная метка времени и покрывающие индексы для выборок по периоду"""
+    conn.execute("ALTER TABLE engagement_data ADD COLUMN ts INTEGER")
+    conn.create_function("to_epoch", 1, to_epoch, deterministic=True)
+    conn.execute("UPDATE engagement_data SET ts = to_epoch(date)")
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_engagement_channel_ts
+    ON engagement_data (channel, ts, likes, comments, shares, post_id)
+    """)
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_engagement_ts
+    ON engagement_data (ts, channel, likes, comments, shares, post_id)
+    """)
+
+
+# Предагрегаты по каналу и часу/дню: количество, сумма, сумма квадратов,
+# минимум и максимум по каждой метрике плюс суммы попарных произведений
+# (для корреляции). Поддерживаются триггерами при любой записи в engagement_data.
+ROLLUP_TABLES = {
+    "hourly": ("engagement_rollup_hourly", 3600),
+    "daily": ("engagement_rollup_daily", 86400)
+}
+ROLLUP_METRICS = ("likes", "comments", "shares")
+ROLLUP_PAIRS = (("likes", "comments"), ("likes", "shares"), ("comments", "shares"))
+ROLLUP_COLUMNS = ["channel", "bucket", "posts"] + [
+    f"{metric}_{agg}" for metric in ROLLUP_METRICS for agg in ("sum", "sq", "min", "max")
+] + [f"{a}_{b}" for a, b in ROLLUP_PAIRS]
+
+
+def _rollup_add_sql(table: str, width: int, row: str) -> str:
+    """Добавляет строку row (NEW/OLD) в бакет"""
+    values = [f"{row}.channel", f"{row}.ts - {row}.ts % {width}", "1"]
+    updates = ["posts = posts + 1"]
+    for m in ROLLUP_METRICS:
+        values += [f"{row}.{m}", f"{row}.{m} * {row}.{m}", f"{row}.{m}", f"{row}.{m}"]
+        updates += [
+            f"{m}_sum = {m}_sum + excluded.{m}_sum",
+            f"{m}_sq = {m}_sq + excluded.{m}_sq",
+            f"{m}_min = min({m}_min, excluded.{m}_min)",
+            f"{m}_max = max({m}_max, excluded.{m}_max)"
+        ]
+    for a, b in ROLLUP_PAIRS:
+        values.append(f"{row}.{a} * {row}.{b}")
+        updates.append(f"{a}_{b} = {a}_{b} + excluded.{a}_{b}")
+    return (
+        f"INSERT INTO {table} ({', '.join(ROLLUP_COLUMNS)}) VALUES ({', '.join(values)}) "
+        f"ON CONFLICT (channel, bucket) DO UPDATE SET {', '.join(updates)};"
+    )
+
+
+def _rollup_remove_sql(table: str, width: int, row: str) -> str:
+    """
+    Вычитает строку row (OLD) из бакета. Если удалённое значение было
+    минимумом или максимумом, экстремум пересчитывается по оставшимся
+    строкам бакета (через индекс (channel, ts)). Триггер не видит архивов:
+    бакет из уже перенесённых месяцев помечается в rollup_stale, и его
+    min/max пересчитываются с архивом при следующем переносе
+    (_rebuild_stale_extremes).
+    """
+    bucket = f"{row}.ts - {row}.ts % {width}"
+    scope = f"FROM engagement_data WHERE channel = {row}.channel AND ts >= bucket AND ts < bucket + {width}"
+    updates = ["posts = posts - 1"]
+    for m in ROLLUP_METRICS:
+        updates += [
+            f"{m}_sum = {m}_sum - {row}.{m}",
+            f"{m}_sq = {m}_sq - {row}.{m} * {row}.{m}",
+            f"{m}_min = CASE WHEN {row}.{m} > {m}_min THEN {m}_min ELSE (SELECT MIN({m}) {scope}) END",
+            f"{m}_max = CASE WHEN {row}.{m} < {m}_max THEN {m}_max ELSE (SELECT MAX({m}) {scope}) END"
+        ]
+    for a, b in ROLLUP_PAIRS:
+        updates.append(f"{a}_{b} = {a}_{b} - {row}.{a} * {row}.{b}")
+    where = f"WHERE channel = {row}.channel AND bucket = {bucket}"
+    return (
+        f"UPDATE {table} SET {', '.join(updates)} {where}; "
+        f"DELETE FROM {table} {where} AND posts <= 0; "
+        f"INSERT OR IGNORE INTO rollup_stale (tbl, channel, bucket) "
+        f"SELECT '{table}', {row}.channel, {bucket} "
+        f"WHERE {row}.ts < (SELECT COALESCE(MAX(until), 0) FROM archive_horizon);"
+    )
+
+
+def _drop_rollup_triggers(conn: sqlite3.Connection, *kinds: str) -> None:
+    """Снимает триггеры предагрегатов видов kinds (insert/delete/update)"""
+    for name in ROLLUP_TABLES:
+        for kind in kinds:
+            conn.execute(f"DROP TRIGGER IF EXISTS main.trg_rollup_{name}_{kind}")
+
+
+def _create_rollup_triggers(conn: sqlite3.Connection) -> None:
+    """
+    Триггеры вставки, удаления и обновления. INSERT OR REPLACE удаляет
+    старую строку, и её вычитание из бакета срабатывает только при
+    PRAGMA recursive_triggers=ON (включается в _open_connection).
+    """
+    for name, (table, width) in ROLLUP_TABLES.items():
+        add_new = _rollup_add_sql(table, width, "NEW")
+        remove_old = _rollup_remove_sql(table, width, "OLD")
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_{name}_insert AFTER INSERT ON engagement_data
+        BEGIN {add_new} END
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_{name}_delete AFTER DELETE ON engagement_data
+        BEGIN {remove_old} END
+        """)
+        conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_{name}_update
+        AFTER UPDATE OF likes, comments, shares, ts, channel ON engagement_data
+        BEGIN {remove_old} {add_new} END
+        """)
+
+
+def _migration_rollups(conn: sqlite3.Connection) -> None:
+    """Таблицы часовых/дневных предагрегатов, триггеры и заполнение по истории"""
+    # min/max допускают NULL: бакет на миг пустеет перед удалением
+    metric_columns = ", ".join(
+        f"{col} INTEGER" if col.endswith(("_min", "_max")) else f"{col} INTEGER NOT NULL"
+        for col in ROLLUP_COLUMNS[2:]
+    )
+    for table, width in ROLLUP_TABLES.values():
+        conn.execute(f"""
+        CREATE TABLE IF NOT EXISTS {table} (
+            channel TEXT NOT NULL,
+            bucket INTEGER NOT NULL,
+            {metric_columns},
+            PRIMARY KEY (channel, bucket)
+        ) WITHOUT ROWID
+        """)
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_bucket ON {table} (bucket)")
+        aggregates = ["COUNT(*)"]
+        for m in ROLLUP_METRICS:
+            aggregates += [f"SUM({m})", f"SUM({m} * {m})", f"MIN({m})", f"MAX({m})"]
+        aggregates += [f"SUM({a} * {b})" for a, b in ROLLUP_PAIRS]
+        conn.execute(f"""
+        INSERT INTO {table} ({', '.join(ROLLUP_COLUMNS)})
+        SELECT channel, ts - ts % {width}, {', '.join(aggregates)}
+        FROM engagement_data
+        GROUP BY channel, ts - ts % {width}
+        """)
+    _create_archive_state(conn)
+    _create_rollup_triggers(conn)
+
+
+def _create_archive_state(conn: sqlite3.Connection) -> None:
+    """
+    Граница перенесённых в архив месяцев и бакеты предагрегатов, min/max
+    которых надо пересчитать вместе с архивом
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS archive_horizon (
+        id INTEGER PRIMARY KEY CHECK (id = 0),
+        until INTEGER NOT NULL
+    )
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rollup_stale (
+        tbl TEXT NOT NULL,
+        channel TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        PRIMARY KEY (tbl, channel, bucket)
+    ) WITHOUT ROWID
+    """)
+
+
+def _migration_snapshots(conn: sqlite3.Connection) -> None:
+    """Журнал замеров метрик постов во времени (только добавление)"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS engagement_snapshots (
+        id INTEGER PRIMARY KEY,
+        post_id TEXT NOT NULL,
+        channel TEXT NOT NULL,
+        ts INTEGER NOT NULL,
+        views INTEGER NOT NULL DEFAULT 0,
+        forwards INTEGER NOT NULL DEFAULT 0,
+        replies INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_snapshots_post_ts
+    ON engagement_snapshots (channel, post_id, ts)
+    """)
+
+
+def _migration_backfill_checkpoints(conn: sqlite3.Connection) -> None:
+    """Контрольные точки догрузки истории по каналам"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS backfill_checkpoints (
+        channel TEXT PRIMARY KEY,
+        last_message_id INTEGER NOT NULL,
+        rows INTEGER NOT NULL DEFAULT 0,
+        updated INTEGER NOT NULL
+    )
+    """)
+
+
+def _migration_channel_post_key(conn: sqlite3.Connection) -> None:
+    """
+    Уникальность поста — в пределах канала: ID сообщений в разных каналах
+    пересекаются, и глобальный UNIQUE(post_id) затирал бы чужие посты.
+    SQLite не умеет менять ограничения, поэтому таблица пересоздаётся
+    (предагрегаты не трогаются, триггеры и индексы создаются заново).
+    """
+    conn.execute("""
+    CREATE TABLE engagement_data_new (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        post_id TEXT NOT NULL,
+        likes INTEGER DEFAULT 0 CHECK(likes >= 0),
+        comments INTEGER DEFAULT 0 CHECK(comments >= 0),
+        shares INTEGER DEFAULT 0 CHECK(shares >= 0),
+        date TEXT NOT NULL,
+        channel TEXT NOT NULL,
+        ts INTEGER,
+        UNIQUE (channel, post_id)
+    )
+    """)
+    conn.execute("""
+    INSERT INTO engagement_data_new (id, post_id, likes, comments, shares, date, channel, ts)
+    SELECT id, post_id, likes, comments, shares, date, channel, ts FROM engagement_data
+    """)
+    conn.execute("DROP TABLE engagement_data")
+    conn.execute("ALTER TABLE engagement_data_new RENAME TO engagement_data")
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_engagement_channel_ts
+    ON engagement_data (channel, ts, likes, comments, shares, post_id)
+    """)
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_engagement_ts
+    ON engagement_data (ts, channel, likes, comments, shares, post_id)
+    """)
+    _create_rollup_triggers(conn)
+
+
+def _migration_rollup_stale(conn: sqlite3.Connection) -> None:
+    """
+    Пометка бакетов с min/max, пересчитанными без архива: таблицы
+    состояния архива и триггеры предагрегатов с пометкой создаются заново
+    """
+    _create_archive_state(conn)
+    partitions = list_partitions()
+    if partitions:
+        conn.execute("INSERT OR REPLACE INTO archive_horizon (id, until) VALUES (0, ?)", (partitions[-1][1],))
+    _drop_rollup_triggers(conn, "insert", "delete", "update")
+    _create_rollup_triggers(conn)
+
+
+# Версионированные миграции схемы: (версия, описание, функция).
+# Номер применённой версии хранится в PRAGMA user_version.
+MIGRATIONS = [
+    (1, "ts INTEGER + индексы (channel, ts) и (ts)", _migration_epoch_ts),
+    (2, "часовые и дневные предагрегаты с триггерами", _migration_rollups),
+    (3, "таблица замеров engagement_snapshots", _migration_snapshots),
+    (4, "контрольные точки догрузки истории", _migration_backfill_checkpoints),
+    (5, "уникальность поста в пределах канала", _migration_channel_post_key),
+    (6, "пересчёт min/max предагрегатов вместе с архивом", _migration_rollup_stale),
+]
+
+
+def migrate_db() -> int:
+    """Применяет недостающие миграции, возвращает итоговую версию схемы"""
+    conn = connect_db()
+    for version, description, migration in MIGRATIONS:
+        # BEGIN IMMEDIATE сериализует миграции между процессами (бот и сборщик)
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            current = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version <= current:
+                conn.rollback()
+                continue
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+            logger.info(f"Миграция схемы {version} применена: {description}")
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.error(f"Ошибка миграции {version}: {e}", exc_info=True)
+            raise RuntimeError(f"Database migration error: {str(e)}") from e
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
 
 def create_engagement_table() -> None:
-    """Создаёт таблицу вовлеченности (если не существует)"""
+    """Создаёт таблицу вовлеченности (если не существует) и применяет миграции"""
     query = """
     CREATE TABLE IF NOT EXISTS engagement_data (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -45,29 +430,298 @@ def create_engagement_table() -> None:
     )
     """
     execute_query(query, commit=True)
-    logger.info("Таблица engagement_data инициализирована")
+    version = migrate_db()
+    logger.info(f"Таблица engagement_data инициализирована (схема v{version})")
 
-def insert_engagement_data(
+INSERT_ENGAGEMENT_SQL = """
+INSERT OR REPLACE INTO engagement_data 
+(post_id, likes, comments, shares, date, channel, ts)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+def make_engagement_row(
     post_id: str,
     likes: int,
     comments: int,
     shares: int,
     channel: str,
     date: str = None
-) -> None:
-    """Вставляет запись о вовлечённости с валидацией"""
+) -> Tuple:
+    """Валидирует значения и собирает строку для вставки в engagement_data"""
     if any(not isinstance(val, int) or val < 0 for val in [likes, comments, shares]):
         raise ValueError("Значения должны быть неотрицательными целыми числами")
-    
+
     date = date or datetime.utcnow().isoformat()
-    query = """
-    INSERT OR REPLACE INTO engagement_data 
-    (post_id, likes, comments, shares, date, channel)
-    VALUES (?, ?, ?, ?, ?, ?)
-    """
-    execute_query(query, (post_id, likes, comments, shares, date, channel), commit=True)
+    return (post_id, likes, comments, shares, date, channel, to_epoch(date))
+
+def insert_engagement_data(
+    post_id: str,
+    likes: int,
+    comments: int,
+    shares: int,
+    channel: str,
+    date: str = None
+) -> None:
+    """Вставляет запись о вовлечённости с валидацией"""
+    row = make_engagement_row(post_id, likes, comments, shares, channel, date)
+    execute_query(INSERT_ENGAGEMENT_SQL, row, commit=True)
     logger.debug(f"Данные добавлены: post_id={post_id}")
 
+def insert_engagement_data_many(rows: Iterable[Tuple]) -> int:
+    """
+    Пакетно вставляет записи одной транзакцией.
+    Каждая строка: (post_id, likes, comments, shares, date, channel, ts),
+    как её возвращает make_engagement_row.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    execute_many(INSERT_ENGAGEMENT_SQL, rows)
+    logger.debug(f"Пакетно добавлено записей: {len(rows)}")
+    return len(rows)
+
+def get_backfill_checkpoint(channel: str) -> int:
+    """ID последнего догруженного сообщения канала (0 — догрузки не было)"""
+    rows = execute_query("SELECT last_message_id FROM backfill_checkpoints WHERE channel = ?", (channel,))
+    return rows[0][0] if rows else 0
+
+def save_backfill_batch(rows: Iterable[Tuple], channel: str, last_message_id: int) -> int:
+    """
+    Записывает пачку истории и продвигает контрольную точку канала
+    в одной транзакции: после сбоя догрузка продолжится ровно с неё
+    """
+    rows = list(rows)
+    conn = connect_db()
+    cursor = conn.cursor()
+    try:
+        if rows:
+            cursor.executemany(INSERT_ENGAGEMENT_SQL, rows)
+        cursor.execute("""
+        INSERT INTO backfill_checkpoints (channel, last_message_id, rows, updated)
+        VALUES (?, ?, ?, strftime('%s', 'now'))
+        ON CONFLICT (channel) DO UPDATE SET
+            last_message_id = excluded.last_message_id,
+            rows = rows + excluded.rows,
+            updated = excluded.updated
+        """, (channel, last_message_id, len(rows)))
+        conn.commit()
+        return len(rows)
+    except sqlite3.Error as e:
+        conn.rollback()
+        logger.error(f"SQL error: {e}", exc_info=True)
+        raise RuntimeError(f"Database error: {str(e)}") from e
+    finally:
+        cursor.close()
+
+INSERT_SNAPSHOT_SQL = """
+INSERT INTO engagement_snapshots (post_id, channel, ts, views, forwards, replies)
+VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+def insert_snapshots_many(rows: Iterable[Tuple]) -> int:
+    """
+    Пакетно добавляет замеры одной транзакцией.
+    Каждая строка: (post_id, channel, ts, views, forwards, replies)
+    """
+    rows = list(rows)
+    if not rows:
+        return 0
+    execute_many(INSERT_SNAPSHOT_SQL, rows)
+    logger.debug(f"Добавлено замеров: {len(rows)}")
+    return len(rows)
+
+def get_recent_posts(since_ts: int, channels: Optional[Sequence[str]] = None) -> List[Tuple]:
+    """Посты, опубликованные не раньше since_ts: (channel, post_id, ts); channels — только эти каналы"""
+    sql = "SELECT channel, post_id, ts FROM engagement_data WHERE ts >= ?"
+    params = [since_ts]
+    if channels is not None:
+        sql += f" AND channel IN ({', '.join('?' * len(channels))})"
+        params += [str(channel) for channel in channels]
+    return execute_query(sql + " ORDER BY ts ASC", tuple(params))
+
+# Дата отдаётся в едином виде (UTC, без смещения), независимо от того,
+# в каком формате её записал сборщик. Вычисляется из ts, поэтому тот же
+# запрос работает и по архивам, где текстовой даты нет ({table})
+SELECT_ENGAGEMENT_COLUMNS = """
+SELECT id, post_id, likes, comments, shares,
+       strftime('%Y-%m-%dT%H:%M:%S', ts, 'unixepoch') AS date, channel
+FROM {table}
+"""
+
+PERIOD_MAPPING = {
+    "daily": (timedelta(days=1), "day"),
+    "week": (timedelta(days=7), "week"),
+    "month": (timedelta(days=30), "month"),
+    "year": (timedelta(days=365), "year")
+}
+
+
+def date_range_to_epoch(start_date: str, end_date: str) -> Tuple[int, int]:
+    """
+    Переводит диапазон дат YYYY-MM-DD (включительно) в полуинтервал
+    [начало start_date, начало следующего за end_date дня) в секундах UTC
+    """
+    start = datetime.strptime(start_date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    end = datetime.strptime(end_date, "%Y-%m-%d").replace(tzinfo=timezone.utc) + timedelta(days=1)
+    if end <= start:
+        raise ValueError("Дата начала позже даты окончания")
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def period_to_epoch(period: str) -> Tuple[int, int]:
+    """Возвращает полуинтервал [сейчас - период, сейчас] в секундах UTC"""
+    if period not in PERIOD_MAPPING:
+        raise ValueError(f"Недопустимый период: {period}")
+    interval, _ = PERIOD_MAPPING[period]
+    now = datetime.now(timezone.utc)
+    return int((now - interval).timestamp()), int(now.timestamp()) + 1
+
+
+def get_data_fingerprint(start_ts: int, end_ts: int, channel: Optional[str] = None) -> List:
+    """
+    Дешёвый отпечаток данных в полуинтервале [start_ts, end_ts):
+    [число строк, максимальный id, минимальный ts, максимальный ts].
+    INSERT OR REPLACE выдаёт строке новый id, поэтому обновления тоже меняют отпечаток.
+    Перенос в архив строки и их id не меняет, поэтому не меняет и отпечаток.
+    Архивная строка поста, который снова есть в горячей базе, не считается.
+    """
+    select = "SELECT COUNT(*), MAX(id), MIN(ts), MAX(ts) FROM {table}"
+    sql, params = _range_sql(select, start_ts, end_ts, channel)
+    parts = [execute_query(sql.format(table="engagement_data"), params)[0]]
+    partitions = overlapping_partitions(start_ts, end_ts)
+    if partitions:
+        hidden = _hot_posts_in_archive(start_ts, end_ts, channel, partitions)
+        cold_sql, _ = _range_sql(select, start_ts, end_ts, channel, extra=NOT_HIDDEN_SQL if hidden else None)
+        parts += [rows[0] for rows in iter_archives(cold_sql, params, partitions, chunk_size=1, hidden=hidden)]
+    present = [part for part in parts if part[0]]
+    if not present:
+        return list(parts[0])
+    return [
+        sum(part[0] for part in present),
+        max(part[1] for part in present),
+        min(part[2] for part in present),
+        max(part[3] for part in present)
+    ]
+
+def _range_sql(
+    select: str,
+    start_ts: int,
+    end_ts: int,
+    channel: Optional[str] = None,
+    order: bool = False,
+    extra: Optional[str] = None
+):
+    """
+    Условие на полуинтервал [start_ts, end_ts) и канал к запросу select
+    (таблица — {table}); extra — дополнительное условие без параметров
+    """
+    sql = select + " WHERE ts >= ? AND ts < ?"
+    params = [start_ts, end_ts]
+    if channel:
+        sql += " AND channel = ?"
+        params.append(channel)
+    if extra:
+        sql += f" AND {extra}"
+    if order:
+        sql += " ORDER BY ts ASC"
+    return sql, tuple(params)
+
+def _hot_posts_in_archive(
+    start_ts: int,
+    end_ts: int,
+    channel: Optional[str],
+    partitions: List[Tuple[int, int, str]]
+) -> List[Tuple]:
+    """
+    (channel, post_id) горячих строк в архивных месяцах диапазона — обычно
+    их нет. Такая строка (догрузка истории после переноса) новее архивной
+    строки того же поста и скрывает её при чтении до следующего переноса
+    """
+    sql, params = _range_sql("SELECT channel, post_id FROM engagement_data",
+                             start_ts, min(end_ts, partitions[-1][1]), channel)
+    return execute_query(sql, params)
+
+def _iter_hot(sql: str, params: tuple, chunk_size: int) -> Iterator[List[Tuple]]:
+    """Строки горячей базы пачками через fetchmany"""
+    cursor = connect_db().cursor()
+    try:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    except sqlite3.Error as e:
+        logger.error(f"SQL error: {e}", exc_info=True)
+        raise RuntimeError(f"Database error: {str(e)}") from e
+    finally:
+        cursor.close()
+
+def _iter_between(
+    select: str,
+    start_ts: int,
+    end_ts: int,
+    channel: Optional[str],
+    chunk_size: int,
+    sort_index: int
+) -> Iterator[List[Tuple]]:
+    """
+    Строки полуинтервала по возрастанию ts из горячей базы и пересекающихся
+    с ним архивов. Архивы идут по месяцам и уже упорядочены, горячие строки
+    обычно новее — тогда источники просто склеиваются. Если в горячей базе
+    есть строки из архивного диапазона (догрузка истории после переноса),
+    архивные строки тех же постов пропускаются, а потоки сливаются по
+    столбцу sort_index
+    """
+    sql, params = _range_sql(select, start_ts, end_ts, channel, order=True)
+    hot = _iter_hot(sql.format(table="engagement_data"), params, chunk_size)
+    partitions = overlapping_partitions(start_ts, end_ts)
+    if not partitions:
+        yield from hot
+        return
+
+    hidden = _hot_posts_in_archive(start_ts, end_ts, channel, partitions)
+    if not hidden:
+        yield from iter_archives(sql, params, partitions, chunk_size)
+        yield from hot
+        return
+    cold_sql, _ = _range_sql(select, start_ts, end_ts, channel, order=True, extra=NOT_HIDDEN_SQL)
+    cold = iter_archives(cold_sql, params, partitions, chunk_size, hidden=hidden)
+    merged = heapq.merge(
+        itertools.chain.from_iterable(cold), itertools.chain.from_iterable(hot), key=itemgetter(sort_index))
+    while True:
+        rows = list(itertools.islice(merged, chunk_size))
+        if not rows:
+            break
+        yield rows
+
+def _get_engagement_data_between(start_ts: int, end_ts: int, channel: Optional[str] = None) -> List[Tuple]:
+    """Выборка по индексу (ts) или (channel, ts) в полуинтервале [start_ts, end_ts), включая архивы"""
+    if not overlapping_partitions(start_ts, end_ts):
+        sql, params = _range_sql(SELECT_ENGAGEMENT_COLUMNS, start_ts, end_ts, channel, order=True)
+        return execute_query(sql.format(table="engagement_data"), params)
+    # Сортировка слияния — по дате (столбец 5): ISO-строки UTC упорядочены как ts
+    rows = []
+    for chunk in _iter_between(SELECT_ENGAGEMENT_COLUMNS, start_ts, end_ts, channel, 20000, sort_index=5):
+        rows.extend(chunk)
+    return rows
+
+def iter_engagement_metrics_between(
+    start_ts: int,
+    end_ts: int,
+    channel: Optional[str] = None,
+    chunk_size: int = 20000,
+    with_post: bool = False
+) -> Iterator[List[Tuple]]:
+    """
+    Потоково отдаёт (ts, likes, comments, shares) пачками по chunk_size
+    строк через fetchmany — память не зависит от длины диапазона.
+    with_post=True добавляет (channel, post_id) — их покрывает тот же индекс.
+    Архивные месяцы диапазона читаются прозрачно.
+    """
+    columns = "ts, likes, comments, shares, channel, post_id" if with_post else "ts, likes, comments, shares"
+    yield from _iter_between(f"SELECT {columns} FROM {{table}}", start_ts, end_ts, channel, chunk_size, sort_index=0)
+
 def get_engagement_data_by_range(
     start_date: str, 
     end_date: str, 
@@ -75,46 +729,280 @@ def get_engagement_data_by_range(
 ) -> List[Tuple]:
     """
     Возвращает данные за диапазон дат (включительно).
-    Формат даты: ISO 8601 (YYYY-MM-DDTHH:MM:SS)
-    """
-    sql = """
-    SELECT id, post_id, likes, comments, shares, date, channel 
-    FROM engagement_data 
-    WHERE date BETWEEN ? AND ?
-    ORDER BY date ASC
+    Формат даты: YYYY-MM-DD (UTC). Месяцы, перенесённые в архив,
+    подключаются (ATTACH) только если пересекаются с диапазоном.
     """
-    params = [f"{start_date}T00:00:00", f"{end_date}T23:59:59.999"]
-    
-    if channel:
-        sql += " AND channel = ?"
-        params.append(channel)
-    
-    return execute_query(sql, tuple(params))
+    start_ts, end_ts = date_range_to_epoch(start_date, end_date)
+    return _get_engagement_data_between(start_ts, end_ts, channel)
 
-# database.py (исправленный SQL-запрос)
 def get_engagement_data(period: str = "daily", channel: Optional[str] = None) -> List[Tuple]:
     """Возвращает данные за период с возможностью фильтрации по каналу"""
-    period_mapping = {
-        "daily": ("-1 days", "day"),
-        "week": ("-7 days", "week"),
-        "month": ("-30 days", "month"),
-        "year": ("-1 years", "year")
-    }
-    
-    if period not in period_mapping:
-        raise ValueError(f"Недопустимый период: {period}")
-    
-    interval, _ = period_mapping[period]
+    start_ts, end_ts = period_to_epoch(period)
+    return _get_engagement_data_between(start_ts, end_ts, channel)
+
+
+def _get_rollup_between(
+    start_ts: int,
+    end_ts: int,
+    channel: Optional[str] = None,
+    granularity: str = "daily"
+) -> List[Tuple]:
+    """Бакеты, пересекающиеся с полуинтервалом [start_ts, end_ts)"""
+    if granularity not in ROLLUP_TABLES:
+        raise ValueError(f"Недопустимая гранулярность: {granularity}")
+    table, width = ROLLUP_TABLES[granularity]
     sql = f"""
-    SELECT id, post_id, likes, comments, shares, date, channel 
-    FROM engagement_data 
-    WHERE date >= datetime('now', ?)
-    {"AND channel = ?" if channel else ""}
-    ORDER BY date ASC
-    """
-    params = [interval]
-    
+    SELECT {', '.join(ROLLUP_COLUMNS)}
+    FROM {table}
+    WHERE bucket >= ? AND bucket < ?
+    """
+    params = [start_ts - start_ts % width, end_ts]
+
     if channel:
+        sql += " AND channel = ?"
         params.append(channel)
-    
+
+    sql += " ORDER BY bucket ASC"
     return execute_query(sql, tuple(params))
+
+def get_rollup_data_by_range(
+    start_date: str,
+    end_date: str,
+    channel: Optional[str] = None,
+    granularity: str = "daily"
+) -> List[Tuple]:
+    """
+    Предагрегаты за диапазон дат YYYY-MM-DD (включительно).
+    Колонки строк — ROLLUP_COLUMNS.
+    """
+    start_ts, end_ts = date_range_to_epoch(start_date, end_date)
+    return _get_rollup_between(start_ts, end_ts, channel, granularity)
+
+def get_rollup_data(
+    period: str = "month",
+    channel: Optional[str] = None,
+    granularity: str = "daily"
+) -> List[Tuple]:
+    """
+    Предагрегаты за период. Начало периода округляется вниз
+    до границы бакета (часа или суток UTC).
+    """
+    start_ts, end_ts = period_to_epoch(period)
+    return _get_rollup_between(start_ts, end_ts, channel, granularity)
+
+
+# Итоги по каналу за окно: ROLLUP_COLUMNS без bucket плюс первый и последний бакет
+CHANNEL_TOTAL_COLUMNS = ["channel"] + ROLLUP_COLUMNS[2:] + ["first_bucket", "last_bucket"]
+
+def get_channel_totals_between(start_ts: int, end_ts: int, granularity: str = "daily") -> List[Tuple]:
+    """
+    Итоги всех каналов за полуинтервал одним GROUP BY по предагрегатам
+    (колонки — CHANNEL_TOTAL_COLUMNS). Предагрегаты хранят всю историю,
+    поэтому архивы не подключаются, а стоимость почти не зависит от числа каналов
+    """
+    if granularity not in ROLLUP_TABLES:
+        raise ValueError(f"Недопустимая гранулярность: {granularity}")
+    table, width = ROLLUP_TABLES[granularity]
+    aggregates = ["SUM(posts)"]
+    for m in ROLLUP_METRICS:
+        aggregates += [f"SUM({m}_sum)", f"SUM({m}_sq)", f"MIN({m}_min)", f"MAX({m}_max)"]
+    aggregates += [f"SUM({a}_{b})" for a, b in ROLLUP_PAIRS]
+    sql = f"""
+    SELECT channel, {', '.join(aggregates)}, MIN(bucket), MAX(bucket)
+    FROM {table}
+    WHERE bucket >= ? AND bucket < ?
+    GROUP BY channel
+    HAVING SUM(posts) > 0
+    ORDER BY channel
+    """
+    return execute_query(sql, (start_ts - start_ts % width, end_ts))
+
+def get_rollup_data_between(
+    start_ts: int,
+    end_ts: int,
+    channel: Optional[str] = None,
+    granularity: str = "daily"
+) -> List[Tuple]:
+    """Предагрегаты за полуинтервал в секундах UTC (колонки — ROLLUP_COLUMNS)"""
+    return _get_rollup_between(start_ts, end_ts, channel, granularity)
+
+def _replace_archived_duplicates(conn: sqlite3.Connection, start_ts: int, end_ts: int) -> int:
+    """
+    Горячие строки месяца, пост которых уже лежит в архиве (повторная
+    догрузка истории после переноса), заменяют архивную строку. Триггер
+    вставки уже учёл их в предагрегатах, поэтому архивная строка из них
+    вычитается: её значения вставляются в горячую таблицу под временным
+    post_id без триггера вставки и удаляются с триггером удаления.
+    Вызывается в транзакции; возвращает число заменённых строк
+    """
+    conn.execute("DROP TABLE IF EXISTS temp.archive_duplicates")
+    conn.execute(f"""
+    CREATE TEMP TABLE archive_duplicates AS
+    SELECT a.ts, a.channel, a.post_id, a.likes, a.comments, a.shares
+    FROM main.engagement_data e
+    JOIN {ARCHIVE_ALIAS}.{ARCHIVE_TABLE} a ON a.channel = e.channel AND a.post_id = e.post_id
+    WHERE e.ts >= ? AND e.ts < ?
+    """, (start_ts, end_ts))
+    replaced = conn.execute("SELECT COUNT(*) FROM temp.archive_duplicates").fetchone()[0]
+    if replaced:
+        # Суффикс не даёт временной строке столкнуться с горячей по UNIQUE (channel, post_id)
+        marker = "#archived"
+        _drop_rollup_triggers(conn, "insert")
+        conn.execute("""
+        INSERT INTO main.engagement_data (post_id, likes, comments, shares, date, channel, ts)
+        SELECT post_id || ?, likes, comments, shares, strftime('%Y-%m-%dT%H:%M:%S', ts, 'unixepoch'), channel, ts
+        FROM temp.archive_duplicates
+        """, (marker,))
+        _create_rollup_triggers(conn)
+        conn.execute("""
+        DELETE FROM main.engagement_data
+        WHERE (channel, post_id) IN (SELECT channel, post_id || ? FROM temp.archive_duplicates)
+        """, (marker,))
+        conn.execute(f"""
+        DELETE FROM {ARCHIVE_ALIAS}.{ARCHIVE_TABLE}
+        WHERE (ts, channel, post_id) IN (SELECT ts, channel, post_id FROM temp.archive_duplicates)
+        """)
+    conn.execute("DROP TABLE temp.archive_duplicates")
+    return replaced
+
+def _archive_month(conn: sqlite3.Connection, start_ts: int, end_ts: int, path: str) -> int:
+    """
+    Переносит строки месяца [start_ts, end_ts) в архив path. Сначала
+    фиксируется копия в архиве, затем из горячей базы удаляются ровно
+    скопированные строки (по id): сбой между шагами оставляет дубликат,
+    а не потерю, и доводится повторным запуском. Предагрегаты хранят всю
+    историю, поэтому на время удаления триггеры вычитания снимаются
+    (DDL в SQLite транзакционен — другие соединения этого не видят).
+    Архивные строки постов, снова попавших в горячую базу, перед копией
+    заменяются горячими (_replace_archived_duplicates).
+    """
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_ALIAS}", (path,))
+    try:
+        create_archive_table(conn)
+        conn.commit()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            replaced = _replace_archived_duplicates(conn, start_ts, end_ts)
+            conn.commit()
+            if replaced:
+                logger.info(f"Архивных строк заменено горячими: {replaced}")
+
+            moved = conn.execute(f"""
+            INSERT OR REPLACE INTO {ARCHIVE_ALIAS}.{ARCHIVE_TABLE} (ts, channel, post_id, likes, comments, shares, id)
+            SELECT ts, channel, post_id, likes, comments, shares, id
+            FROM main.engagement_data WHERE ts >= ? AND ts < ?
+            """, (start_ts, end_ts)).rowcount
+            conn.commit()
+
+            conn.execute("BEGIN IMMEDIATE")
+            _drop_rollup_triggers(conn, "delete")
+            conn.execute(f"""
+            DELETE FROM main.engagement_data
+            WHERE ts >= ? AND ts < ?
+              AND id IN (SELECT id FROM {ARCHIVE_ALIAS}.{ARCHIVE_TABLE} WHERE ts >= ? AND ts < ?)
+            """, (start_ts, end_ts, start_ts, end_ts))
+            _create_rollup_triggers(conn)
+            conn.execute("""
+            INSERT INTO archive_horizon (id, until) VALUES (0, ?)
+            ON CONFLICT (id) DO UPDATE SET until = max(until, excluded.until)
+            """, (end_ts,))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+    finally:
+        conn.execute(f"DETACH DATABASE {ARCHIVE_ALIAS}")
+    return moved
+
+def _rebuild_stale_extremes(conn: sqlite3.Connection) -> int:
+    """
+    Пересчитывает min/max бакетов из rollup_stale по горячим и архивным
+    строкам: помесячно, с подключением архива месяца. Возвращает число бакетов
+    """
+    stale = conn.execute("SELECT tbl, channel, bucket FROM rollup_stale").fetchall()
+    if not stale:
+        return 0
+    widths = dict(ROLLUP_TABLES.values())
+    by_month: Dict[int, List[Tuple]] = {}
+    for item in stale:
+        by_month.setdefault(month_bounds(item[2])[0], []).append(item)
+
+    extremes = ", ".join(f"MIN({m}), MAX({m})" for m in ROLLUP_METRICS)
+    assignments = ", ".join(f"{m}_min = ?, {m}_max = ?" for m in ROLLUP_METRICS)
+    for month_start, items in by_month.items():
+        path = partition_path(month_start)
+        archived = os.path.exists(path)
+        if archived:
+            conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_ALIAS}", (path,))
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for table, channel, bucket in items:
+                rows = "SELECT likes, comments, shares FROM main.engagement_data WHERE channel = ? AND ts >= ? AND ts < ?"
+                params = [channel, bucket, bucket + widths[table]]
+                if archived:
+                    rows += f" UNION ALL SELECT likes, comments, shares FROM {ARCHIVE_ALIAS}.{ARCHIVE_TABLE} " \
+                            "WHERE channel = ? AND ts >= ? AND ts < ?"
+                    params *= 2
+                values = conn.execute(f"SELECT {extremes} FROM ({rows})", params).fetchone()
+                conn.execute(f"UPDATE {table} SET {assignments} WHERE channel = ? AND bucket = ?",
+                             (*values, channel, bucket))
+                conn.execute("DELETE FROM rollup_stale WHERE tbl = ? AND channel = ? AND bucket = ?",
+                             (table, channel, bucket))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        finally:
+            if archived:
+                conn.execute(f"DETACH DATABASE {ARCHIVE_ALIAS}")
+    return len(stale)
+
+def archive_cold_data(hot_days: Optional[int] = None) -> Dict[str, int]:
+    """
+    Переносит в помесячные архивы строки старше hot_days (по умолчанию
+    ARCHIVE_SETTINGS["hot_days"]); переносятся только целые месяцы.
+    Возвращает число перенесённых строк по месяцам (YYYY-MM). В конце
+    пересчитываются min/max предагрегатов, помеченные в rollup_stale
+    """
+    hot_days = hot_days or ARCHIVE_SETTINGS["hot_days"]
+    cutoff = month_bounds(int(time.time()) - hot_days * 86400)[0]
+    first = execute_query("SELECT MIN(ts) FROM engagement_data WHERE ts < ?", (cutoff,))[0][0]
+
+    os.makedirs(ARCHIVE_SETTINGS["dir"], exist_ok=True)
+    conn = connect_db()
+    moved: Dict[str, int] = {}
+    started = time.perf_counter()
+    month_start = month_bounds(first)[0] if first is not None else cutoff
+    while month_start < cutoff:
+        month_end = month_bounds(month_start)[1]
+        if execute_query("SELECT 1 FROM engagement_data WHERE ts >= ? AND ts < ? LIMIT 1", (month_start, month_end)):
+            path = partition_path(month_start)
+            try:
+                count = _archive_month(conn, month_start, month_end, path)
+                vacuum_partition(path)
+            except sqlite3.Error as e:
+                metrics.inc("db_errors")
+                logger.error(f"Ошибка переноса в архив {path}: {e}", exc_info=True)
+                raise RuntimeError(f"Database error: {str(e)}") from e
+            label = datetime.fromtimestamp(month_start, timezone.utc).strftime("%Y-%m")
+            moved[label] = count
+            logger.info(f"Месяц {label} перенесён в архив: {count} строк")
+        month_start = month_end
+
+    try:
+        rebuilt = _rebuild_stale_extremes(conn)
+    except sqlite3.Error as e:
+        metrics.inc("db_errors")
+        logger.error(f"Ошибка пересчёта min/max предагрегатов: {e}", exc_info=True)
+        raise RuntimeError(f"Database error: {str(e)}") from e
+    if rebuilt:
+        logger.info(f"Пересчитаны min/max предагрегатов с учётом архива: {rebuilt} бакетов")
+
+    if moved and ARCHIVE_SETTINGS["vacuum_hot"]:
+        try:
+            conn.execute("VACUUM")
+        except sqlite3.Error as e:
+            logger.warning(f"VACUUM горячей базы не выполнен: {e}")
+    metrics.inc("db_rows_archived", sum(moved.values()))
+    metrics.observe("db_archive", time.perf_counter() - started)
+    return moved
@@ -0,0 +1,200 @@
+# engagement_analytics.py
+
+from datetime import datetime, timezone
+from typing import List, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from config import ANALYTICS_SETTINGS
+from database import ROLLUP_COLUMNS
+
+WEEKDAYS_RU = ["Пн", "Вт", "Ср", "Чт", "Пт", "Сб", "Вс"]
+
+# Индексы столбцов предагрегатов
+_ROLLUP_INDEX = {name: i for i, name in enumerate(ROLLUP_COLUMNS)}
+
+
+def _slot(ts: np.ndarray) -> np.ndarray:
+    """Номер слота «день недели × час» (UTC), 0 — понедельник 00:00"""
+    # 1970-01-01 — четверг: (дни + 3) % 7 даёт 0 для понедельника
+    return (ts // 86400 + 3) % 7 * 24 + ts // 3600 % 24
+
+
+class EngagementAnalytics:
+    """
+    Векторные расчёты на NumPy за один проход по данным периода:
+    тепловая карта вовлечённости «день недели × час», лучшие слоты
+    публикаций и аномалии — робастный z-score (медиана и MAD) значения
+    log(1 + вовлечённость) относительно window предыдущих постов того же
+    канала. Вовлечённость — лайки + комментарии + репосты.
+
+    Данные подаются пачками в порядке времени; между пачками хранится
+    только хвост из window значений на канал и top аномалий, поэтому
+    память не зависит от длины периода. Для периодов на предагрегатах
+    единица анализа — сутки канала (средняя вовлечённость поста за день).
+    Итог — короткий числовой дайджест для промптов LLM.
+    """
+
+    def __init__(self, unit: str = "post", settings: dict = ANALYTICS_SETTINGS):
+        self.unit = unit
+        self.window = settings["window"]
+        self.threshold = settings["z_threshold"]
+        self.top = settings["top_anomalies"]
+        self.best_slots = settings["best_slots"]
+        self.min_slot_posts = settings["min_slot_posts"]
+
+        self.posts = 0
+        self.channels = set()
+        self.heat_sum = np.zeros(7 * 24)
+        self.heat_posts = np.zeros(7 * 24, dtype=np.int64)
+        self.spikes = 0
+        self.drops = 0
+        # Хвост предыдущих значений по каналам и найденные аномалии
+        self._carry = (np.empty(0, dtype=np.int64), np.empty(0), np.empty(0, dtype=object), np.empty(0, dtype=object))
+        self._anomalies = (np.empty(0), np.empty(0, dtype=np.int64), np.empty(0), np.empty(0),
+                           np.empty(0, dtype=object), np.empty(0, dtype=object))
+
+    # --- Вход ---
+
+    def update(self, rows: List[Tuple]) -> np.ndarray:
+        """
+        Пачка строк (ts, likes, comments, shares, channel, post_id), как их отдаёт
+        iter_engagement_metrics_between(with_post=True). Возвращает числовую
+        часть (ts, likes, comments, shares) для StreamingStats.update_arrays.
+        """
+        if not rows:
+            return np.empty((0, 4), dtype=np.int64)
+        ts, likes, comments, shares, channel, post_id = zip(*rows)
+        numeric = np.column_stack([np.fromiter(col, dtype=np.int64, count=len(rows))
+                                   for col in (ts, likes, comments, shares)])
+        engagement = numeric[:, 1:].sum(axis=1).astype(float)
+        self.posts += len(rows)
+        self.add_heatmap(numeric[:, 0], engagement, np.ones(len(rows), dtype=np.int64))
+        self._add_points(numeric[:, 0], engagement, np.array(channel, dtype=object), np.array(post_id, dtype=object))
+        return numeric
+
+    def update_rollups(self, hourly_rows: List[Tuple], daily_rows: List[Tuple]) -> None:
+        """Периоды на предагрегатах: карта по часовым бакетам, аномалии по суткам каналов"""
+        if hourly_rows:
+            hourly = np.array([[r[_ROLLUP_INDEX[c]] for c in ("bucket", "posts", "likes_sum", "comments_sum", "shares_sum")]
+                               for r in hourly_rows], dtype=np.int64)
+            self.add_heatmap(hourly[:, 0], hourly[:, 2:].sum(axis=1).astype(float), hourly[:, 1])
+        if daily_rows:
+            rows = sorted((r for r in daily_rows if r[_ROLLUP_INDEX["posts"]]), key=lambda r: r[_ROLLUP_INDEX["bucket"]])
+            ts = np.array([r[_ROLLUP_INDEX["bucket"]] for r in rows], dtype=np.int64)
+            posts = np.array([r[_ROLLUP_INDEX["posts"]] for r in rows], dtype=float)
+            total = np.array([r[_ROLLUP_INDEX["likes_sum"]] + r[_ROLLUP_INDEX["comments_sum"]] + r[_ROLLUP_INDEX["shares_sum"]]
+                              for r in rows], dtype=float)
+            channel = np.array([r[_ROLLUP_INDEX["channel"]] for r in rows], dtype=object)
+            self.posts += int(posts.sum())
+            self._add_points(ts, total / posts, channel, np.full(len(rows), "", dtype=object))
+
+    def add_heatmap(self, ts: np.ndarray, engagement: np.ndarray, posts: np.ndarray) -> None:
+        slots = _slot(ts)
+        self.heat_sum += np.bincount(slots, weights=engagement, minlength=7 * 24)
+        self.heat_posts += np.bincount(slots, weights=posts, minlength=7 * 24).astype(np.int64)
+
+    def _add_points(self, ts: np.ndarray, engagement: np.ndarray, channel: np.ndarray, post_id: np.ndarray) -> None:
+        """Скользящий робастный z-score по каналу; хвост окна переносится в следующую пачку"""
+        self.channels.update(np.unique(channel).tolist())
+        carry_ts, carry_val, carry_channel, carry_post = self._carry
+        n_carry = len(carry_ts)
+        ts = np.concatenate([carry_ts, ts])
+        values = np.concatenate([carry_val, np.log1p(engagement)])
+        channel = np.concatenate([carry_channel, channel])
+        post_id = np.concatenate([carry_post, post_id])
+        is_new = np.arange(len(ts)) >= n_carry
+
+        # Группировка по каналу с сохранением порядка времени внутри группы
+        codes = np.unique(channel.astype(str), return_inverse=True)[1]
+        order = np.lexsort((ts, codes))
+        ts, values, channel, post_id, is_new, codes = (
+            ts[order], values[order], channel[order], post_id[order], is_new[order], codes[order])
+        index = np.arange(len(ts))
+        group_start = np.maximum.accumulate(np.where(np.r_[True, codes[1:] != codes[:-1]], index, 0))
+        position = index - group_start
+
+        # Окно — window предыдущих значений того же канала
+        w = self.window
+        scored = np.flatnonzero(is_new & (position >= w))
+        if len(scored):
+            windows = sliding_window_view(values, w)[scored - w]
+            median = np.median(windows, axis=1)
+            scale = 1.4826 * np.median(np.abs(windows - median[:, None]), axis=1)
+            # MAD = 0 (больше половины окна совпадает) — запасной масштаб по стандартному отклонению
+            scale = np.where(scale > 0, scale, windows.std(axis=1))
+            with np.errstate(divide="ignore", invalid="ignore"):
+                z = np.where(scale > 0, (values[scored] - median) / scale, 0.0)
+            hits = np.abs(z) >= self.threshold
+            self.spikes += int((z[hits] > 0).sum())
+            self.drops += int((z[hits] < 0).sum())
+            self._keep_top(z[hits], ts[scored][hits], np.expm1(values[scored][hits]), np.expm1(median[hits]),
+                           channel[scored][hits], post_id[scored][hits])
+
+        # Хвост: последние window значений каждого канала
+        group_size = np.bincount(codes)
+        keep = position >= group_size[codes] - w
+        self._carry = (ts[keep], values[keep], channel[keep], post_id[keep])
+
+    def _keep_top(self, z, ts, value, median, channel, post_id) -> None:
+        merged = tuple(np.concatenate([old, new]) for old, new in zip(self._anomalies, (z, ts, value, median, channel, post_id)))
+        if len(merged[0]) > self.top:
+            top = np.argpartition(-np.abs(merged[0]), self.top)[:self.top]
+            merged = tuple(column[top] for column in merged)
+        self._anomalies = merged
+
+    # --- Результаты ---
+
+    def slot_table(self) -> List[Tuple[int, int, float, int]]:
+        """(день недели, час, средняя вовлечённость поста, постов) по слотам с достаточной выборкой"""
+        enough = self.heat_posts >= self.min_slot_posts
+        with np.errstate(divide="ignore", invalid="ignore"):
+            avg = np.where(self.heat_posts > 0, self.heat_sum / self.heat_posts, 0.0)
+        return [(int(s) // 24, int(s) % 24, float(avg[s]), int(self.heat_posts[s])) for s in np.flatnonzero(enough)]
+
+    def heatmap(self) -> np.ndarray:
+        """Средняя вовлечённость поста, матрица 7 × 24 (NaN — нет постов)"""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return (self.heat_sum / self.heat_posts).reshape(7, 24)
+
+    def best_times(self) -> Tuple[List[Tuple], List[Tuple]]:
+        """Лучшие и худшие слоты по средней вовлечённости поста"""
+        table = sorted(self.slot_table(), key=lambda row: row[2], reverse=True)
+        return table[:self.best_slots], table[::-1][:self.best_slots] if len(table) > self.best_slots else []
+
+    def anomalies(self) -> List[Tuple]:
+        """(z, ts, значение, медиана окна, канал, post_id) по убыванию |z|"""
+        z = self._anomalies[0]
+        order = np.argsort(-np.abs(z))
+        return list(zip(*(column[order].tolist() for column in self._anomalies)))
+
+    def digest(self) -> str:
+        """Компактная числовая сводка для промптов (UTC)"""
+        def slot(row):
+            day, hour, avg, posts = row
+            return f"{WEEKDAYS_RU[day]} {hour:02d}:00 — {avg:.0f} (постов: {posts})"
+
+        lines = [f"Постов: {self.posts}, каналов: {len(self.channels)}."]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            by_day = self.heat_sum.reshape(7, 24).sum(axis=1) / self.heat_posts.reshape(7, 24).sum(axis=1)
+            by_hour = self.heat_sum.reshape(7, 24).sum(axis=0) / self.heat_posts.reshape(7, 24).sum(axis=0)
+        if np.isfinite(by_day).any():
+            lines.append(f"Лучший день недели: {WEEKDAYS_RU[int(np.nanargmax(by_day))]}, "
+                         f"худший: {WEEKDAYS_RU[int(np.nanargmin(by_day))]}; "
+                         f"лучший час: {int(np.nanargmax(by_hour)):02d}:00, худший: {int(np.nanargmin(by_hour)):02d}:00 (UTC).")
+
+        best, worst = self.best_times()
+        if best:
+            lines.append("Лучшие слоты (средняя вовлечённость поста): " + "; ".join(map(slot, best)) + ".")
+        if worst:
+            lines.append("Худшие слоты: " + "; ".join(map(slot, worst)) + ".")
+
+        unit = "постов" if self.unit == "post" else "дней канала"
+        lines.append(f"Аномалии (робастный z ≥ {self.threshold:g} относительно {self.window} предыдущих {unit}): "
+                     f"всплесков {self.spikes}, провалов {self.drops}.")
+        for z, ts, value, median, channel, post_id in self.anomalies():
+            when = datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M" if self.unit == "post" else "%Y-%m-%d")
+            what = f"пост {post_id}" if self.unit == "post" else "день"
+            lines.append(f"- {when}, канал {channel}, {what}: {value:.0f} при медиане {median:.0f} (z={z:+.1f})")
+        return "\n".join(lines)
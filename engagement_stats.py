@@ -0,0 +1,240 @@
+# engagement_stats.py
+
+from datetime import datetime
+from typing import Iterable, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from database import CHANNEL_TOTAL_COLUMNS, ROLLUP_COLUMNS, ROLLUP_METRICS, ROLLUP_PAIRS
+
+METRICS = list(ROLLUP_METRICS)
+WEEKDAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+class EngagementSummary:
+    """
+    Агрегаты, из которых собирается отчёт: описательная статистика,
+    средние, корреляции, лайки по дням недели и границы периода.
+    Строится либо потоково по сырым строкам, либо по предагрегатам.
+    describe в обоих случаях содержит только count/mean/std/min/max:
+    квантили из предагрегатов не восстановить, а таблица отчёта должна
+    выглядеть одинаково для любого периода.
+    """
+
+    def __init__(
+        self,
+        posts: int,
+        describe: pd.DataFrame,
+        corr: pd.DataFrame,
+        weekday_likes: pd.Series,
+        date_min: datetime,
+        date_max: datetime
+    ):
+        self.posts = posts
+        self.describe = describe
+        self.means = describe.loc['mean']
+        self.corr = corr
+        self.weekday_likes = weekday_likes
+        self.date_min = date_min
+        self.date_max = date_max
+
+    @classmethod
+    def from_stream(cls, chunks: Iterable[List[Tuple]]) -> "EngagementSummary":
+        """Агрегаты за один проход по пачкам (ts, likes, comments, shares)"""
+        stats = StreamingStats()
+        for chunk in chunks:
+            stats.update(chunk)
+        return stats.to_summary()
+
+    @classmethod
+    def from_rollups(cls, rows: List[Tuple]) -> "EngagementSummary":
+        """Агрегаты по строкам предагрегатов (ROLLUP_COLUMNS)"""
+        buckets = pd.DataFrame(rows, columns=ROLLUP_COLUMNS)
+        if buckets.empty or buckets['posts'].sum() == 0:
+            raise ValueError("Нет данных для анализа")
+
+        # Суммы квадратов за год не помещаются в int64 — считаем во float
+        totals = buckets.drop(columns=['channel', 'bucket']).astype(float).sum()
+        n = totals['posts']
+        mean = pd.Series({m: totals[f'{m}_sum'] / n for m in METRICS})
+        var = pd.Series({
+            m: (totals[f'{m}_sq'] - n * mean[m] ** 2) / (n - 1) if n > 1 else np.nan
+            for m in METRICS
+        }).clip(lower=0)
+        std = np.sqrt(var)
+        describe = pd.DataFrame({
+            m: {
+                'count': n,
+                'mean': mean[m],
+                'std': std[m],
+                'min': buckets[f'{m}_min'].min(),
+                'max': buckets[f'{m}_max'].max()
+            } for m in METRICS
+        })
+
+        corr = pd.DataFrame(np.eye(len(METRICS)), index=METRICS, columns=METRICS)
+        for a, b in ROLLUP_PAIRS:
+            cov = (totals[f'{a}_{b}'] - n * mean[a] * mean[b]) / (n - 1) if n > 1 else np.nan
+            denom = std[a] * std[b]
+            corr.loc[a, b] = corr.loc[b, a] = cov / denom if denom else np.nan
+
+        dates = pd.to_datetime(buckets['bucket'], unit='s')
+        weekday_likes = buckets.groupby(dates.dt.day_name())['likes_sum'].sum()
+        return cls(
+            posts=int(n),
+            describe=describe,
+            corr=corr,
+            weekday_likes=weekday_likes.reindex([d for d in WEEKDAYS if d in weekday_likes.index]),
+            date_min=dates.min(),
+            date_max=dates.max()
+        )
+
+
+class ChannelComparison:
+    """
+    Сравнение каналов за окно: средние на пост, разброс вовлечённости
+    (лайки + комментарии + репосты), доля в общей вовлечённости и
+    динамика — изменение средней вовлечённости поста во второй половине
+    окна относительно первой. Итоги приходят одним GROUP BY по каналам
+    (get_channel_totals_between), ряды для графиков — из тех же предагрегатов.
+    """
+
+    def __init__(self, table: pd.DataFrame, series: dict, date_min: datetime, date_max: datetime):
+        self.table = table      # индекс — канал, по убыванию вовлечённости поста
+        self.series = series    # канал -> (бакеты, средняя вовлечённость поста)
+        self.date_min = date_min
+        self.date_max = date_max
+
+    @classmethod
+    def from_rollups(cls, totals: List[Tuple], rows: List[Tuple]) -> "ChannelComparison":
+        """totals — CHANNEL_TOTAL_COLUMNS, rows — бакеты ROLLUP_COLUMNS того же окна"""
+        frame = pd.DataFrame(totals, columns=CHANNEL_TOTAL_COLUMNS).set_index("channel")
+        if frame.empty:
+            raise ValueError("Нет данных для анализа")
+
+        numeric = frame.drop(columns=["first_bucket", "last_bucket"]).astype(float)
+        n = numeric["posts"]
+        table = pd.DataFrame({"posts": n.astype(int)})
+        for m in METRICS:
+            table[m] = numeric[f"{m}_sum"] / n
+        # Дисперсия суммы метрик: дисперсии плюс удвоенные ковариации из сумм попарных произведений
+        total = sum(numeric[f"{m}_sum"] for m in METRICS)
+        total_sq = sum(numeric[f"{m}_sq"] for m in METRICS) + 2 * sum(numeric[f"{a}_{b}"] for a, b in ROLLUP_PAIRS)
+        table["engagement"] = total / n
+        var = ((total_sq - n * table["engagement"] ** 2) / (n - 1)).where(n > 1)
+        table["engagement_std"] = np.sqrt(var.clip(lower=0))
+        table["share"] = total / total.sum() * 100
+
+        buckets = pd.DataFrame(rows, columns=ROLLUP_COLUMNS)
+        buckets = buckets[buckets["posts"] > 0]
+        engagement = (buckets["likes_sum"] + buckets["comments_sum"] + buckets["shares_sum"]) / buckets["posts"]
+        middle = (frame["first_bucket"].min() + frame["last_bucket"].max()) / 2
+        series, trend = {}, {}
+        for channel, group in buckets.assign(engagement=engagement).groupby("channel", sort=False):
+            series[channel] = (group["bucket"].tolist(), group["engagement"].tolist())
+            first = group.loc[group["bucket"] < middle, "engagement"].mean()
+            second = group.loc[group["bucket"] >= middle, "engagement"].mean()
+            trend[channel] = (second - first) / first * 100 if first else np.nan
+        table["trend"] = pd.Series(trend, dtype=float)
+
+        table = table.sort_values("engagement", ascending=False)
+        return cls(
+            table=table,
+            series=series,
+            date_min=pd.to_datetime(frame["first_bucket"].min(), unit="s"),
+            date_max=pd.to_datetime(frame["last_bucket"].max(), unit="s")
+        )
+
+    def digest(self, limit: int) -> str:
+        """Строки рейтинга для промпта; при большом числе каналов — лучшие и худшие"""
+        lines = []
+        rows = list(self.table.itertuples())
+        if len(rows) > limit:
+            head = limit - limit // 4
+            rows = rows[:head] + rows[-(limit - head):]
+        for row in rows:
+            trend = "н/д" if pd.isna(row.trend) else f"{row.trend:+.0f}%"
+            lines.append(
+                f"{self.table.index.get_loc(row.Index) + 1}. {row.Index}: постов {row.posts}, "
+                f"вовлечённость/пост {row.engagement:.1f} (±{0 if pd.isna(row.engagement_std) else row.engagement_std:.1f}), "
+                f"лайки {row.likes:.1f}, комментарии {row.comments:.1f}, репосты {row.shares:.1f}, "
+                f"доля {row.share:.1f}%, динамика {trend}"
+            )
+        return "\n".join(lines)
+
+
+class StreamingStats:
+    """
+    Однопроходные агрегаты по likes/comments/shares с ограниченной памятью:
+    count, среднее, матрица ко-моментов (дисперсии и корреляции, слияние
+    пачек по Чану), min/max, суммы лайков по дням недели.
+    """
+
+    def __init__(self):
+        self.n = 0
+        self.mean = np.zeros(len(METRICS))
+        self.comoment = np.zeros((len(METRICS), len(METRICS)))
+        self.min = np.full(len(METRICS), np.inf)
+        self.max = np.full(len(METRICS), -np.inf)
+        self.weekday_likes = np.zeros(7)
+        self.weekday_posts = np.zeros(7, dtype=np.int64)
+        self.ts_min = None
+        self.ts_max = None
+
+    def update(self, rows: List[Tuple]) -> None:
+        """Добавляет пачку строк (ts, likes, comments, shares)"""
+        if not rows:
+            return
+        data = np.asarray(rows, dtype=np.int64)
+        self.update_arrays(data[:, 0], data[:, 1:].astype(float))
+
+    def update_arrays(self, ts: np.ndarray, values: np.ndarray) -> None:
+        """То же для готовых массивов: ts (n,) и метрики (n, 3)"""
+        n_b = len(values)
+        mean_b = values.mean(axis=0)
+        centered = values - mean_b
+        comoment_b = centered.T @ centered
+
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.comoment += comoment_b + np.outer(delta, delta) * self.n * n_b / n
+        self.mean += delta * n_b / n
+        self.n = n
+
+        self.min = np.minimum(self.min, values.min(axis=0))
+        self.max = np.maximum(self.max, values.max(axis=0))
+
+        # 1970-01-01 — четверг: (дни + 3) % 7 даёт 0 для понедельника
+        weekdays = (ts // 86400 + 3) % 7
+        self.weekday_likes += np.bincount(weekdays, weights=values[:, 0], minlength=7)
+        self.weekday_posts += np.bincount(weekdays, minlength=7)
+        self.ts_min = int(ts.min()) if self.ts_min is None else min(self.ts_min, int(ts.min()))
+        self.ts_max = int(ts.max()) if self.ts_max is None else max(self.ts_max, int(ts.max()))
+
+    def to_summary(self) -> EngagementSummary:
+        if not self.n:
+            raise ValueError("Нет данных для анализа")
+        n = self.n
+        cov = self.comoment / (n - 1) if n > 1 else np.full_like(self.comoment, np.nan)
+        std = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = cov / np.outer(std, std)
+        describe = pd.DataFrame({
+            metric: {
+                'count': float(n),
+                'mean': self.mean[i],
+                'std': std[i],
+                'min': self.min[i],
+                'max': self.max[i]
+            } for i, metric in enumerate(METRICS)
+        })
+        present = self.weekday_posts > 0
+        return EngagementSummary(
+            posts=n,
+            describe=describe,
+            corr=pd.DataFrame(corr, index=METRICS, columns=METRICS),
+            weekday_likes=pd.Series(self.weekday_likes[present], index=np.array(WEEKDAYS)[present]),
+            date_min=pd.to_datetime(self.ts_min, unit='s'),
+            date_max=pd.to_datetime(self.ts_max, unit='s')
+        )
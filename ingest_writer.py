@@ -0,0 +1,175 @@
+# ingest_writer.py
+
+import logging
+import queue
+import signal
+import sys
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from multiprocessing.connection import Client, Listener
+from typing import Dict, Iterable, Optional, Tuple
+
+from config import ARCHIVE_SETTINGS, INGEST_WRITER
+from database import archive_cold_data, create_engagement_table, insert_engagement_data_many, insert_snapshots_many
+
+logger = logging.getLogger(__name__)
+
+# Вид сообщения -> функция записи пачки
+SINKS = {
+    "engagement": insert_engagement_data_many,
+    "snapshots": insert_snapshots_many
+}
+
+# Команда -> функция; выполняется тем же потоком записи, что и пачки
+COMMANDS = {
+    "archive": archive_cold_data
+}
+
+
+def _seconds_until(at: str, now: datetime) -> float:
+    """Секунд до ближайшего времени at ("ЧЧ:ММ", UTC)"""
+    hour, minute = map(int, at.split(":"))
+    moment = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if moment <= now:
+        moment += timedelta(days=1)
+    return (moment - now).total_seconds()
+
+
+class IngestWriterServer:
+    """
+    Единственный писатель в базу для всех воркеров сборщика.
+
+    Воркеры присылают уже собранные пачки (вид, строки) через
+    multiprocessing.connection. Все пачки проходят через одну очередь и один
+    поток записи, поэтому воркеры не конкурируют за блокировку SQLite.
+    Ответ отправляется после коммита: ("ok", n) или ("error", текст).
+
+    Команды (COMMANDS, например перенос в архив) идут через ту же очередь:
+    DELETE и DDL переноса не конкурируют с записью пачек за блокировку.
+    Перенос в архив запускается здесь же ежедневно в ARCHIVE_SETTINGS["time"].
+    """
+
+    def __init__(self, address=None, authkey=None):
+        self.address = address or tuple(INGEST_WRITER["address"])
+        self.authkey = authkey or INGEST_WRITER["authkey"]
+        self._queue: "queue.Queue" = queue.Queue()
+        self._counters = {"batches": 0, "rows": 0, "errors": 0}
+
+    def _write_loop(self) -> None:
+        while True:
+            kind, rows, reply = self._queue.get()
+            try:
+                if kind in COMMANDS:
+                    result = COMMANDS[kind](*rows)
+                    logger.info(f"Команда {kind} выполнена: {result}")
+                else:
+                    result = SINKS[kind](rows)
+                    self._counters["batches"] += 1
+                    self._counters["rows"] += result
+                if reply is not None:
+                    reply.put(("ok", result))
+            except Exception as e:
+                self._counters["errors"] += 1
+                logger.error(f"Ошибка записи пачки {kind}: {e}")
+                if reply is not None:
+                    reply.put(("error", str(e)))
+
+    def _archive_schedule(self) -> None:
+        """Ежедневный перенос в архив: команда ставится в общую очередь записи"""
+        while True:
+            time.sleep(_seconds_until(ARCHIVE_SETTINGS["time"], datetime.now(timezone.utc)))
+            self._queue.put(("archive", (), None))
+
+    def _serve_connection(self, conn) -> None:
+        reply: "queue.Queue" = queue.Queue(maxsize=1)
+        try:
+            while True:
+                kind, rows = conn.recv()
+                if kind not in SINKS and kind not in COMMANDS:
+                    conn.send(("error", f"неизвестный вид данных: {kind}"))
+                    continue
+                self._queue.put((kind, rows, reply))
+                conn.send(reply.get())
+        except (EOFError, OSError):
+            pass
+        finally:
+            conn.close()
+
+    def serve_forever(self) -> None:
+        create_engagement_table()
+        threading.Thread(target=self._write_loop, name="writer", daemon=True).start()
+        if ARCHIVE_SETTINGS["time"]:
+            threading.Thread(target=self._archive_schedule, name="archive-schedule", daemon=True).start()
+        with Listener(self.address, authkey=self.authkey) as listener:
+            logger.info(f"Писатель слушает {self.address}")
+            while True:
+                conn = listener.accept()
+                logger.info(f"Подключился воркер: {listener.last_accepted}")
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+
+class RemoteWriter:
+    """Клиент писателя: отправляет пачки и ждёт подтверждения записи"""
+
+    def __init__(self, address=None, authkey=None, connect_timeout: float = 30.0):
+        self.address = address or tuple(INGEST_WRITER["address"])
+        self.authkey = authkey or INGEST_WRITER["authkey"]
+        self.connect_timeout = connect_timeout
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        deadline = time.monotonic() + self.connect_timeout
+        while True:
+            try:
+                return Client(self.address, authkey=self.authkey)
+            except (ConnectionRefusedError, FileNotFoundError):
+                # Писатель может ещё стартовать
+                if time.monotonic() > deadline:
+                    raise
+                time.sleep(0.5)
+
+    def _request(self, kind: str, payload):
+        with self._lock:
+            try:
+                if self._conn is None:
+                    self._conn = self._connect()
+                self._conn.send((kind, payload))
+                status, result = self._conn.recv()
+            except (EOFError, OSError):
+                # Соединение оборвалось: следующая попытка переподключится,
+                # а буфер вернёт строки в очередь
+                self._conn = None
+                raise
+        if status != "ok":
+            raise RuntimeError(f"Writer error: {result}")
+        return result
+
+    def _send(self, kind: str, rows: Iterable[Tuple]) -> int:
+        rows = list(rows)
+        if not rows:
+            return 0
+        return self._request(kind, rows)
+
+    def archive_cold_data(self, hot_days: Optional[int] = None) -> Dict[str, int]:
+        """Перенос в архив силами писателя (см. database.archive_cold_data)"""
+        return self._request("archive", (hot_days,))
+
+    def send_engagement(self, rows: Iterable[Tuple]) -> int:
+        return self._send("engagement", rows)
+
+    def send_snapshots(self, rows: Iterable[Tuple]) -> int:
+        return self._send("snapshots", rows)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - WRITER - %(levelname)s - %(message)s")
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    IngestWriterServer().serve_forever()
@@ -0,0 +1,148 @@
+# ingestion.py
+
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+from config import INGEST_SETTINGS
+from database import insert_engagement_data_many, make_engagement_row
+
+logger = logging.getLogger(__name__)
+
+
+def message_metrics(msg) -> Tuple[int, int, int]:
+    """Метрики сообщения Telethon: (просмотры, репосты, комментарии)"""
+    views = msg.views or 0
+    forwards = msg.forwards or 0
+    replies = msg.replies.replies if msg.replies else 0
+    return views, forwards, replies
+
+
+class WriteBehindBuffer:
+    """
+    Буфер отложенной записи для сборщика.
+
+    Строки копятся в памяти, повторные записи одного поста канала схлопываются
+    (остаётся последняя), а в базу они уходят пачкой одной транзакцией —
+    при достижении batch_size или по истечении flush_interval.
+    Сброс выполняется фоновым потоком и не блокирует цикл событий Telethon.
+    """
+
+    def __init__(
+        self,
+        sink: Callable[[Iterable[Tuple]], int] = insert_engagement_data_many,
+        batch_size: Optional[int] = None,
+        flush_interval: Optional[float] = None
+    ):
+        self._sink = sink
+        self.batch_size = batch_size or INGEST_SETTINGS["batch_size"]
+        self.flush_interval = flush_interval or INGEST_SETTINGS["flush_interval"]
+
+        self._pending: Dict[Tuple[str, str], Tuple] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._counters = {
+            "enqueued": 0,
+            "coalesced": 0,
+            "flushed_rows": 0,
+            "flushes": 0,
+            "failed_flushes": 0,
+            "flush_time_total": 0.0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0
+        }
+
+    def start(self) -> "WriteBehindBuffer":
+        """Запускает фоновый поток сброса"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+            self._thread.start()
+        return self
+
+    def add(
+        self,
+        post_id: str,
+        likes: int,
+        comments: int,
+        shares: int,
+        channel: str,
+        date: str = None
+    ) -> None:
+        """Ставит запись в очередь (валидация — сразу, запись в БД — позже)"""
+        row = make_engagement_row(post_id, likes, comments, shares, channel, date)
+        key = (channel, post_id)
+        with self._lock:
+            if key in self._pending:
+                self._counters["coalesced"] += 1
+            self._pending[key] = row
+            self._counters["enqueued"] += 1
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wakeup.set()
+
+    def flush(self) -> int:
+        """Сбрасывает накопленные записи в базу, возвращает число строк"""
+        with self._flush_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+            if not batch:
+                return 0
+
+            started = time.perf_counter()
+            try:
+                self._sink(batch.values())
+            except Exception as e:
+                self._requeue(batch)
+                self._counters["failed_flushes"] += 1
+                logger.error(f"Ошибка пакетной записи ({len(batch)} строк): {e}")
+                return 0
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self._counters["flushes"] += 1
+            self._counters["flushed_rows"] += len(batch)
+            self._counters["flush_time_total"] += elapsed_ms
+            self._counters["last_flush_ms"] = elapsed_ms
+            self._counters["max_flush_ms"] = max(self._counters["max_flush_ms"], elapsed_ms)
+            logger.debug(f"Сброшено {len(batch)} строк за {elapsed_ms:.1f} мс")
+            return len(batch)
+
+    def close(self, timeout: float = 10.0) -> None:
+        """Останавливает фоновый поток и сбрасывает остаток очереди"""
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+        if self.queue_depth:
+            logger.error(f"При остановке не записано строк: {self.queue_depth}")
+
+    @property
+    def queue_depth(self) -> int:
+        with self._lock:
+            return len(self._pending)
+
+    def stats(self) -> dict:
+        """Счётчики очереди: глубина, объём и задержка сбросов"""
+        stats = dict(self._counters)
+        stats["queue_depth"] = self.queue_depth
+        flushes = stats["flushes"]
+        stats["avg_flush_ms"] = stats["flush_time_total"] / flushes if flushes else 0.0
+        return stats
+
+    def _requeue(self, batch: Dict[Tuple[str, str], Tuple]) -> None:
+        """Возвращает несохранённые строки, не перетирая более свежие"""
+        with self._lock:
+            for key, row in batch.items():
+                self._pending.setdefault(key, row)
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self.flush()
@@ -0,0 +1,150 @@
+# live_summary.py
+
+import logging
+import threading
+import time
+from typing import Dict, Hashable, List, Tuple
+
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+from config import REPORT_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# Заголовки LLM-разделов в порядке документа
+SECTION_TITLES = {
+    "chart_1": "Сравнение метрик",
+    "chart_2": "Корреляция показателей",
+    "chart_3": "Активность по дням недели",
+    "charts": "Анализ визуализаций",
+    "advanced": "Глубинный анализ",
+    "recommendations": "Рекомендации"
+}
+# Раздел сравнительного отчёта по каналам (/report_channels)
+CHANNEL_SECTION_TITLES = {"channels": "Сравнительный анализ"}
+MESSAGE_LIMIT = 4000
+
+
+class LiveSummary:
+    """
+    «Живая» сводка отчёта в Telegram: пока собирается документ, текст
+    LLM-разделов появляется в одном сообщении у каждого получателя и
+    обновляется через edit_message_text не чаще live_edit_interval.
+    Сообщение создаётся по первому токену, поэтому готовый отчёт из кэша
+    лишних сообщений не порождает.
+    """
+
+    def __init__(self, job_id: int, subscribers: List[Tuple], interval: float = None, sections: Dict[str, str] = None):
+        self.job_id = job_id
+        self.sections = sections or SECTION_TITLES
+        self.subscribers = subscribers  # живой список получателей задачи
+        self.interval = REPORT_SETTINGS["live_edit_interval"] if interval is None else interval
+        self._texts: Dict[str, str] = {}
+        self._done: Dict[str, bool] = {}
+        self._messages: Dict[Hashable, int] = {}
+        self._last_edit = 0.0
+        self._dirty = False
+        self._finished = False
+        # _lock защищает состояние, _send_lock упорядочивает запросы к Telegram
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+
+    def on_section(self, section: str, text: str, done: bool) -> None:
+        """Подписчик ReportProgress: копит текст и правит сообщение по таймеру"""
+        with self._lock:
+            # Раздел, завершившийся после finish, не затирает итог
+            if self._finished:
+                return
+            self._texts[section] = text
+            self._done[section] = done
+            self._dirty = True
+            if time.monotonic() - self._last_edit < self.interval:
+                return
+        self._flush(wait=False)
+
+    def finish(self, status: str) -> None:
+        """Финальная правка: полный текст и итог сборки"""
+        with self._lock:
+            self._finished = True
+            if not (self._messages or self._texts):
+                return
+            self._dirty = True
+        self._flush(footer=status)
+
+    def _render(self, footer: str = None) -> str:
+        done = sum(self._done.values())
+        header = footer or f"📝 Отчёт #{self.job_id}: готово разделов {done} из {len(self.sections)}…"
+        sections = [key for key in self.sections if self._texts.get(key)]
+        budget = (MESSAGE_LIMIT - len(header)) // max(len(sections), 1) - 40
+        parts = [header]
+        for key in sections:
+            text = self._texts[key].strip()
+            if len(text) > budget:
+                text = text[:max(budget, 0)].rstrip() + "…"
+            mark = "✅" if self._done.get(key) else "⏳"
+            parts.append(f"\n{mark} {self.sections[key]}\n{text}")
+        return "\n".join(parts)[:MESSAGE_LIMIT]
+
+    def _flush(self, footer: str = None, wait: bool = True) -> None:
+        """
+        Отправка/правка сообщений. Текст собирается под self._lock, запросы
+        к Telegram идут вне его, чтобы не задерживать потоки разделов.
+        wait=False: если отправка уже идёт в другом потоке, свежий текст
+        уйдёт следующей правкой. Финальную правку, упёршуюся в лимит
+        Telegram, повторяем один раз через retry_after — следующей не будет
+        """
+        if not self._send_lock.acquire(blocking=wait):
+            return
+        try:
+            with self._lock:
+                # Промежуточная правка после finish не должна перекрыть итог
+                if not self._dirty or (footer is None and self._finished):
+                    return
+                text = self._render(footer)
+                self._dirty = False
+                # Отписавшиеся (/cancel) получают только финальную правку уже отправленного сообщения
+                targets = list(self.subscribers)
+                if footer is not None:
+                    targets += [t for t in self._messages if t not in targets]
+                messages = dict(self._messages)
+
+            last_edit = time.monotonic()
+            for bot, chat_id in targets:
+                message_id = messages.get((bot, chat_id))
+                try:
+                    self._deliver(bot, chat_id, message_id, text)
+                except RetryAfter as e:
+                    if footer is None:
+                        # Лимит Telegram на правки: следующая попытка не раньше retry_after
+                        last_edit = time.monotonic() + e.retry_after
+                        with self._lock:
+                            self._dirty = True
+                        break
+                    time.sleep(e.retry_after)
+                    try:
+                        self._deliver(bot, chat_id, message_id, text)
+                    except RetryAfter as e:
+                        logger.warning(f"Итог отчёта #{self.job_id} не отправлен в чат {chat_id}: {e}")
+            else:
+                last_edit = time.monotonic()
+            with self._lock:
+                self._last_edit = last_edit
+        finally:
+            self._send_lock.release()
+
+    def _deliver(self, bot, chat_id, message_id, text: str) -> None:
+        """Отправка или правка сообщения одного получателя; RetryAfter пробрасывается"""
+        try:
+            if message_id is None:
+                message_id = bot.send_message(chat_id=chat_id, text=text).message_id
+                with self._lock:
+                    self._messages[(bot, chat_id)] = message_id
+            else:
+                bot.edit_message_text(text=text, chat_id=chat_id, message_id=message_id)
+        except BadRequest as e:
+            if "not modified" not in str(e).lower():
+                logger.warning(f"Не удалось обновить сводку отчёта #{self.job_id} в чате {chat_id}: {e}")
+        except RetryAfter:
+            raise
+        except TelegramError as e:
+            logger.warning(f"Не удалось обновить сводку отчёта #{self.job_id} в чате {chat_id}: {e}")
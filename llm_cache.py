@@ -0,0 +1,161 @@
+# llm_cache.py
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+from config import LLM_CACHE_SETTINGS
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LLMCache:
+    """
+    Персистентный кэш ответов LLM в отдельной SQLite-базе.
+
+    Ключ — SHA-256 от модели, параметров генерации и промпта. Записи живут
+    не дольше ttl, а при превышении max_entries/max_bytes вытесняются
+    давно не использованные (LRU по last_access).
+    """
+
+    def __init__(self, settings: Optional[dict] = None):
+        self.settings = settings or LLM_CACHE_SETTINGS
+        self.enabled = self.settings["enabled"]
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        if self.enabled:
+            self._init_table()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.settings["path"], timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_table(self) -> None:
+        conn = self._connect()
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS llm_cache (
+            key TEXT PRIMARY KEY,
+            response TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_access ON llm_cache (last_access)")
+        conn.commit()
+        self._publish_size(conn)
+
+    def _publish_size(self, conn: sqlite3.Connection) -> None:
+        """Передаёт текущий размер кэша в metrics (/stats и экспорт)"""
+        entries, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        metrics.set_gauge("llm_cache_entries", entries)
+        metrics.set_gauge("llm_cache_bytes", size)
+
+    @staticmethod
+    def make_key(model: str, options: dict, prompt: str) -> str:
+        payload = json.dumps(
+            {"model": model, "options": options, "prompt": prompt},
+            sort_keys=True,
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Возвращает ответ из кэша или None (просроченные записи удаляются)"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT response, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.settings["ttl"]:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                conn.commit()
+                row = None
+            if row:
+                conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.warning(f"Ошибка чтения кэша LLM: {e}")
+            row = None
+
+        with self._lock:
+            if row:
+                self._hits += 1
+            else:
+                self._misses += 1
+        metrics.inc("llm_cache_hits" if row else "llm_cache_misses")
+        return row[0] if row else None
+
+    def put(self, key: str, response: str) -> None:
+        """Сохраняет ответ и вытесняет лишние записи"""
+        if not self.enabled:
+            return
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, response, size, created, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), now, now)
+            )
+            evicted = self._evict(conn)
+            conn.commit()
+            if evicted:
+                metrics.inc("llm_cache_evicted", evicted)
+            self._publish_size(conn)
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.warning(f"Ошибка записи в кэш LLM: {e}")
+
+    def _evict(self, conn: sqlite3.Connection) -> int:
+        """Удаляет просроченные и лишние записи, возвращает их число"""
+        expired = conn.execute("DELETE FROM llm_cache WHERE created < ?", (time.time() - self.settings["ttl"],)).rowcount
+        return expired + conn.execute("""
+        DELETE FROM llm_cache WHERE key IN (
+            SELECT key FROM (
+                SELECT key,
+                       ROW_NUMBER() OVER (ORDER BY last_access DESC) AS position,
+                       SUM(size) OVER (ORDER BY last_access DESC) AS running_size
+                FROM llm_cache
+            )
+            WHERE position > ? OR running_size > ?
+        )
+        """, (self.settings["max_entries"], self.settings["max_bytes"])).rowcount
+
+    def clear(self) -> None:
+        if not self.enabled:
+            return
+        conn = self._connect()
+        conn.execute("DELETE FROM llm_cache")
+        conn.commit()
+        self._publish_size(conn)
+
+    def stats(self) -> dict:
+        """Статистика попаданий и заполненности кэша"""
+        with self._lock:
+            hits, misses = self._hits, self._misses
+        stats = {
+            "enabled": self.enabled,
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+            "entries": 0,
+            "bytes": 0
+        }
+        if self.enabled:
+            entries, size = self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+            stats.update(entries=entries, bytes=size)
+        return stats
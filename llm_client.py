@@ -0,0 +1,272 @@
+# llm_client.py
+
+import json
+import logging
+import threading
+import time
+from typing import Callable, Optional
+
+import requests
+
+from config import LLM_SETTINGS, OLLAMA_API_URL
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class LLMUnavailable(Exception):
+    """Запрос не отправлялся: автомат разомкнут после серии ошибок Ollama"""
+
+
+class LLMTimeout(Exception):
+    """Ответ не уложился в дедлайн вызова или отчёта"""
+
+
+class LLMResult:
+    """Текст ответа и замеры вызова"""
+
+    __slots__ = ("text", "model", "latency", "tokens", "tokens_per_s")
+
+    def __init__(self, text: str, model: str, latency: float, tokens: int, tokens_per_s: float):
+        self.text = text
+        self.model = model
+        self.latency = latency
+        self.tokens = tokens
+        self.tokens_per_s = tokens_per_s
+
+
+class CircuitBreaker:
+    """
+    Автомат «замкнут → разомкнут → пробный запрос». После failures ошибок
+    подряд запросы не отправляются reset секунд, затем пропускается один
+    пробный: успех замыкает автомат, ошибка снова размыкает его
+    """
+
+    def __init__(self, failures: int, reset: float):
+        self.failures = failures
+        self.reset = reset
+        self._errors = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if time.monotonic() - self._opened_at >= self.reset else "open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Ollama отвечает, автомат LLM замкнут")
+            self._errors = 0
+            self._opened_at = None
+            self._probing = False
+
+    def release(self) -> None:
+        """Пробный запрос прерван не по вине сервера: следующий снова станет пробным"""
+        with self._lock:
+            self._probing = False
+
+    def failure(self) -> None:
+        with self._lock:
+            self._errors += 1
+            if self._probing or (self._opened_at is None and self._errors >= self.failures):
+                if not self._probing:
+                    metrics.inc("llm_breaker_opened")
+                    logger.warning(f"Ollama: {self._errors} ошибок подряд, запросы приостановлены на {self.reset:g} с")
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+
+class LLMClient:
+    """
+    Клиент Ollama /api/generate для разделов отчётов.
+
+    Одна сессия с пулом соединений на процесс; keep_alive держит модель
+    загруженной между разделами, warm_up загружает её заранее. Длина ответа
+    (num_predict) задаётся по разделу, размер контекста — num_ctx. Каждый
+    вызов ограничен call_timeout и дедлайном отчёта; после серии ошибок
+    автомат (CircuitBreaker) перестаёт нагружать недоступный сервер. Если
+    основная модель не укладывается в slo_seconds (скользящее среднее) или
+    до дедлайна отчёта осталось меньше её обычной задержки, запрос уходит
+    запасной модели; раз в probe_interval основной всё равно отправляется
+    пробный запрос, чтобы её оценка задержки обновлялась. Ответы, оборванные
+    дедлайном отчёта, в оценку не входят. Задержка и скорость генерации
+    пишутся в метрики.
+    """
+
+    def __init__(self, settings: dict = LLM_SETTINGS, url: Optional[str] = None, pool_size: int = 2):
+        self.settings = settings
+        self.url = url or OLLAMA_API_URL
+        self.model = settings["model"]
+        self.fallback_model = settings["fallback_model"]
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.breaker = CircuitBreaker(settings["breaker_failures"], settings["breaker_reset"])
+        # Скользящее среднее задержки по моделям, секунд
+        self._latency = {}
+        # Последний запрос к основной модели (time.monotonic())
+        self._primary_tried = time.monotonic()
+        self._lock = threading.Lock()
+
+    def options(self, section: Optional[str] = None) -> dict:
+        """Параметры генерации раздела (входят в ключ кэша ответов)"""
+        budgets = self.settings["num_predict"]
+        return dict(self.settings["options"], num_ctx=self.settings["num_ctx"],
+                    num_predict=budgets.get(section, budgets["default"]))
+
+    def _pick_model(self, remaining: Optional[float]) -> str:
+        if not self.fallback_model:
+            return self.model
+        now = time.monotonic()
+        slo = self.settings["slo_seconds"]
+        with self._lock:
+            expected = self._latency.get(self.model)
+            if expected is not None and (expected > slo or (remaining is not None and remaining < expected)):
+                # Пробный запрос основной модели, если на него хватает времени отчёта
+                probe = (now - self._primary_tried >= self.settings["probe_interval"]
+                         and (remaining is None or remaining >= slo))
+                if not probe:
+                    metrics.inc("llm_fallback")
+                    return self.fallback_model
+                metrics.inc("llm_primary_probes")
+            self._primary_tried = now
+        return self.model
+
+    def _record(self, model: str, latency: float) -> None:
+        with self._lock:
+            previous = self._latency.get(model)
+            self._latency[model] = latency if previous is None else 0.7 * previous + 0.3 * latency
+
+    def warm_up(self) -> bool:
+        """Загружает основную модель в память (пустой промпт) с keep_alive"""
+        try:
+            started = time.perf_counter()
+            self.session.post(
+                self.url,
+                json={"model": self.model, "prompt": "", "stream": False, "keep_alive": self.settings["keep_alive"]},
+                timeout=(self.settings["connect_timeout"], self.settings["warm_up_timeout"])
+            ).raise_for_status()
+            logger.info(f"Модель {self.model} загружена за {time.perf_counter() - started:.1f} с")
+            return True
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"Не удалось прогреть модель {self.model}: {e}")
+            return False
+
+    def generate(
+        self,
+        prompt: str,
+        section: Optional[str] = None,
+        deadline: Optional[float] = None,
+        on_text: Optional[Callable[[str], None]] = None
+    ) -> LLMResult:
+        """
+        Один ответ модели. deadline — время time.monotonic() окончания отчёта.
+        on_text включает потоковое чтение: получает накопленный текст (и может
+        прервать вызов исключением, например ReportCancelled)
+        """
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if remaining is not None and remaining <= 0:
+            raise LLMTimeout("Дедлайн отчёта истёк до запроса")
+        if not self.breaker.allow():
+            metrics.inc("llm_short_circuited")
+            raise LLMUnavailable("Ollama временно не опрашивается после серии ошибок")
+        model = self._pick_model(remaining)
+        timeout = self.settings["call_timeout"]
+        # Обрыв по дедлайну отчёта не говорит о неисправности сервера
+        by_deadline = remaining is not None and remaining < timeout
+        if by_deadline:
+            timeout = remaining
+        data = {
+            "model": model,
+            "prompt": prompt,
+            "stream": on_text is not None,
+            "keep_alive": self.settings["keep_alive"],
+            "options": self.options(section)
+        }
+
+        started = time.perf_counter()
+        try:
+            with metrics.timer("llm_request"):
+                if on_text is None:
+                    response = self.session.post(self.url, json=data, timeout=(self.settings["connect_timeout"], timeout))
+                    response.raise_for_status()
+                    final = response.json()
+                    text = final.get("response") or ""
+                else:
+                    text, final = self._stream(data, started + timeout, on_text)
+        except (requests.exceptions.Timeout, LLMTimeout) as e:
+            if by_deadline:
+                # Обрыв по дедлайну отчёта ничего не говорит о скорости модели
+                self.breaker.release()
+            else:
+                self.breaker.failure()
+                # Время до обрыва — нижняя оценка задержки: по ней включается запасная модель
+                self._record(model, time.perf_counter() - started)
+            metrics.inc("llm_timeouts")
+            if isinstance(e, LLMTimeout):
+                raise
+            raise LLMTimeout(str(e)) from e
+        except requests.exceptions.RequestException:
+            self.breaker.failure()
+            raise
+        except Exception:
+            # Отмена отчёта — не признак неисправности Ollama
+            self.breaker.release()
+            raise
+        self.breaker.success()
+
+        latency = time.perf_counter() - started
+        self._record(model, latency)
+        tokens = final.get("eval_count") or 0
+        eval_seconds = (final.get("eval_duration") or 0) / 1e9 or latency
+        tokens_per_s = tokens / eval_seconds if tokens else 0.0
+        metrics.inc("llm_tokens", tokens)
+        metrics.inc("llm_eval_seconds", eval_seconds)
+        logger.debug(f"LLM {model} [{section}]: {latency:.1f} с, {tokens} токенов, {tokens_per_s:.1f} ток/с")
+        return LLMResult(text, model, latency, tokens, tokens_per_s)
+
+    def _stream(self, data: dict, call_deadline: float, on_text: Callable[[str], None]):
+        """NDJSON-поток; соединение закрывается при дедлайне или исключении on_text"""
+        parts = []
+        started = time.perf_counter()
+        read_timeout = max(0.1, call_deadline - started)
+        with self.session.post(self.url, json=data, stream=True,
+                               timeout=(self.settings["connect_timeout"], read_timeout)) as response:
+            response.raise_for_status()
+            # chunk_size=None: строки отдаются по мере прихода чанков, без буферизации
+            for line in response.iter_lines(chunk_size=None):
+                if time.perf_counter() > call_deadline:
+                    raise LLMTimeout("Ответ не уложился в дедлайн")
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise requests.exceptions.RequestException(chunk["error"])
+                if chunk.get("response"):
+                    if not parts:
+                        metrics.observe("llm_first_token", time.perf_counter() - started)
+                    parts.append(chunk["response"])
+                    on_text("".join(parts))
+                if chunk.get("done"):
+                    return "".join(parts), chunk
+        return "".join(parts), {}
+
+    def describe(self) -> str:
+        with self._lock:
+            latency = ", ".join(f"{model} ~{value:.1f} с" for model, value in self._latency.items()) or "нет замеров"
+        return f"LLM: {self.model} (запасная: {self.fallback_model or 'нет'}), автомат {self.breaker.state}, задержка {latency}"
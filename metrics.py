@@ -0,0 +1,259 @@
+# metrics.py
+
+import bisect
+import functools
+import glob
+import logging
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+from config import METRICS_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+# Границы гистограмм длительностей, секунд (как принято в Prometheus)
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 180)
+PREFIX = "marketbot_"
+
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными границами (без хранения замеров)"""
+
+    __slots__ = ("counts", "count", "sum", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по верхней границе корзины (не больше максимума)"""
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank and n:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+
+class MetricsRegistry:
+    """
+    Счётчики и таймеры этапов (SQL, статистика, графики, LLM, docx, сборщик).
+
+    Запись — одно обновление словаря под блокировкой, поэтому инструментирование
+    годится и для горячего пути сборщика. Снимок выводится командой /stats и,
+    по настройке, экспортируется в формате Prometheus (файл и/или HTTP).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        # Текущие значения (размер кэша и т.п.), а не накопленные счётчики
+        self.gauges: Dict[str, float] = {}
+        self.started = time.time()
+
+    def inc(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self.gauges[name] = value
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    def timer(self, name: str) -> "_Timer":
+        """with metrics.timer("report_charts"): ..."""
+        return _Timer(self, name)
+
+    def timed(self, name: str):
+        """Декоратор: длительность каждого вызова функции"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with _Timer(self, name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+            self.gauges.clear()
+            self.started = time.time()
+
+    def render_text(self) -> str:
+        """Сводка для /stats"""
+        with self._lock:
+            lines = [f"⏱ Метрики процесса за {(time.time() - self.started) / 60:.0f} мин"]
+            if self.histograms:
+                lines.append("Этапы (вызовов · среднее · p50 · p95 · макс, мс):")
+                for name, h in sorted(self.histograms.items()):
+                    lines.append(
+                        f"• {name}: {h.count} · {h.sum / h.count * 1000:.1f} · {h.quantile(0.5) * 1000:.0f}"
+                        f" · {h.quantile(0.95) * 1000:.0f} · {h.max * 1000:.0f}"
+                    )
+            if self.counters:
+                lines.append("Счётчики:")
+                lines += [f"• {name}: {value:g}" for name, value in sorted(self.counters.items())]
+            if self.gauges:
+                lines.append("Текущие значения:")
+                lines += [f"• {name}: {value:g}" for name, value in sorted(self.gauges.items())]
+            if not self.histograms and not self.counters and not self.gauges:
+                lines.append("Замеров пока нет.")
+        return "\n".join(lines)
+
+    def render_prometheus(self) -> str:
+        """Текстовый формат экспозиции Prometheus"""
+        with self._lock:
+            out = []
+            for name, value in sorted(self.counters.items()):
+                metric = f"{PREFIX}{name}_total"
+                out += [f"# TYPE {metric} counter", f"{metric} {value:g}"]
+            for name, value in sorted(self.gauges.items()):
+                metric = f"{PREFIX}{name}"
+                out += [f"# TYPE {metric} gauge", f"{metric} {value:g}"]
+            for name, h in sorted(self.histograms.items()):
+                metric = f"{PREFIX}{name}_seconds"
+                out.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, n in zip(list(BUCKETS) + ["+Inf"], h.counts):
+                    cumulative += n
+                    out.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+                out += [f"{metric}_sum {h.sum:.6f}", f"{metric}_count {h.count}"]
+            out.append(f"{PREFIX}process_start_time_seconds {self.started:.0f}")
+        return "\n".join(out) + "\n"
+
+
+class _Timer:
+    __slots__ = ("registry", "name", "started")
+
+    def __init__(self, registry: MetricsRegistry, name: str):
+        self.registry = registry
+        self.name = name
+
+    def __enter__(self) -> "_Timer":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.registry.observe(self.name, time.perf_counter() - self.started)
+        if exc_type is not None:
+            self.registry.inc(f"{self.name}_errors")
+
+
+# Реестр процесса: бот, сборщик и писатель — отдельные процессы со своими метриками
+metrics = MetricsRegistry()
+
+
+class _PrometheusHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        body = metrics.render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def _write_file(path: str) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(metrics.render_prometheus())
+    os.replace(tmp_path, path)
+
+
+def start_exporter(process: str, port_offset: int = 0, settings: dict = METRICS_SETTINGS) -> None:
+    """
+    Экспорт метрик процесса по настройкам METRICS_SETTINGS:
+    файл <dir>/<process>.prom, перезаписываемый каждые interval секунд,
+    и/или HTTP-эндпоинт на http_port + port_offset
+    """
+    if settings["dir"]:
+        os.makedirs(settings["dir"], exist_ok=True)
+        path = os.path.join(settings["dir"], f"{process}.prom")
+
+        def export_loop():
+            while True:
+                try:
+                    _write_file(path)
+                except OSError as e:
+                    logger.warning(f"Не удалось записать метрики в {path}: {e}")
+                time.sleep(settings["interval"])
+
+        threading.Thread(target=export_loop, name="metrics-file", daemon=True).start()
+
+    if settings["http_port"]:
+        port = settings["http_port"] + port_offset
+        server = ThreadingHTTPServer(("127.0.0.1", port), _PrometheusHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info(f"Метрики Prometheus: http://127.0.0.1:{port}/metrics")
+
+
+def _exported_gauges(path: str) -> set:
+    """Имена метрик-значений (# TYPE ... gauge) в файле экспорта, без префикса"""
+    with open(path, encoding="utf-8") as f:
+        return {
+            line.split()[2][len(PREFIX):] for line in f
+            if line.startswith("# TYPE ") and line.rstrip().endswith(" gauge")
+        }
+
+
+def read_exported(exclude: Optional[str] = None, settings: dict = METRICS_SETTINGS) -> Dict[str, List[str]]:
+    """
+    Краткая сводка из файлов экспорта других процессов (сборщик и т.п.):
+    {процесс: ["имя: значение", ...]} — счётчики, текущие значения и средние длительности
+    """
+    if not settings["dir"]:
+        return {}
+    summaries = {}
+    for path in sorted(glob.glob(os.path.join(settings["dir"], "*.prom"))):
+        process = os.path.splitext(os.path.basename(path))[0]
+        if process == exclude:
+            continue
+        values = {}
+        try:
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if line.startswith("#") or "{" in line or not line.strip():
+                        continue
+                    name, value = line.rsplit(" ", 1)
+                    values[name[len(PREFIX):]] = float(value)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Не удалось прочитать метрики {path}: {e}")
+            continue
+        lines = []
+        gauges = _exported_gauges(path)
+        for name, value in values.items():
+            if name.endswith("_total"):
+                lines.append(f"{name[:-len('_total')]}: {value:g}")
+            elif name.endswith("_seconds_count") and value:
+                base = name[:-len("_count")]
+                lines.append(f"{base[:-len('_seconds')]}: {value:g} · {values[base + '_sum'] / value * 1000:.1f} мс")
+            elif name in gauges:
+                lines.append(f"{name}: {value:g}")
+        summaries[process] = lines
+    return summaries
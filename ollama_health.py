@@ -0,0 +1,79 @@
+# ollama_health.py
+
+import logging
+import threading
+import time
+from typing import Optional
+
+import requests
+
+from config import OLLAMA_API_URL, OLLAMA_HEALTH_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+
+class OllamaHealth:
+    """
+    Периодически обновляемый статус доступности Ollama.
+
+    Недоступность сервера не мешает запуску: проверка идёт в фоновом
+    потоке, а статус только показывается администраторам и в логах.
+    Смена состояния (доступна ↔ недоступна) логируется один раз.
+    """
+
+    def __init__(self, url: str = OLLAMA_API_URL, settings: dict = OLLAMA_HEALTH_SETTINGS):
+        # GET корня сервера отвечает "Ollama is running" без загрузки модели
+        self.url = url.split("/api/")[0] + "/"
+        self.interval = settings["interval"]
+        self.timeout = settings["timeout"]
+        self.available: Optional[bool] = None  # None — ещё не проверяли
+        self.latency_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def check(self) -> bool:
+        """Одна проверка; исключения не выбрасывает"""
+        started = time.perf_counter()
+        detail = None
+        try:
+            requests.get(self.url, timeout=self.timeout).raise_for_status()
+            available, error = True, None
+        except requests.exceptions.RequestException as e:
+            available, error, detail = False, type(e).__name__, str(e)
+        with self._lock:
+            changed = available != self.available
+            self.available = available
+            self.latency_ms = (time.perf_counter() - started) * 1000
+            self.last_error = error
+            self.checked_at = time.time()
+        if changed and available:
+            logger.info(f"Ollama доступна ({self.latency_ms:.0f} мс)")
+        elif changed:
+            logger.warning(f"Ollama недоступна, LLM-разделы отчётов будут заменены заглушками: {detail}")
+        return available
+
+    def start(self) -> "OllamaHealth":
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="ollama-health", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.check()
+            self._stop.wait(self.interval)
+
+    def describe(self) -> str:
+        with self._lock:
+            if self.available is None:
+                return "Ollama: статус ещё не проверен"
+            age = time.time() - self.checked_at
+            if self.available:
+                return f"Ollama: ✅ доступна ({self.latency_ms:.0f} мс, проверено {age:.0f} с назад)"
+            return f"Ollama: ❌ недоступна ({self.last_error}, проверено {age:.0f} с назад)"
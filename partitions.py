@@ -0,0 +1,179 @@
+# partitions.py
+"""
+Холодные помесячные архивы engagement_data.
+
+Строки старше горизонта ARCHIVE_SETTINGS["hot_days"] переносятся из
+основной («горячей») базы в файлы <dir>/engagement_YYYY_MM.db — по
+одному на календарный месяц UTC. Архив компактнее горячей таблицы:
+WITHOUT ROWID-таблица, кластеризованная по (ts, channel, post_id), без
+текстовой даты и без вторичных индексов; после каждой дозаписи файл
+сжимается VACUUM. Чтение идёт через ATTACH в режиме только для чтения и
+подключает лишь месяцы, пересекающиеся с запрошенным диапазоном.
+
+Перенос (database.archive_cold_data) запускается единым писателем
+(ingest_writer.py) по расписанию или вручную:
+    python partitions.py --archive [--hot-days 180] [--remote-writer]
+"""
+
+import logging
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import quote
+
+from config import ARCHIVE_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_TABLE = "engagement_archive"
+ARCHIVE_ALIAS = "cold"
+# Условие запроса к архиву: строку скрывает горячая строка того же поста
+# (ключи горячих строк передаются в iter_archives как hidden)
+NOT_HIDDEN_SQL = (
+    "NOT EXISTS (SELECT 1 FROM temp.hidden_posts h "
+    "WHERE h.channel = {table}.channel AND h.post_id = {table}.post_id)"
+)
+_FILE_RE = re.compile(r"^engagement_(\d{4})_(\d{2})\.db$")
+
+_listing_lock = threading.Lock()
+_listing: Tuple[Optional[int], List[Tuple[int, int, str]]] = (None, [])
+
+
+def month_bounds(ts: int) -> Tuple[int, int]:
+    """Полуинтервал календарного месяца UTC, содержащего ts"""
+    dt = datetime.fromtimestamp(ts, timezone.utc)
+    start = datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+    end = datetime(dt.year + dt.month // 12, dt.month % 12 + 1, 1, tzinfo=timezone.utc)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def partition_path(month_start: int, root: Optional[str] = None) -> str:
+    dt = datetime.fromtimestamp(month_start, timezone.utc)
+    return os.path.join(root or ARCHIVE_SETTINGS["dir"], f"engagement_{dt.year:04d}_{dt.month:02d}.db")
+
+
+def list_partitions(root: Optional[str] = None) -> List[Tuple[int, int, str]]:
+    """(начало, конец, путь) архивов по возрастанию месяца; перечитывается при изменении каталога"""
+    global _listing
+    root = root or ARCHIVE_SETTINGS["dir"]
+    try:
+        mtime = os.stat(root).st_mtime_ns
+    except FileNotFoundError:
+        return []
+    with _listing_lock:
+        if _listing[0] == mtime:
+            return _listing[1]
+        partitions = []
+        for name in os.listdir(root):
+            match = _FILE_RE.match(name)
+            if match:
+                start = int(datetime(int(match[1]), int(match[2]), 1, tzinfo=timezone.utc).timestamp())
+                partitions.append((*month_bounds(start), os.path.join(root, name)))
+        partitions.sort()
+        _listing = (mtime, partitions)
+        return partitions
+
+
+def overlapping_partitions(start_ts: int, end_ts: int) -> List[Tuple[int, int, str]]:
+    """Архивы, пересекающиеся с полуинтервалом [start_ts, end_ts)"""
+    return [p for p in list_partitions() if p[0] < end_ts and p[1] > start_ts]
+
+
+def create_archive_table(conn: sqlite3.Connection, schema: str = ARCHIVE_ALIAS) -> None:
+    """Таблица архива в подключённой базе schema"""
+    conn.execute(f"""
+    CREATE TABLE IF NOT EXISTS {schema}.{ARCHIVE_TABLE} (
+        ts INTEGER NOT NULL,
+        channel TEXT NOT NULL,
+        post_id TEXT NOT NULL,
+        likes INTEGER NOT NULL,
+        comments INTEGER NOT NULL,
+        shares INTEGER NOT NULL,
+        id INTEGER NOT NULL,
+        PRIMARY KEY (ts, channel, post_id)
+    ) WITHOUT ROWID
+    """)
+
+
+def _readonly_uri(path: str) -> str:
+    return f"file:{quote(os.path.abspath(path))}?mode=ro"
+
+
+def iter_archives(
+    sql: str,
+    params: tuple,
+    partitions: List[Tuple[int, int, str]],
+    chunk_size: int,
+    hidden: Iterable[Tuple[str, str]] = ()
+) -> Iterator[List[Tuple]]:
+    """
+    Выполняет sql (таблица — {table}) по очереди в каждом архиве и отдаёт
+    строки пачками. Архивы подключаются к отдельному соединению в памяти
+    по одному: лимит ATTACH не ограничивает длину диапазона, а открытые
+    курсоры горячей базы не мешают подключению. Ключи (channel, post_id)
+    из hidden доступны условию NOT_HIDDEN_SQL
+    """
+    conn = sqlite3.connect("file::memory:", uri=True)
+    try:
+        conn.execute("CREATE TEMP TABLE hidden_posts (channel TEXT, post_id TEXT, PRIMARY KEY (channel, post_id))")
+        conn.executemany("INSERT OR IGNORE INTO temp.hidden_posts VALUES (?, ?)", hidden)
+        # Открытая транзакция не дала бы отключить архив (DETACH)
+        conn.commit()
+        for _, _, path in partitions:
+            conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_ALIAS}", (_readonly_uri(path),))
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql.format(table=f"{ARCHIVE_ALIAS}.{ARCHIVE_TABLE}"), params)
+                while True:
+                    rows = cursor.fetchmany(chunk_size)
+                    if not rows:
+                        break
+                    yield rows
+            finally:
+                cursor.close()
+                conn.execute(f"DETACH DATABASE {ARCHIVE_ALIAS}")
+    except sqlite3.Error as e:
+        logger.error(f"Ошибка чтения архива: {e}", exc_info=True)
+        raise RuntimeError(f"Database error: {str(e)}") from e
+    finally:
+        conn.close()
+
+
+def vacuum_partition(path: str) -> None:
+    """Сжимает архив после дозаписи"""
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("VACUUM")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    import argparse
+    from database import archive_cold_data, create_engagement_table
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - ARCHIVE - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--archive", action="store_true", help="перенести холодные строки в архивы")
+    parser.add_argument("--hot-days", type=int, help=f"горизонт горячих данных, дней (по умолчанию {ARCHIVE_SETTINGS['hot_days']})")
+    parser.add_argument("--remote-writer", action="store_true",
+                        help="перенос выполняет запущенный писатель ingest_writer.py, а не этот процесс")
+    args = parser.parse_args()
+
+    if args.archive:
+        if args.remote_writer:
+            from ingest_writer import RemoteWriter
+            writer = RemoteWriter()
+            try:
+                moved = writer.archive_cold_data(args.hot_days)
+            finally:
+                writer.close()
+        else:
+            create_engagement_table()
+            moved = archive_cold_data(args.hot_days)
+        print(f"✅ Перенесено в архив: {sum(moved.values())} строк, месяцев: {len(moved)}")
+    for start, _, path in list_partitions():
+        print(f"{datetime.fromtimestamp(start, timezone.utc):%Y-%m}  {os.path.getsize(path) / 1024:10.0f} КБ  {path}")
@@ -0,0 +1,130 @@
+# quick_summary.py
+
+import html
+import io
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from config import QUICK_SETTINGS
+from database import (
+    CHANNEL_TOTAL_COLUMNS, ROLLUP_COLUMNS, ROLLUP_METRICS, ROLLUP_TABLES,
+    get_channel_totals_between, get_rollup_data_between, period_to_epoch
+)
+from metrics import metrics
+
+# Гранулярность предагрегатов для окна периода (ключи — PERIOD_MAPPING)
+QUICK_GRANULARITY = {"daily": "hourly", "week": "hourly", "month": "daily", "year": "daily"}
+METRIC_TITLES = {"likes": "Лайки", "comments": "Комментарии", "shares": "Репосты"}
+
+_TOTAL_INDEX = {name: i for i, name in enumerate(CHANNEL_TOTAL_COLUMNS)}
+_ROLLUP_INDEX = {name: i for i, name in enumerate(ROLLUP_COLUMNS)}
+
+# Фигура спарклайна создаётся один раз: на каждый запрос меняются только данные линии
+_sparkline_lock = threading.Lock()
+_sparkline = None
+
+
+def _totals(rows: List[Tuple]) -> dict:
+    """Сумма итогов каналов: постов и каждой метрики"""
+    totals = {"posts": sum(row[_TOTAL_INDEX["posts"]] for row in rows)}
+    for m in ROLLUP_METRICS:
+        totals[m] = sum(row[_TOTAL_INDEX[f"{m}_sum"]] for row in rows)
+    totals["engagement"] = sum(totals[m] for m in ROLLUP_METRICS)
+    return totals
+
+
+def _per_post(row: Tuple) -> float:
+    """Вовлечённость на пост по строке итогов канала"""
+    return sum(row[_TOTAL_INDEX[f"{m}_sum"]] for m in ROLLUP_METRICS) / row[_TOTAL_INDEX["posts"]]
+
+
+def _delta(current: float, previous: float) -> str:
+    if not previous:
+        return "новое" if current else "без изменений"
+    change = (current - previous) / previous * 100
+    if abs(change) < 0.5:
+        return "≈ 0%"
+    return f"{'▲' if change > 0 else '▼'} {abs(change):.0f}%"
+
+
+def _number(value: float) -> str:
+    return f"{value:,.0f}".replace(",", " ") if value >= 100 else f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def render_sparkline(values: List[float]) -> bytes:
+    """Маленький PNG динамики (без осей) на переиспользуемой фигуре"""
+    global _sparkline
+    with _sparkline_lock:
+        if _sparkline is None:
+            # Только объектный API Agg: pyplot и графики отчётов для этого не нужны
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            from matplotlib.figure import Figure
+            fig = Figure(figsize=QUICK_SETTINGS["sparkline_size"], dpi=100)
+            FigureCanvasAgg(fig)
+            ax = fig.add_axes([0.02, 0.1, 0.96, 0.8])
+            ax.axis("off")
+            line, = ax.plot([], [], linewidth=1.5, color="#2E74B5")
+            last, = ax.plot([], [], "o", markersize=3, color="#C00000")
+            _sparkline = (fig, ax, line, last)
+        fig, ax, line, last = _sparkline
+        xs = list(range(len(values)))
+        line.set_data(xs, values)
+        last.set_data(xs[-1:], values[-1:])
+        low, high = min(values), max(values)
+        pad = (high - low) * 0.1 or 1
+        ax.set_xlim(0, max(len(values) - 1, 1))
+        ax.set_ylim(low - pad, high + pad)
+        stream = io.BytesIO()
+        fig.savefig(stream, format="png", dpi=100)
+        return stream.getvalue()
+
+
+def _series(start_ts: int, end_ts: int, granularity: str) -> List[float]:
+    """Суммарная вовлечённость по бакетам окна (пустые бакеты — нули)"""
+    width = ROLLUP_TABLES[granularity][1]
+    values = [0.0] * max(1, -(-(end_ts - start_ts) // width))
+    for row in get_rollup_data_between(start_ts, end_ts, granularity=granularity):
+        index = (row[_ROLLUP_INDEX["bucket"]] - start_ts) // width
+        if 0 <= index < len(values):
+            values[index] += sum(row[_ROLLUP_INDEX[f"{m}_sum"]] for m in ROLLUP_METRICS)
+    return values
+
+
+def build_quick_summary(period: str, sparkline: Optional[bool] = None) -> Tuple[str, Optional[bytes]]:
+    """
+    HTML-сводка за период с изменением к предыдущему такому же окну и,
+    по настройке, PNG-спарклайн. Только итоги из предагрегатов — без
+    сырых строк, графиков отчёта, LLM и docx
+    """
+    with metrics.timer("quick_summary"):
+        start_ts, end_ts = period_to_epoch(period)
+        granularity = QUICK_GRANULARITY[period]
+        start_ts -= start_ts % ROLLUP_TABLES[granularity][1]
+        previous_start = start_ts - (end_ts - start_ts)
+
+        rows = get_channel_totals_between(start_ts, end_ts, granularity)
+        current = _totals(rows)
+        previous = _totals(get_channel_totals_between(previous_start, start_ts, granularity))
+
+        since = datetime.fromtimestamp(start_ts, timezone.utc).strftime("%d.%m %H:%M")
+        lines = [f"<b>📊 Сводка за {html.escape(period)}</b> (с {since} UTC, к предыдущему периоду)"]
+        if not current["posts"]:
+            lines.append("Постов за период нет.")
+            return "\n".join(lines), None
+
+        lines.append(f"Постов: <b>{_number(current['posts'])}</b> ({_delta(current['posts'], previous['posts'])})")
+        for m in ROLLUP_METRICS:
+            lines.append(f"{METRIC_TITLES[m]}: <b>{_number(current[m])}</b> ({_delta(current[m], previous[m])})")
+        per_post = current["engagement"] / current["posts"]
+        previous_per_post = previous["engagement"] / previous["posts"] if previous["posts"] else 0
+        lines.append(f"Вовлечённость на пост: <b>{_number(per_post)}</b> ({_delta(per_post, previous_per_post)})")
+
+        best = max(rows, key=_per_post)
+        lines.append(f"Каналов: {len(rows)}, лучший по вовлечённости поста: "
+                     f"<code>{html.escape(str(best[0]))}</code> — {_number(_per_post(best))}")
+
+        png = None
+        if QUICK_SETTINGS["sparkline"] if sparkline is None else sparkline:
+            png = render_sparkline(_series(start_ts, end_ts, granularity))
+        return "\n".join(lines), png
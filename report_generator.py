@@ -1,32 +1,77 @@
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 from docx import Document
 from docx.shared import Inches, Pt, RGBColor
 from docx.enum.text import WD_PARAGRAPH_ALIGNMENT
 import io
 import requests
-import json
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
 from datetime import datetime
-from database import get_engagement_data_by_range
-from config import OLLAMA_API_URL
+from typing import Callable, Dict, Optional, Tuple
+from database import (
+    ROLLUP_TABLES, date_range_to_epoch, get_channel_totals_between, get_data_fingerprint,
+    get_rollup_data, get_rollup_data_between, iter_engagement_metrics_between, period_to_epoch
+)
+from config import LLM_SETTINGS, REPORT_SETTINGS
 import logging
-from database import get_engagement_data
+from engagement_stats import ChannelComparison, EngagementSummary, StreamingStats
+from engagement_analytics import WEEKDAYS_RU, EngagementAnalytics
+from llm_cache import LLMCache
+from llm_client import LLMClient, LLMTimeout, LLMUnavailable
+from charts import ChartRenderer
+from report_store import ReportArtifactStore
+from report_scheduler import ROLLUP_PERIODS, period_params, period_window
+from metrics import metrics
+from report_progress import ReportCancelled, ReportProgress
 
 logger = logging.getLogger(__name__)
 
+# Гранулярность рядов в сравнении каналов (остальные периоды и диапазоны — по суткам)
+CHANNEL_GRANULARITY = {"daily": "hourly", "week": "hourly"}
+
+# Текст раздела, который не успел сгенерироваться к дедлайну отчёта
+SECTION_TIMEOUT_PLACEHOLDER = "Раздел не успел сформироваться: модель не ответила вовремя."
+# Текст раздела, пропущенного, пока запросы к Ollama приостановлены после серии ошибок
+SECTION_UNAVAILABLE_PLACEHOLDER = "Раздел пропущен: модель временно недоступна."
+
 def hex_to_rgb_color(hex_color: str) -> RGBColor:
     hex_color = hex_color.lstrip('#')
     r, g, b = tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
     return RGBColor(r, g, b)
 
 class ReportGenerator:
-    def __init__(self):
-        self.ollama_url = OLLAMA_API_URL
-        self.headers = {"Content-Type": "application/json"}
-        self._validate_connection()
+    def __init__(
+        self,
+        use_llm_cache: bool = True,
+        store: Optional[ReportArtifactStore] = None,
+        llm_concurrency: Optional[int] = None
+    ):
+        self.llm_cache = LLMCache()
+        self.use_llm_cache = use_llm_cache and self.llm_cache.enabled
+        # Общие для всех отчётов процесса клиент и пул: лимит параллельных
+        # запросов защищает единственный локальный экземпляр Ollama
+        # (процессы отчётов передают свою долю общего лимита)
+        concurrency = llm_concurrency or REPORT_SETTINGS["llm_concurrency"]
+        self.llm = LLMClient(pool_size=concurrency)
+        self._llm_pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="llm")
+        # Раздел, который генерирует текущий поток пула, дедлайн и прогресс
+        # его отчёта: при наличии прогресса _query_llama читает ответ потоком
+        self._section = threading.local()
+        self.charts = ChartRenderer()
+        self.store = store or ReportArtifactStore()
+        # Доступность Ollama здесь не проверяется: при недоступном сервере
+        # LLM-разделы получают заглушки, а за статусом следит OllamaHealth
         self._init_styles()
 
+    def warm_up(self) -> None:
+        """Загрузка модели в Ollama до первого отчёта (по настройке LLM_SETTINGS["warm_up"])"""
+        if LLM_SETTINGS["warm_up"]:
+            self.llm.warm_up()
+
+    def describe(self) -> str:
+        return self.llm.describe()
+
     def _init_styles(self):
         self.styles = {
             'title': {'font_size': 16, 'bold': True, 'color': '#1F497D'},
@@ -45,66 +90,80 @@ class ReportGenerator:
         if style.get('color'):
             run.font.color.rgb = hex_to_rgb_color(style['color'])
 
-    def _validate_connection(self):
+    def _query_llama(self, prompt: str, use_cache: bool = True) -> str:
+        prompt = f"{prompt}\nОтвет должен быть на русском языке."
+        section = getattr(self._section, "key", None)
+        use_cache = use_cache and self.use_llm_cache
+        cache_key = LLMCache.make_key(self.llm.model, self.llm.options(section), prompt)
+        if use_cache:
+            cached = self.llm_cache.get(cache_key)
+            if cached is not None:
+                metrics.inc("llm_cache_hits")
+                return cached
+        progress = getattr(self._section, "progress", None)
+        on_text = None
+        if progress is not None and REPORT_SETTINGS["stream_llm"]:
+            def on_text(text: str) -> None:
+                # При отмене исключение закрывает соединение и прерывает генерацию
+                progress.check()
+                progress.section_update(section, text)
         try:
-            requests.get(self.ollama_url, timeout=5)
-        except Exception as e:
-            logger.error(f"Ошибка подключения к Ollama: {str(e)}")
-            raise RuntimeError("Сервер Ollama недоступен")
-
-    def _query_llama(self, prompt: str) -> str:
-        data = {
-            "model": "llama3",
-            "prompt": f"{prompt}\nОтвет должен быть на русском языке.",
-            "stream": False,
-            "options": {"temperature": 0.5, "top_p": 0.9}
-        }
-        try:
-            response = requests.post(self.ollama_url, headers=self.headers, data=json.dumps(data), timeout=30)
-            response.raise_for_status()
-            return response.json().get("response", "Не удалось получить ответ")
+            result = self.llm.generate(prompt, section, getattr(self._section, "deadline", None), on_text)
+        except LLMTimeout as e:
+            logger.warning(f"Раздел {section} не уложился в дедлайн: {e}")
+            return SECTION_TIMEOUT_PLACEHOLDER
+        except LLMUnavailable:
+            return SECTION_UNAVAILABLE_PLACEHOLDER
         except requests.exceptions.RequestException as e:
+            metrics.inc("llm_errors")
             logger.error(f"Ошибка запроса: {str(e)}")
             return "Ошибка анализа данных"
+        if not result.text:
+            return "Не удалось получить ответ"
+        # Ответ запасной модели не кэшируется: следующий отчёт получит ответ основной
+        if use_cache and result.model == self.llm.model:
+            self.llm_cache.put(cache_key, result.text)
+        return result.text
 
-    def _prepare_dataframe(self, raw_data: list, columns: list) -> pd.DataFrame:
-        df = pd.DataFrame(raw_data, columns=columns)
-        if df.empty:
-            raise ValueError("Нет данных для анализа")
-        df['date'] = pd.to_datetime(df['date'], errors='coerce')
-        if df['date'].isnull().any():
-            raise ValueError("Некорректный формат даты в данных")
-        return df.sort_values('date').reset_index(drop=True)
-
-    def _create_chart(self, fig_func) -> io.BytesIO:
-        img_stream = io.BytesIO()
-        fig_func()
-        plt.savefig(img_stream, format='png', bbox_inches='tight', dpi=120)
-        img_stream.seek(0)
-        plt.close()
-        return img_stream
-
-    def _create_metric_comparison(self, df):
-        def plot():
-            metrics = df[['likes', 'comments', 'shares']].mean()
-            sns.barplot(x=metrics.index, y=metrics.values, palette="viridis")
-            plt.title("Сравнение средних показателей")
-            plt.ylabel("Количество")
-        return self._create_chart(plot)
-
-    def _create_correlation_matrix(self, df):
-        def plot():
-            corr = df[['likes', 'comments', 'shares']].corr()
-            sns.heatmap(corr, annot=True, cmap='coolwarm', fmt=".2f")
-            plt.title("Корреляция между показателями")
-        return self._create_chart(plot)
-
-    def _create_weekly_trend(self, df):
-        def plot():
-            df['weekday'] = df['date'].dt.day_name()
-            sns.lineplot(data=df, x='weekday', y='likes', estimator='sum', sort=False, marker='o')
-            plt.title("Активность по дням недели")
-        return self._create_chart(plot)
+    def _analyze_period(self, period: str) -> Tuple[EngagementSummary, EngagementAnalytics]:
+        granularity = ROLLUP_PERIODS.get(period)
+        if granularity:
+            rows = get_rollup_data(period, granularity=granularity)
+            analytics = EngagementAnalytics(unit="day")
+            analytics.update_rollups(get_rollup_data(period, granularity="hourly"), rows)
+            return EngagementSummary.from_rollups(rows), analytics
+        return self._analyze_range(*period_to_epoch(period))
+
+    def _analyze_range(self, start_ts: int, end_ts: int) -> Tuple[EngagementSummary, EngagementAnalytics]:
+        """
+        Один потоковый проход по сырым строкам: агрегаты сводки и локальная
+        аналитика (аномалии, слоты публикаций); память не растёт с длиной диапазона
+        """
+        stats = StreamingStats()
+        analytics = EngagementAnalytics()
+        chunks = iter_engagement_metrics_between(
+            start_ts, end_ts, chunk_size=REPORT_SETTINGS["stream_chunk_size"], with_post=True)
+        for chunk in chunks:
+            numeric = analytics.update(chunk)
+            stats.update_arrays(numeric[:, 0], numeric[:, 1:].astype(float))
+        return stats.to_summary(), analytics
+
+    def _render_charts(self, summary: EngagementSummary) -> Dict[int, io.BytesIO]:
+        """Графики 1–3 по агрегатам сводки (параллельно и с мемоизацией)"""
+        def series(values: pd.Series) -> dict:
+            return {"labels": [str(label) for label in values.index], "values": [float(v) for v in values.values]}
+
+        corr = summary.corr.astype(float)
+        with metrics.timer("report_charts"):
+            charts = self.charts.render_many({
+                1: ("metric_comparison", series(summary.means)),
+                2: ("correlation_matrix", {
+                    "labels": [str(label) for label in corr.columns],
+                    "values": [[None if pd.isna(v) else float(v) for v in row] for row in corr.values]
+                }),
+                3: ("weekly_trend", series(summary.weekday_likes))
+            })
+        return charts
 
     def _add_table(self, doc, data, headers):
         table = doc.add_table(rows=1, cols=len(headers), style='Table Grid')
@@ -119,50 +178,141 @@ class ReportGenerator:
                 cell.text = str(value)
                 cell.paragraphs[0].alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
 
-    def _generate_chart_analysis_individual(self, chart_id: int, df: pd.DataFrame) -> str:
+    def _generate_chart_analysis_individual(self, chart_id: int, summary: EngagementSummary) -> str:
         prompt = f"Проанализируй график {chart_id} на основе данных по лайкам, комментариям и репостам. Выдели ключевые тренды."
         return self._query_llama(prompt)
 
-    def _generate_chart_analysis(self, df: pd.DataFrame) -> str:
-        metrics = df[['likes', 'comments', 'shares']].mean()
-        corr = df[['likes', 'comments', 'shares']].corr()
-        df['weekday'] = df['date'].dt.day_name()
-        weekday_likes = df.groupby('weekday')['likes'].sum()
+    def _generate_chart_analysis(self, summary: EngagementSummary) -> str:
+        metrics = summary.means
+        corr = summary.corr
+        weekday_likes = summary.weekday_likes
 
-        summary = f"""
+        charts_text = f"""
 График 1. Средние значения: лайки {metrics['likes']:.2f}, комментарии {metrics['comments']:.2f}, репосты {metrics['shares']:.2f}.
 График 2. Корреляции: лайки-комментарии {corr.loc['likes', 'comments']:.2f}, лайки-репосты {corr.loc['likes', 'shares']:.2f}, комментарии-репосты {corr.loc['comments', 'shares']:.2f}.
 График 3. Активность по дням недели:
 {weekday_likes.to_string()}
 """
-        return self._query_llama("Проанализируй эти графики на основе данных. Сделай выводы.\n" + summary)
+        return self._query_llama("Проанализируй эти графики на основе данных. Сделай выводы.\n" + charts_text)
 
-    def _generate_advanced_analysis(self, df):
+    def _generate_advanced_analysis(self, summary: EngagementSummary, analytics: EngagementAnalytics):
+        # Аномалии и лучшее время уже посчитаны локально: модель только интерпретирует числа
         prompt = f"""
-Проанализируй данные с {df['date'].min().date()} по {df['date'].max().date()}:
-- выяви сезонные паттерны активности
-- определи посты с аномальной вовлеченностью
-- сравни эффективность разных типов контента
-- предложи лучшее время публикаций
+Данные с {summary.date_min.date()} по {summary.date_max.date()} (вовлечённость = лайки + комментарии + репосты):
+{analytics.digest()}
+
+Кратко интерпретируй эти числа: закономерности по дням и часам, возможные причины аномалий, что из этого следует.
 """
         return self._query_llama(prompt)
-    def generate_report(self, period: str) -> str:
-        raw_data = get_engagement_data(period)
-        df = self._prepare_dataframe(raw_data, ['id', 'post_id', 'likes', 'comments', 'shares', 'date', 'channel'])
-        doc = self._create_report_document(df, f"Отчет о вовлеченности за период: {period}")
+    def _fingerprint(self, start_ts: int, end_ts: int) -> list:
+        fingerprint = get_data_fingerprint(start_ts, end_ts)
+        if not fingerprint[0]:
+            raise ValueError("Нет данных для анализа")
+        return fingerprint
+
+    def generate_report(self, period: str, progress: Optional[ReportProgress] = None) -> str:
+        fingerprint = self._fingerprint(*period_window(period))
         filename = f"Отчет_период_{period}_{datetime.now().strftime('%Y-%m-%d')}.docx"
-        doc.save(filename)
-        return filename
-    def _generate_recommendations(self, df):
+
+        def build(path: str) -> None:
+            self._build_report(
+                path, lambda: self._analyze_period(period),
+                f"Отчет о вовлеченности за период: {period}", progress
+            )
+
+        return self.store.fetch_or_build(period_params(period), fingerprint, filename, build)
+    def _generate_recommendations(self, summary: EngagementSummary, analytics: EngagementAnalytics):
+        best, worst = analytics.best_times()
+        slots = ", ".join(f"{WEEKDAYS_RU[day]} {hour:02d}:00" for day, hour, _, _ in best) or "недостаточно данных"
         prompt = f"""
-На основе данных по лайкам, комментариям и репостам с {df['date'].min().date()} по {df['date'].max().date()}, дай рекомендации:
-- по времени публикаций
+Данные с {summary.date_min.date()} по {summary.date_max.date()}: в среднем на пост лайков {summary.means['likes']:.0f}, комментариев {summary.means['comments']:.0f}, репостов {summary.means['shares']:.0f}.
+Лучшие слоты публикаций (UTC): {slots}.
+Дай краткие рекомендации:
+- по времени публикаций (опираясь на слоты выше)
 - по формату и темам
 - по улучшению взаимодействия
 """
         return self._query_llama(prompt)
 
-    def _create_report_document(self, df, title):
+    def _start_sections(
+        self,
+        tasks: Dict[str, Callable[[], str]],
+        started: float,
+        progress: Optional[ReportProgress] = None
+    ) -> Dict[str, Future]:
+        """Ставит генерацию LLM-разделов в общий пул; запросы ограничены дедлайном отчёта"""
+        deadline = started + REPORT_SETTINGS["report_deadline"]
+
+        def run(key: str, func: Callable[[], str]) -> str:
+            if progress is not None:
+                progress.check()
+            self._section.progress, self._section.key, self._section.deadline = progress, key, deadline
+            try:
+                text = func()
+            finally:
+                self._section.progress = self._section.key = self._section.deadline = None
+            if progress is not None:
+                progress.section_update(key, text, done=True)
+            return text
+
+        return {key: self._llm_pool.submit(run, key, func) for key, func in tasks.items()}
+
+    def _collect_sections(
+        self,
+        futures: Dict[str, Future],
+        started: float,
+        progress: Optional[ReportProgress] = None
+    ) -> Dict[str, str]:
+        """
+        Ждёт разделы до дедлайна отчёта. Не успевшие получают заглушку,
+        ещё не начатые — отменяются. При отмене отчёта бросает ReportCancelled.
+        """
+        deadline = started + REPORT_SETTINGS["report_deadline"]
+        pending = set(futures.values())
+        while pending and time.monotonic() < deadline:
+            # Короткие ожидания, чтобы быстро заметить /cancel
+            _, pending = wait(pending, timeout=min(0.5, max(0.0, deadline - time.monotonic())))
+            if progress is not None and progress.cancelled.is_set():
+                for future in futures.values():
+                    future.cancel()
+                progress.check()
+
+        sections = {}
+        for key, future in futures.items():
+            if not future.done():
+                future.cancel()
+                logger.warning(f"Раздел {key} не уложился в дедлайн отчёта")
+                sections[key] = SECTION_TIMEOUT_PLACEHOLDER
+                continue
+            try:
+                sections[key] = future.result()
+            except ReportCancelled:
+                raise
+            except Exception as e:
+                logger.error(f"Ошибка генерации раздела {key}: {e}", exc_info=True)
+                sections[key] = "Ошибка анализа данных"
+        return sections
+
+    def _create_report_document(
+        self,
+        summary: EngagementSummary,
+        analytics: EngagementAnalytics,
+        title,
+        progress: Optional[ReportProgress] = None
+    ):
+        started = time.monotonic()
+        # LLM-разделы считаются параллельно, пока строятся графики;
+        # документ собирается после в фиксированном порядке
+        section_tasks = {
+            "chart_1": lambda: self._generate_chart_analysis_individual(1, summary),
+            "chart_2": lambda: self._generate_chart_analysis_individual(2, summary),
+            "chart_3": lambda: self._generate_chart_analysis_individual(3, summary),
+            "charts": lambda: self._generate_chart_analysis(summary),
+            "advanced": lambda: self._generate_advanced_analysis(summary, analytics),
+            "recommendations": lambda: self._generate_recommendations(summary, analytics)
+        }
+        section_futures = self._start_sections(section_tasks, started, progress)
+
         doc = Document()
         title_para = doc.add_paragraph(title)
         title_para.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
@@ -172,43 +322,216 @@ class ReportGenerator:
         doc.add_paragraph("1. Ключевые показатели\n2. Визуальная аналитика\n3. Анализ визуализаций\n4. Глубинный анализ\n5. Рекомендации\n6. Заключение")
 
         doc.add_heading("1. Ключевые показатели", level=1)
-        stats = df[['likes', 'comments', 'shares']].describe().round(2)
+        stats = summary.describe.round(2)
         self._add_table(doc, stats.values.tolist(), stats.columns.tolist())
 
-        doc.add_heading("2. Визуальная аналитика", level=1)
+        charts = self._render_charts(summary)
         visual_funcs = [
-            ("Сравнение метрик", self._create_metric_comparison(df), 1),
-            ("Корреляция показателей", self._create_correlation_matrix(df), 2),
-            ("Активность по дням недели", self._create_weekly_trend(df), 3)
+            ("Сравнение метрик", charts[1], 1),
+            ("Корреляция показателей", charts[2], 2),
+            ("Активность по дням недели", charts[3], 3)
         ]
+        # Время ожидания LLM сверх построения таблицы и графиков
+        with metrics.timer("report_llm_wait"):
+            sections = self._collect_sections(section_futures, started, progress)
+
+        assembly_started = time.perf_counter()
+        doc.add_heading("2. Визуальная аналитика", level=1)
         for title, stream, chart_id in visual_funcs:
             doc.add_heading(title, level=2)
             doc.add_picture(stream, width=Inches(5.5))
-            mini_analysis = self._generate_chart_analysis_individual(chart_id, df)
-            doc.add_paragraph(mini_analysis)
+            doc.add_paragraph(sections[f"chart_{chart_id}"])
 
         doc.add_heading("3. Анализ визуализаций", level=1)
-        doc.add_paragraph(self._generate_chart_analysis(df))
+        doc.add_paragraph(sections["charts"])
 
         doc.add_heading("4. Глубинный анализ", level=1)
-        doc.add_paragraph(self._generate_advanced_analysis(df))
+        doc.add_heading("Ключевые числа", level=2)
+        doc.add_paragraph(analytics.digest())
+        doc.add_paragraph(sections["advanced"])
 
         doc.add_heading("5. Рекомендации", level=1)
-        doc.add_paragraph(self._generate_recommendations(df))
+        doc.add_paragraph(sections["recommendations"])
 
         doc.add_heading("6. Заключение", level=1)
         doc.add_paragraph(f"Отчет сгенерирован {datetime.now().strftime('%d.%m.%Y %H:%M')} системой аналитики Telegram-каналов.")
+        metrics.observe("report_docx_build", time.perf_counter() - assembly_started)
 
         return doc
 
-    def generate_report_by_date_range(self, start_date: str, end_date: str) -> str:
+    def _build_report(
+        self,
+        path: str,
+        analyze: Callable[[], Tuple],
+        title: str,
+        progress: Optional[ReportProgress] = None,
+        create_document: Optional[Callable] = None
+    ) -> None:
+        """
+        Сборка отчёта в файл с замером каждого этапа. Результат analyze
+        передаётся в create_document (по умолчанию — обычный отчёт по
+        (summary, analytics))
+        """
+        if progress is not None:
+            progress.check()
+        create_document = create_document or self._create_report_document
+        with metrics.timer("report_build"):
+            with metrics.timer("report_stats"):
+                analyzed = analyze()
+            doc = create_document(*analyzed, title, progress)
+            with metrics.timer("report_docx_save"):
+                doc.save(path)
+        metrics.inc("reports_built")
+
+    def _analyze_channels(self, start_ts: int, end_ts: int, granularity: str) -> Tuple[ChannelComparison]:
+        """Итоги всех каналов одним сгруппированным запросом и ряды из тех же предагрегатов"""
+        totals = get_channel_totals_between(start_ts, end_ts, granularity)
+        rows = get_rollup_data_between(start_ts, end_ts, granularity=granularity)
+        return (ChannelComparison.from_rollups(totals, rows),)
+
+    def _generate_channels_analysis(self, comparison: ChannelComparison) -> str:
+        # Один пакетный запрос на все каналы вместо отчёта на каждый
+        prompt = f"""
+Сравнение {len(comparison.table)} Telegram-каналов с {comparison.date_min.date()} по {comparison.date_max.date()} (вовлечённость = лайки + комментарии + репосты, динамика — вторая половина периода относительно первой):
+{comparison.digest(REPORT_SETTINGS["llm_channels"])}
+
+Кратко сравни каналы: кто лидирует и за счёт чего, у кого заметная динамика, что стоит перенять отстающим.
+"""
+        return self._query_llama(prompt)
+
+    def _render_channel_charts(self, comparison: ChannelComparison) -> Dict[str, io.BytesIO]:
+        """Рейтинг и малые графики динамики (по channels_per_chart каналов на рисунок)"""
+        table = comparison.table
+        channels = list(table.index)
+        per_chart = REPORT_SETTINGS["channels_per_chart"]
+        charts = {"ranking": ("channel_ranking", {
+            "labels": [str(channel) for channel in channels],
+            "values": [float(v) for v in table["engagement"]]
+        })}
+        for i in range(0, len(channels), per_chart):
+            charts[f"multiples_{i // per_chart}"] = ("channel_multiples", {
+                "series": [[str(channel), *map(list, comparison.series.get(channel, ([], [])))]
+                           for channel in channels[i:i + per_chart]],
+                "columns": 4
+            })
+        with metrics.timer("report_charts"):
+            return self.charts.render_many(charts)
+
+    def _create_channels_document(
+        self,
+        comparison: ChannelComparison,
+        title: str,
+        progress: Optional[ReportProgress] = None
+    ):
+        started = time.monotonic()
+        section_futures = self._start_sections(
+            {"channels": lambda: self._generate_channels_analysis(comparison)}, started, progress)
+
+        doc = Document()
+        title_para = doc.add_paragraph(title)
+        title_para.alignment = WD_PARAGRAPH_ALIGNMENT.CENTER
+        self._apply_style(title_para, 'title')
+
+        doc.add_heading("Содержание", level=1)
+        doc.add_paragraph("1. Рейтинг каналов\n2. Вовлечённость по каналам\n3. Динамика каналов\n4. Сравнительный анализ\n5. Заключение")
+
+        doc.add_heading("1. Рейтинг каналов", level=1)
+        rows = [
+            [place, channel, row.posts, f"{row.likes:.1f}", f"{row.comments:.1f}", f"{row.shares:.1f}",
+             f"{row.engagement:.1f}", "—" if pd.isna(row.engagement_std) else f"{row.engagement_std:.1f}",
+             f"{row.share:.1f}", "—" if pd.isna(row.trend) else f"{row.trend:+.0f}"]
+            for place, (channel, row) in enumerate(comparison.table.iterrows(), 1)
+        ]
+        self._add_table(doc, rows, ["#", "Канал", "Постов", "Лайки", "Комм.", "Репосты",
+                                    "Вовл./пост", "σ", "Доля, %", "Динамика, %"])
+
+        charts = self._render_channel_charts(comparison)
+        with metrics.timer("report_llm_wait"):
+            sections = self._collect_sections(section_futures, started, progress)
+
+        assembly_started = time.perf_counter()
+        doc.add_heading("2. Вовлечённость по каналам", level=1)
+        doc.add_picture(charts.pop("ranking"), width=Inches(6))
+
+        doc.add_heading("3. Динамика каналов", level=1)
+        doc.add_paragraph("Средняя вовлечённость поста по времени; шкала Y общая для всех каналов.")
+        for key in sorted(charts, key=lambda k: int(k.rsplit("_", 1)[1])):
+            doc.add_picture(charts[key], width=Inches(6.3))
+
+        doc.add_heading("4. Сравнительный анализ", level=1)
+        doc.add_paragraph(sections["channels"])
+
+        doc.add_heading("5. Заключение", level=1)
+        doc.add_paragraph(f"Отчет сгенерирован {datetime.now().strftime('%d.%m.%Y %H:%M')} системой аналитики Telegram-каналов.")
+        metrics.observe("report_docx_build", time.perf_counter() - assembly_started)
+        return doc
+
+    def _channels_report(
+        self,
+        params: dict,
+        start_ts: int,
+        end_ts: int,
+        granularity: str,
+        title: str,
+        filename: str,
+        progress: Optional[ReportProgress] = None
+    ) -> str:
+        width = ROLLUP_TABLES[granularity][1]
+        start_ts -= start_ts % width
+        fingerprint = self._fingerprint(start_ts, end_ts)
+
+        def build(path: str) -> None:
+            self._build_report(
+                path, lambda: self._analyze_channels(start_ts, end_ts, granularity),
+                title, progress, create_document=self._create_channels_document
+            )
+
+        return self.store.fetch_or_build(params, fingerprint, filename, build)
+
+    def generate_channels_report(self, period: str, progress: Optional[ReportProgress] = None) -> str:
+        """Сравнительный отчёт по всем каналам за период"""
+        start_ts, end_ts = period_to_epoch(period)
+        return self._channels_report(
+            {"kind": "channels", "period": period}, start_ts, end_ts, CHANNEL_GRANULARITY.get(period, "daily"),
+            f"Сравнение каналов за период: {period}",
+            f"Каналы_период_{period}_{datetime.now().strftime('%Y-%m-%d')}.docx", progress
+        )
+
+    def generate_channels_report_by_date_range(
+        self,
+        start_date: str,
+        end_date: str,
+        progress: Optional[ReportProgress] = None
+    ) -> str:
+        """Сравнительный отчёт по всем каналам за диапазон дат"""
+        start_ts, end_ts = date_range_to_epoch(start_date, end_date)
+        return self._channels_report(
+            {"kind": "channels", "start": start_date, "end": end_date}, start_ts, end_ts, "daily",
+            f"Сравнение каналов {start_date} - {end_date}",
+            f"Каналы_{start_date}_по_{end_date}.docx", progress
+        )
+
+    def generate_report_by_date_range(
+        self,
+        start_date: str,
+        end_date: str,
+        progress: Optional[ReportProgress] = None
+    ) -> str:
         try:
-            raw_data = get_engagement_data_by_range(start_date, end_date)
-            df = self._prepare_dataframe(raw_data, ['id', 'post_id', 'likes', 'comments', 'shares', 'date', 'channel'])
-            doc = self._create_report_document(df, f"Отчет о вовлеченности {start_date} - {end_date}")
+            start_ts, end_ts = date_range_to_epoch(start_date, end_date)
+            fingerprint = self._fingerprint(start_ts, end_ts)
             filename = f"Отчет_{start_date}_по_{end_date}.docx"
-            doc.save(filename)
-            return filename
+
+            def build(path: str) -> None:
+                self._build_report(
+                    path, lambda: self._analyze_range(start_ts, end_ts),
+                    f"Отчет о вовлеченности {start_date} - {end_date}", progress
+                )
+
+            params = {"kind": "range", "start": start_date, "end": end_date}
+            return self.store.fetch_or_build(params, fingerprint, filename, build)
+        except ReportCancelled:
+            raise
         except Exception as e:
             logger.error(f"Ошибка генерации отчета: {str(e)}")
             raise
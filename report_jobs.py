@@ -0,0 +1,161 @@
+# report_jobs.py
+
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from config import REPORT_SETTINGS
+from report_progress import ReportCancelled, ReportProgress
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+
+
+class ReportJob:
+    """Задача сборки отчёта и список подписчиков, ожидающих результат"""
+
+    def __init__(
+        self,
+        job_id: int,
+        key: Hashable,
+        description: str,
+        build: Callable[["ReportJob"], str],
+        background: bool = False
+    ):
+        self.id = job_id
+        self.key = key
+        self.description = description
+        self.build = build
+        self.status = QUEUED
+        self.subscribers: List[Hashable] = []
+        # Плановая сборка: не отменяется, когда получателей не осталось
+        self.background = background
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self.result: Optional[str] = None
+        self.error: Optional[BaseException] = None
+        # Потоковый текст разделов и флаг отмены; build получает задачу целиком
+        self.progress = ReportProgress()
+
+    def describe(self) -> str:
+        now = time.time()
+        if self.status == QUEUED:
+            timing = f"ждёт {now - self.created:.0f} с"
+        elif self.status == RUNNING:
+            timing = f"идёт {now - self.started:.0f} с"
+        else:
+            timing = f"за {self.finished - self.started:.0f} с"
+        waiting = f", получателей: {len(self.subscribers)}" if len(self.subscribers) > 1 else ""
+        return f"#{self.id} {self.description} — {self.status} ({timing}{waiting})"
+
+
+class ReportJobQueue:
+    """
+    Очередь сборки отчётов на пуле потоков.
+
+    Одинаковые запросы (совпадающий key), пока задача в очереди или
+    выполняется, присоединяются к ней, а не запускают сборку заново.
+    По завершении вызывается on_finish(job) — он доставляет результат
+    всем подписчикам.
+    """
+
+    def __init__(
+        self,
+        on_finish: Callable[[ReportJob], None],
+        workers: Optional[int] = None,
+        history: int = 20
+    ):
+        self.on_finish = on_finish
+        self.workers = workers or REPORT_SETTINGS["job_workers"]
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="report-job")
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._active: Dict[Hashable, ReportJob] = {}
+        self._finished = deque(maxlen=history)
+
+    def submit(
+        self,
+        key: Hashable,
+        description: str,
+        build: Callable[[ReportJob], str],
+        subscriber: Optional[Hashable],
+        background: bool = False
+    ) -> Tuple[ReportJob, bool]:
+        """
+        Ставит сборку в очередь. Возвращает задачу и признак присоединения
+        к уже существующей. Фоновая задача (background) может не иметь
+        получателей (subscriber=None)
+        """
+        with self._lock:
+            job = self._active.get(key)
+            # К отменённой, но ещё не завершившейся задаче не присоединяемся
+            if job is not None and not job.progress.cancelled.is_set():
+                if subscriber is not None and subscriber not in job.subscribers:
+                    job.subscribers.append(subscriber)
+                return job, True
+            job = ReportJob(next(self._ids), key, description, build, background)
+            if subscriber is not None:
+                job.subscribers.append(subscriber)
+            self._active[key] = job
+        self._executor.submit(self._run, job)
+        logger.info(f"Задача отчёта #{job.id} поставлена в очередь: {description}")
+        return job, False
+
+    def _run(self, job: ReportJob) -> None:
+        job.started = time.time()
+        job.status = RUNNING
+        try:
+            job.progress.check()
+            job.result = job.build(job)
+            job.status = DONE
+        except ReportCancelled as e:
+            job.error = e
+            job.status = CANCELLED
+        except Exception as e:
+            job.error = e
+            job.status = FAILED
+        finally:
+            job.finished = time.time()
+            # Снимаем с активных до доставки: новые запросы запустят свежую сборку
+            with self._lock:
+                if self._active.get(job.key) is job:
+                    self._active.pop(job.key)
+                self._finished.append(job)
+        logger.info(f"Задача отчёта #{job.id} завершена: {job.status} за {job.finished - job.started:.1f} с")
+        try:
+            self.on_finish(job)
+        except Exception as e:
+            logger.error(f"Ошибка доставки отчёта #{job.id}: {e}", exc_info=True)
+
+    def cancel(self, subscriber: Hashable) -> List[ReportJob]:
+        """
+        Отписывает получателя от активных задач. Задача, которую больше
+        никто не ждёт, отменяется (в очереди — не начнётся, в работе —
+        прервётся на ближайшей проверке). Возвращает затронутые задачи.
+        """
+        affected = []
+        with self._lock:
+            for job in self._active.values():
+                if subscriber in job.subscribers:
+                    job.subscribers.remove(subscriber)
+                    if not job.subscribers and not job.background:
+                        job.progress.cancel()
+                    affected.append(job)
+        for job in affected:
+            logger.info(f"Получатель отписан от задачи отчёта #{job.id}"
+                        f"{', задача отменена' if job.progress.cancelled.is_set() else ''}")
+        return affected
+
+    def snapshot(self) -> Tuple[List[ReportJob], List[ReportJob]]:
+        """Активные (в очереди и выполняющиеся) и недавно завершённые задачи"""
+        with self._lock:
+            return list(self._active.values()), list(self._finished)
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
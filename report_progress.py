@@ -0,0 +1,48 @@
+# report_progress.py
+
+import logging
+import threading
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+# Подписчик получает (раздел, текст на текущий момент, раздел завершён)
+SectionListener = Callable[[str, str, bool], None]
+
+
+class ReportCancelled(Exception):
+    """Сборка отчёта отменена (/cancel)"""
+
+
+class ReportProgress:
+    """
+    Обратная связь одной сборки отчёта: текст LLM-разделов по мере
+    генерации (для «живой» сводки в Telegram) и флаг отмены, который
+    проверяют потоковый клиент LLM и этапы сборки.
+    """
+
+    def __init__(self):
+        self.cancelled = threading.Event()
+        self._listeners: List[SectionListener] = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, listener: SectionListener) -> None:
+        with self._lock:
+            self._listeners.append(listener)
+
+    def section_update(self, section: str, text: str, done: bool = False) -> None:
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(section, text, done)
+            except Exception as e:
+                # Сбой отображения прогресса не должен ломать сборку отчёта
+                logger.warning(f"Ошибка обработчика прогресса раздела {section}: {e}")
+
+    def cancel(self) -> None:
+        self.cancelled.set()
+
+    def check(self) -> None:
+        if self.cancelled.is_set():
+            raise ReportCancelled("Сборка отчёта отменена")
@@ -0,0 +1,151 @@
+# report_scheduler.py
+
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import REPORT_SCHEDULE_SETTINGS
+from database import ROLLUP_TABLES, get_data_fingerprint, period_to_epoch
+from metrics import metrics
+from report_jobs import ReportJob, ReportJobQueue
+from report_store import ReportArtifactStore
+
+logger = logging.getLogger(__name__)
+
+# Периоды, статистика которых считается по предагрегатам, а не по сырым строкам
+ROLLUP_PERIODS = {"month": "daily", "year": "daily"}
+
+
+def period_params(period: str) -> dict:
+    """Параметры отчёта за период в кэше отчётов (как в ReportGenerator.generate_report)"""
+    return {"kind": "period", "period": period}
+
+
+def period_window(period: str) -> Tuple[int, int]:
+    """Окно данных отчёта за период (для предагрегатов — с начала бакета); по нему считается отпечаток"""
+    start_ts, end_ts = period_to_epoch(period)
+    granularity = ROLLUP_PERIODS.get(period)
+    if granularity:
+        width = ROLLUP_TABLES[granularity][1]
+        start_ts -= start_ts % width
+    return start_ts, end_ts
+
+
+class ReportScheduler:
+    """
+    Заблаговременная сборка стандартных отчётов (daily/week/month/year).
+
+    Раз в сутки в непиковое время (times, UTC) все периоды собираются
+    заново через общую очередь отчётов; между плановыми запусками каждые
+    check_interval секунд отчёт пересобирается, если его нет или данные
+    в окне периода изменились значительно либо изменились хоть как-то,
+    а отчёт старше max_age. Отчёт по неизменным данным актуален при любом
+    возрасте: его пересборка дала бы тот же файл из кэша. /report отдаёт
+    свежий отчёт сразу (fresh), а сборку по запросу запускает, только
+    если подходящего нет. Отпечаток окна считается только в фоновых
+    заданиях: fresh сверяет отчёт с последним замером и не читает данные
+    в потоке обработчика команд.
+    """
+
+    def __init__(
+        self,
+        jobs: ReportJobQueue,
+        store: ReportArtifactStore,
+        generator_factory: Callable,
+        settings: dict = REPORT_SCHEDULE_SETTINGS
+    ):
+        self.jobs = jobs
+        self.store = store
+        self.generator_factory = generator_factory
+        self.settings = settings
+        # Последний отпечаток окна каждого периода (замер _check и _off_peak)
+        self._fingerprints: Dict[str, List] = {}
+        self._lock = threading.Lock()
+
+    def start(self, job_queue) -> None:
+        """Регистрирует задания в JobQueue бота"""
+        if not self.settings["enabled"]:
+            return
+        for value in self.settings["times"]:
+            job_queue.run_daily(self._off_peak, datetime.strptime(value, "%H:%M").time(), name=f"reports-{value}")
+        interval = self.settings["check_interval"]
+        if interval:
+            job_queue.run_repeating(self._check, interval=interval, first=interval, name="reports-check")
+        logger.info(f"Плановая сборка отчётов: {', '.join(self.settings['times'])} UTC, "
+                    f"проверка изменений каждые {interval} с")
+
+    def fresh(self, period: str) -> Optional[Tuple[str, dict]]:
+        """
+        Готовый отчёт за период, который можно отдать без пересборки:
+        (путь, запись индекса) или None. Сверяется с отпечатком последней
+        проверки; до первой проверки — None
+        """
+        with self._lock:
+            current = self._fingerprints.get(period)
+        if current is None:
+            return None
+        return self._fresh_for(period, current)
+
+    def _measure(self, period: str) -> List:
+        """Отпечаток окна периода; запоминается для fresh"""
+        current = get_data_fingerprint(*period_window(period))
+        with self._lock:
+            self._fingerprints[period] = current
+        return current
+
+    def _fresh_for(self, period: str, current: List) -> Optional[Tuple[str, dict]]:
+        # Пустое окно: отчёт собран по данным, которых уже нет
+        if not current[0]:
+            return None
+        found = self.store.latest(period_params(period))
+        if found is None:
+            return None
+        entry = found[1]
+        if list(current) == list(entry["fingerprint"]):
+            return found
+        if time.time() - entry["created"] > self.settings["max_age"][period]:
+            return None
+        # INSERT OR REPLACE выдаёт строке новый id: прирост максимального id —
+        # число новых и обновлённых строк с момента сборки; убыль — строки удалены
+        changed = (current[1] or 0) - (entry["fingerprint"][1] or 0)
+        if changed < 0:
+            return None
+        threshold = max(self.settings["min_changed_rows"], self.settings["min_changed_ratio"] * current[0])
+        return found if changed < threshold else None
+
+    def prebuild(self, period: str, subscribers=()) -> ReportJob:
+        """Ставит фоновую сборку отчёта в общую очередь (совпадает по ключу с /report)"""
+        job = None
+        # Каждый получатель рассылки присоединяется к той же задаче по ключу
+        for subscriber in list(subscribers) or [None]:
+            job, joined = self.jobs.submit(
+                ("period", period),
+                f"плановый отчёт за период {period}",
+                lambda job: self.generator_factory().generate_report(period, job.progress),
+                subscriber,
+                background=True
+            )
+            if not joined:
+                metrics.inc("reports_prebuilt")
+        return job
+
+    def _off_peak(self, context) -> None:
+        push = [(context.bot, chat_id) for chat_id in self.settings["push_to"]]
+        for period in self.settings["periods"]:
+            # Без данных в окне собирать и рассылать нечего
+            if self._measure(period)[0]:
+                self.prebuild(period, push if period in self.settings["push_periods"] else ())
+
+    def _check(self, context) -> None:
+        for period in self.settings["periods"]:
+            try:
+                if self._stale(period):
+                    self.prebuild(period)
+            except Exception as e:
+                logger.error(f"Ошибка проверки актуальности отчёта {period}: {e}")
+
+    def _stale(self, period: str) -> bool:
+        current = self._measure(period)
+        return bool(current[0]) and self._fresh_for(period, current) is None
@@ -0,0 +1,275 @@
+# report_store.py
+
+import fcntl
+import glob
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config import REPORT_STORE_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+
+class ReportArtifactStore:
+    """
+    Кэш готовых отчётов на диске.
+
+    Ключ — хэш параметров отчёта и отпечатка данных (число строк,
+    максимальный id, границы ts в диапазоне). Пока данные не изменились,
+    повторный запрос возвращает уже собранный файл. Файл каждого ключа
+    лежит в своём каталоге <dir>/<key>/ и появляется там только целиком
+    (запись во временный файл + os.replace), поэтому параллельные сборки
+    не портят друг другу результат. Индекс index.json хранит метаданные
+    для вытеснения по возрасту и суммарному размеру; кэш может делиться
+    между процессами (бот и процессы отчётов): индекс меняется под файловой
+    блокировкой и перечитывается, если его записал другой процесс.
+    Время последнего обращения копится в памяти и попадает в индекс не
+    чаще раза в access_flush_interval (или вместе с любой другой записью).
+    Временные файлы сборки помечены pid процесса: недособранные отчёты
+    завершённых процессов удаляются при создании хранилища.
+    """
+
+    INDEX_FILE = "index.json"
+    LOCK_FILE = ".index.lock"
+
+    def __init__(self, settings: Optional[dict] = None):
+        self.settings = settings or REPORT_STORE_SETTINGS
+        self.root = self.settings["dir"]
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._lock_file = open(os.path.join(self.root, self.LOCK_FILE), "a")
+        # Блокировка сборки ключа и число потоков, которые её держат или ждут
+        self._key_locks: Dict[str, List] = {}
+        # Время обращений, ещё не записанное в индекс
+        self._access: Dict[str, float] = {}
+        self._access_saved = time.monotonic()
+        self._signature = self._index_signature()
+        self._index = self._load_index()
+        self._remove_stale_files()
+
+    @staticmethod
+    def make_key(params: dict, fingerprint) -> str:
+        data = json.dumps({"params": params, "fingerprint": fingerprint}, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()[:32]
+
+    def _index_path(self) -> str:
+        return os.path.join(self.root, self.INDEX_FILE)
+
+    def _load_index(self) -> dict:
+        try:
+            with open(self._index_path(), encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Индекс кэша отчётов повреждён, начинаем заново: {e}")
+            return {}
+
+    def _index_signature(self) -> Optional[Tuple[int, int, int]]:
+        try:
+            stat = os.stat(self._index_path())
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _save_index(self) -> None:
+        """Атомарная запись индекса (вызывается под _index_locked)"""
+        self._apply_access()
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=".index-", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self._index_path())
+        self._signature = self._index_signature()
+        self._access_saved = time.monotonic()
+
+    def _apply_access(self) -> None:
+        """Переносит накопленное время обращений в индекс (под _index_locked)"""
+        for key, accessed in self._access.items():
+            entry = self._index.get(key)
+            if entry is not None and accessed > entry["last_access"]:
+                entry["last_access"] = accessed
+        self._access.clear()
+
+    def _touch(self, key: str, now: float) -> None:
+        """Отмечает обращение к отчёту; индекс пишется не чаще access_flush_interval"""
+        self._access[key] = now
+        if time.monotonic() - self._access_saved >= self.settings["access_flush_interval"]:
+            self._save_index()
+
+    @contextmanager
+    def _index_locked(self):
+        """Монопольный доступ к индексу среди потоков и процессов; чужие изменения перечитываются"""
+        with self._lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                signature = self._index_signature()
+                if signature != self._signature:
+                    self._index = self._load_index()
+                    self._signature = signature
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _process_alive(pid: int) -> bool:
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+        return True
+
+    def _remove_stale_files(self) -> None:
+        """Остатки процессов, завершённых посреди сборки отчёта или записи индекса"""
+        removed = 0
+        with self._index_locked():
+            # Индекс пишется только под блокировкой: чужих записей сейчас нет
+            stale = glob.glob(os.path.join(self.root, ".index-*.tmp"))
+            for path in glob.glob(os.path.join(self.root, "*", ".build-*.docx")):
+                pid = os.path.basename(path).split("-")[1]
+                if not pid.isdigit() or not self._process_alive(int(pid)):
+                    stale.append(path)
+            for path in stale:
+                try:
+                    os.remove(path)
+                    removed += 1
+                except FileNotFoundError:
+                    pass
+        if removed:
+            logger.info(f"Удалено временных файлов прерванных сборок: {removed}")
+
+    @contextmanager
+    def _key_locked(self, key: str):
+        """Одна сборка ключа за раз; блокировка удаляется, когда её никто не ждёт"""
+        with self._lock:
+            holder = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            holder[1] += 1
+        try:
+            with holder[0]:
+                yield
+        finally:
+            with self._lock:
+                holder[1] -= 1
+                if not holder[1]:
+                    del self._key_locks[key]
+
+    def get(self, params: dict, fingerprint) -> Optional[str]:
+        """Путь к готовому отчёту или None"""
+        key = self.make_key(params, fingerprint)
+        with self._index_locked():
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            path = os.path.join(self.root, key, entry["filename"])
+            if not os.path.exists(path):
+                self._index.pop(key, None)
+                self._save_index()
+                return None
+            self._touch(key, time.time())
+        logger.info(f"Отчёт взят из кэша: {entry['filename']}")
+        return path
+
+    def latest(self, params: dict, max_age: Optional[float] = None) -> Optional[Tuple[str, dict]]:
+        """
+        Самый свежий готовый отчёт с такими параметрами при любом отпечатке
+        данных: (путь, запись индекса) или None. max_age ограничивает
+        возраст отчёта, секунд
+        """
+        now = time.time()
+        with self._index_locked():
+            candidates = sorted(
+                ((key, entry) for key, entry in self._index.items() if entry["params"] == params),
+                key=lambda item: item[1]["created"],
+                reverse=True
+            )
+            for key, entry in candidates:
+                if max_age is not None and now - entry["created"] > max_age:
+                    return None
+                path = os.path.join(self.root, key, entry["filename"])
+                if os.path.exists(path):
+                    self._touch(key, now)
+                    return path, dict(entry)
+        return None
+
+    def fetch_or_build(
+        self,
+        params: dict,
+        fingerprint,
+        filename: str,
+        builder: Callable[[str], None]
+    ) -> str:
+        """
+        Возвращает отчёт из кэша, а при промахе собирает его:
+        builder(path) должен сохранить документ по переданному пути
+        """
+        path = self.get(params, fingerprint)
+        if path:
+            return path
+
+        key = self.make_key(params, fingerprint)
+        with self._key_locked(key):
+            # Пока ждали блокировку, отчёт мог собрать другой поток
+            path = self.get(params, fingerprint)
+            if path:
+                return path
+
+            key_dir = os.path.join(self.root, key)
+            os.makedirs(key_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=key_dir, prefix=f".build-{os.getpid()}-", suffix=".docx")
+            os.close(fd)
+            try:
+                builder(tmp_path)
+                path = os.path.join(key_dir, filename)
+                os.replace(tmp_path, path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            now = time.time()
+            with self._index_locked():
+                self._index[key] = {
+                    "filename": filename,
+                    "params": params,
+                    "fingerprint": fingerprint,
+                    "size": os.path.getsize(path),
+                    "created": now,
+                    "last_access": now
+                }
+                self._evict(keep=key)
+                self._save_index()
+        return path
+
+    def _evict(self, keep: str) -> None:
+        """Удаляет устаревшие отчёты и самые давно запрошенные сверх лимита размера"""
+        self._apply_access()
+        now = time.time()
+        expired = [
+            key for key, entry in self._index.items()
+            if key != keep and now - entry["created"] > self.settings["max_age"]
+        ]
+        by_access = sorted(
+            (key for key in self._index if key not in expired and key != keep),
+            key=lambda key: self._index[key]["last_access"],
+            reverse=True
+        )
+        total, oversized = self._index[keep]["size"], []
+        for key in by_access:
+            total += self._index[key]["size"]
+            if total > self.settings["max_bytes"]:
+                oversized.append(key)
+
+        for key in expired + oversized:
+            self._index.pop(key, None)
+            shutil.rmtree(os.path.join(self.root, key), ignore_errors=True)
+        if expired or oversized:
+            logger.info(f"Из кэша отчётов удалено: {len(expired) + len(oversized)}")
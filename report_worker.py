@@ -0,0 +1,230 @@
+# report_worker.py
+
+import argparse
+import logging
+import signal
+import sys
+import threading
+from multiprocessing.connection import Client, Listener
+from typing import Optional
+
+from config import COLLECTOR_WORKERS, REPORT_SETTINGS, REPORT_WORKERS
+from metrics import metrics
+from report_progress import ReportCancelled, ReportProgress
+
+logger = logging.getLogger(__name__)
+
+# Методы ReportGenerator, которые можно вызвать в процессе отчётов
+METHODS = (
+    "generate_report",
+    "generate_report_by_date_range",
+    "generate_channels_report",
+    "generate_channels_report_by_date_range"
+)
+
+
+def worker_address(index: int) -> tuple:
+    host, port = REPORT_WORKERS["address"]
+    return host, port + index
+
+
+def llm_concurrency_share(index: int, processes: int, total: int) -> int:
+    """
+    Доля общего лимита запросов к Ollama (REPORT_SETTINGS["llm_concurrency"])
+    для процесса index: в сумме по процессам — total, но не меньше 1 на процесс
+    """
+    base, extra = divmod(total, max(1, processes))
+    return max(1, base + (1 if index < extra else 0))
+
+
+class ReportWorkerServer:
+    """
+    Процесс сборки отчётов для бота.
+
+    Одно соединение — один отчёт: бот присылает (метод, аргументы), процесс
+    отвечает потоком ("section", раздел, текст, готов) для «живой» сводки и
+    итогом ("done", путь), ("cancelled", текст) или ("error", вид, текст).
+    Пока отчёт собирается, бот может прислать ("cancel",); обрыв соединения
+    тоже отменяет сборку. Отчёты кладутся в общий кэш отчётов на диске,
+    поэтому путь из ответа доступен боту.
+    """
+
+    def __init__(self, index: int, authkey=None):
+        self.index = index
+        self.address = worker_address(index)
+        self.authkey = authkey or REPORT_WORKERS["authkey"]
+        self._generator = None
+        self._generator_lock = threading.Lock()
+        self.llm_concurrency = llm_concurrency_share(
+            index, REPORT_WORKERS["processes"], REPORT_SETTINGS["llm_concurrency"]
+        )
+
+    def generator(self):
+        with self._generator_lock:
+            if self._generator is None:
+                from report_generator import ReportGenerator
+                self._generator = ReportGenerator(llm_concurrency=self.llm_concurrency)
+            return self._generator
+
+    def _serve_connection(self, conn) -> None:
+        send_lock = threading.Lock()
+        finished = threading.Event()
+        progress = ReportProgress()
+        watcher = None
+
+        def send(message) -> None:
+            with send_lock:
+                conn.send(message)
+
+        def on_section(section: str, text: str, done: bool) -> None:
+            try:
+                send(("section", section, text, done))
+            except (EOFError, OSError):
+                progress.cancel()
+
+        def watch() -> None:
+            # Команда отмены или обрыв соединения прерывают сборку
+            try:
+                while not finished.is_set():
+                    if conn.poll(0.5) and conn.recv() == ("cancel",):
+                        progress.cancel()
+            except (EOFError, OSError):
+                progress.cancel()
+
+        try:
+            method, args = conn.recv()
+            if method not in METHODS:
+                send(("error", "ValueError", f"неизвестный метод: {method}"))
+                return
+            progress.subscribe(on_section)
+            watcher = threading.Thread(target=watch, daemon=True)
+            watcher.start()
+            try:
+                with metrics.timer("report_worker_job"):
+                    path = getattr(self.generator(), method)(*args, progress)
+                reply = ("done", path)
+            except ReportCancelled as e:
+                reply = ("cancelled", str(e))
+            except ValueError as e:
+                reply = ("error", "ValueError", str(e))
+            except Exception as e:
+                logger.error(f"Ошибка сборки отчёта {method}{args}: {e}", exc_info=True)
+                reply = ("error", type(e).__name__, str(e))
+            send(reply)
+        except (EOFError, OSError):
+            pass
+        finally:
+            finished.set()
+            # Соединение закрывается, когда наблюдатель уже не читает из него
+            if watcher is not None:
+                watcher.join()
+            conn.close()
+
+    def serve_forever(self) -> None:
+        if REPORT_WORKERS["processes"] > REPORT_SETTINGS["llm_concurrency"]:
+            logger.warning(f"Процессов отчётов ({REPORT_WORKERS['processes']}) больше, чем "
+                           f"llm_concurrency ({REPORT_SETTINGS['llm_concurrency']}): Ollama получит "
+                           f"до {REPORT_WORKERS['processes']} запросов одновременно")
+        if REPORT_SETTINGS["warm_up"]:
+            threading.Thread(target=lambda: self.generator().warm_up(), name="report-warm-up", daemon=True).start()
+        with Listener(self.address, authkey=self.authkey) as listener:
+            logger.info(f"Процесс отчётов #{self.index} слушает {self.address}")
+            while True:
+                conn = listener.accept()
+                threading.Thread(target=self._serve_connection, args=(conn,), daemon=True).start()
+
+
+class RemoteReportGenerator:
+    """
+    Замена ReportGenerator в боте при REPORT_WORKERS["processes"] > 0:
+    отчёт собирается в наименее загруженном процессе отчётов, разделы и
+    отмена передаются через соединение. Недоступный процесс (например,
+    перезапускаемый супервизором) пропускается.
+    """
+
+    def __init__(self, processes: Optional[int] = None, authkey=None):
+        self.processes = processes or REPORT_WORKERS["processes"]
+        self.authkey = authkey or REPORT_WORKERS["authkey"]
+        self._busy = [0] * self.processes
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        """(номер процесса, соединение) начиная с наименее загруженного"""
+        with self._lock:
+            order = sorted(range(self.processes), key=lambda i: self._busy[i])
+        for index in order:
+            try:
+                conn = Client(worker_address(index), authkey=self.authkey)
+            except OSError as e:
+                logger.warning(f"Процесс отчётов #{index} недоступен: {e}")
+                continue
+            with self._lock:
+                self._busy[index] += 1
+            return index, conn
+        raise RuntimeError("Нет доступных процессов сборки отчётов")
+
+    def _call(self, method: str, args: tuple, progress: Optional[ReportProgress]) -> str:
+        index, conn = self._connect()
+        try:
+            conn.send((method, args))
+            cancel_sent = False
+            while True:
+                # Короткие ожидания, чтобы быстро переслать /cancel
+                if not conn.poll(0.5):
+                    if progress is not None and progress.cancelled.is_set() and not cancel_sent:
+                        conn.send(("cancel",))
+                        cancel_sent = True
+                    continue
+                message = conn.recv()
+                if message[0] == "section":
+                    if progress is not None:
+                        progress.section_update(*message[1:])
+                elif message[0] == "done":
+                    return message[1]
+                elif message[0] == "cancelled":
+                    raise ReportCancelled(message[1])
+                elif message[1] == "ValueError":
+                    raise ValueError(message[2])
+                else:
+                    raise RuntimeError(f"Процесс отчётов #{index}: {message[1]}: {message[2]}")
+        except (EOFError, OSError) as e:
+            raise RuntimeError(f"Процесс отчётов #{index} прервал соединение: {e}") from e
+        finally:
+            conn.close()
+            with self._lock:
+                self._busy[index] -= 1
+
+    def generate_report(self, period: str, progress: Optional[ReportProgress] = None) -> str:
+        return self._call("generate_report", (period,), progress)
+
+    def generate_report_by_date_range(self, start_date: str, end_date: str,
+                                      progress: Optional[ReportProgress] = None) -> str:
+        return self._call("generate_report_by_date_range", (start_date, end_date), progress)
+
+    def generate_channels_report(self, period: str, progress: Optional[ReportProgress] = None) -> str:
+        return self._call("generate_channels_report", (period,), progress)
+
+    def generate_channels_report_by_date_range(self, start_date: str, end_date: str,
+                                               progress: Optional[ReportProgress] = None) -> str:
+        return self._call("generate_channels_report_by_date_range", (start_date, end_date), progress)
+
+    def warm_up(self) -> None:
+        """Процессы отчётов прогреваются сами при запуске"""
+
+    def describe(self) -> str:
+        with self._lock:
+            busy = list(self._busy)
+        return f"Процессы отчётов: {self.processes}, отчётов в работе: {', '.join(map(str, busy))}"
+
+
+if __name__ == "__main__":
+    from metrics import start_exporter
+
+    parser = argparse.ArgumentParser(description="Процесс сборки отчётов")
+    parser.add_argument("--worker", type=int, default=0, help="номер процесса (порт address + номер)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s - REPORTS-{args.worker} - %(levelname)s - %(message)s")
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    start_exporter(f"reports_{args.worker}", port_offset=1 + COLLECTOR_WORKERS + args.worker)
+    ReportWorkerServer(args.worker).serve_forever()
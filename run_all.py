@@ -1,11 +1,26 @@
 # run_all.py
+"""
+Супервизор процессов: писатель в БД, сборщики, процессы отчётов и бот.
 
+Вывод всех процессов читается одним циклом selectors (без потоков) и
+пишется в лог с именем процесса. Упавший процесс перезапускается отдельно
+от остальных с экспоненциально растущей задержкой; процесс, проработавший
+stable_after секунд, снова перезапускается быстро. По таймеру и по
+SIGUSR1 в лог пишутся аптайм, число перезапусков и ресурсы процессов из
+/proc. Ctrl+C или SIGTERM останавливают всё в обратном порядке запуска.
+"""
+
+import os
+import selectors
+import signal
 import subprocess
 import sys
-import os
 import time
-import signal
 import logging
+from typing import List, Optional
+
+from config import COLLECTOR_CHANNELS, COLLECTOR_WORKERS, REPORT_WORKERS, SUPERVISOR_SETTINGS
+from sharding import shard_channels
 
 # Настройка логирования
 logging.basicConfig(
@@ -14,70 +29,274 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def launch_process(name: str, path: str) -> subprocess.Popen:
-    """Запускает процесс с логированием"""
-    logger.info(f"🚀 Запуск: {name}")
-    try:
-        return subprocess.Popen(
-            [sys.executable, path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True
-        )
-    except Exception as e:
-        logger.error(f"❌ Ошибка запуска {name}: {str(e)}")
-        raise
-
-def monitor_process(proc: subprocess.Popen, name: str) -> None:
-    """Мониторинг вывода процесса"""
-    while True:
-        output = proc.stdout.readline()
-        if output == '' and proc.poll() is not None:
-            break
-        if output:
-            logger.info(f"[{name}] {output.strip()}")
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Неполная строка вывода длиннее этого предела пишется в лог как есть
+MAX_LINE = 64 * 1024
 
-if __name__ == "__main__":
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-    processes = []
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
 
+
+def read_proc_stat(pid: int) -> Optional[dict]:
+    """Процессорное время (с), RSS (байт) и число потоков из /proc/<pid>/stat; None вне Linux"""
     try:
-        # Запуск процессов
-        collector_proc = launch_process("Сборщик данных", os.path.join(BASE_DIR, 'collector.py'))
-        bot_proc = launch_process("Телеграм-бот", os.path.join(BASE_DIR, 'bot.py'))
+        with open(f"/proc/{pid}/stat", "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    # Имя процесса в скобках может содержать пробелы: поля считаются после ")"
+    fields = data[data.rindex(b")") + 2:].split()
+    return {
+        "cpu": (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS,
+        "threads": int(fields[17]),
+        "rss": int(fields[21]) * _PAGE_SIZE
+    }
+
+
+def _duration(seconds: float) -> str:
+    minutes, _ = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    days, hours = divmod(hours, 24)
+    if days:
+        return f"{days} д {hours} ч"
+    return f"{hours} ч {minutes:02d} мин" if hours else f"{minutes} мин"
+
+
+class Child:
+    """Описание дочернего процесса и его состояние под супервизором"""
+
+    def __init__(self, name: str, title: str, path: str, args: Optional[List[str]] = None):
+        self.name = name
+        self.title = title
+        self.argv = [sys.executable, os.path.join(BASE_DIR, path)] + (args or [])
+        self.proc: Optional[subprocess.Popen] = None
+        self.started = 0.0
+        self.restarts = 0
+        self.backoff = 0.0
+        self.next_start: Optional[float] = time.monotonic()
+        self._partial = b""
+        # Последний замер ресурсов: (время, процессорное время) для загрузки CPU
+        self.sample: Optional[tuple] = None
+
+    def feed(self, data: bytes) -> List[str]:
+        """Полные строки из очередной порции вывода"""
+        lines = (self._partial + data).split(b"\n")
+        self._partial = lines.pop()
+        if len(self._partial) > MAX_LINE:
+            lines.append(self._partial)
+            self._partial = b""
+        return [line.decode("utf-8", "replace").rstrip() for line in lines]
+
+    def flush(self) -> List[str]:
+        rest, self._partial = self._partial, b""
+        return [rest.decode("utf-8", "replace").rstrip()] if rest else []
+
+    def describe(self, now: float) -> str:
+        if self.proc is None:
+            wait = max(0.0, self.next_start - now) if self.next_start is not None else 0.0
+            return f"[{self.name}] не запущен (перезапуск через {wait:.0f} с), перезапусков: {self.restarts}"
+        line = f"[{self.name}] pid {self.proc.pid}, аптайм {_duration(now - self.started)}, перезапусков: {self.restarts}"
+        stat = read_proc_stat(self.proc.pid)
+        if stat is not None:
+            cpu = ""
+            if self.sample is not None and now > self.sample[0]:
+                cpu = f", CPU {(stat['cpu'] - self.sample[1]) / (now - self.sample[0]) * 100:.1f}%"
+            self.sample = (now, stat["cpu"])
+            line += f"{cpu}, RSS {stat['rss'] / 1024 / 1024:.0f} МБ, потоков {stat['threads']}"
+        return line
 
-        processes = [collector_proc, bot_proc]
 
-        # Запуск мониторинга вывода
-        import threading
-        threading.Thread(target=monitor_process, args=(collector_proc, "COLLECTOR"), daemon=True).start()
-        threading.Thread(target=monitor_process, args=(bot_proc, "BOT"), daemon=True).start()
+class Supervisor:
+    """
+    Запускает процессы и следит за ними в одном потоке: вывод и сигналы
+    приходят событиями selectors, завершение процесса определяется по
+    закрытию его вывода и poll()
+    """
 
+    def __init__(self, children: List[Child], settings: dict = SUPERVISOR_SETTINGS):
+        self.children = children
+        self.settings = settings
+        for child in children:
+            child.backoff = settings["backoff_initial"]
+        self.selector = selectors.DefaultSelector()
+        self._stopping = False
+        self._report_requested = False
+        self._next_report = time.monotonic() + settings["stats_interval"] if settings["stats_interval"] else None
+        # Сигналы будят цикл через self-pipe
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        os.set_blocking(self._wakeup_w, False)
+        self.selector.register(self._wakeup_r, selectors.EVENT_READ, None)
+
+    def _on_signal(self, signum, frame) -> None:
+        if signum == getattr(signal, "SIGUSR1", None):
+            self._report_requested = True
+        else:
+            self._stopping = True
+
+    def _launch(self, child: Child) -> None:
+        logger.info(f"🚀 Запуск: {child.title}")
+        try:
+            child.proc = subprocess.Popen(
+                child.argv,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                stdin=subprocess.DEVNULL,
+                env=dict(os.environ, PYTHONUNBUFFERED="1")
+            )
+        except OSError as e:
+            logger.error(f"❌ Ошибка запуска {child.title}: {str(e)}")
+            self._schedule_restart(child, time.monotonic())
+            return
+        child.started = time.monotonic()
+        child.next_start = None
+        child.sample = None
+        os.set_blocking(child.proc.stdout.fileno(), False)
+        self.selector.register(child.proc.stdout, selectors.EVENT_READ, child)
+
+    def _schedule_restart(self, child: Child, now: float) -> None:
+        child.next_start = now + child.backoff
+        logger.info(f"🔁 [{child.name}] перезапуск через {child.backoff:g} с")
+        child.backoff = min(child.backoff * 2, self.settings["backoff_max"])
+
+    def _read(self, child: Child) -> bool:
+        """Одна порция вывода в лог; False — читать пока нечего или вывод закрыт"""
+        try:
+            data = os.read(child.proc.stdout.fileno(), 65536)
+        except BlockingIOError:
+            return False
+        if data:
+            for line in child.feed(data):
+                if line:
+                    logger.info(f"[{child.name}] {line}")
+            return True
+        # Вывод закрыт: процесс завершается, код выхода заберёт _reap
+        self._close_output(child)
+        return False
+
+    def _close_output(self, child: Child) -> None:
+        for line in child.flush():
+            logger.info(f"[{child.name}] {line}")
+        self.selector.unregister(child.proc.stdout)
+        child.proc.stdout.close()
+
+    def _reap(self, now: float) -> None:
+        for child in self.children:
+            if child.proc is None or child.proc.poll() is None:
+                continue
+            if not child.proc.stdout.closed:
+                # Дочитываем остаток вывода упавшего процесса (канал может
+                # оставаться открытым, если его унаследовал потомок)
+                while self._read(child):
+                    pass
+                if not child.proc.stdout.closed:
+                    self._close_output(child)
+            uptime = now - child.started
+            logger.error(f"⚠️ [{child.name}] процесс {child.proc.pid} завершился с кодом "
+                         f"{child.proc.returncode} после {_duration(uptime)} работы")
+            child.proc = None
+            child.restarts += 1
+            if uptime >= self.settings["stable_after"]:
+                child.backoff = self.settings["backoff_initial"]
+            self._schedule_restart(child, now)
+
+    def _start_due(self, now: float) -> None:
+        for child in self.children:
+            if child.proc is None and child.next_start is not None and child.next_start <= now:
+                self._launch(child)
+
+    def _timeout(self, now: float) -> float:
+        moments = [child.next_start for child in self.children if child.proc is None and child.next_start is not None]
+        if self._next_report is not None:
+            moments.append(self._next_report)
+        # Верхний предел: poll() замечает процесс, оставивший вывод открытым
+        return max(0.0, min(moments + [now + 1.0]) - now)
+
+    def report(self) -> None:
+        now = time.monotonic()
+        for child in self.children:
+            logger.info(child.describe(now))
+
+    def run(self) -> None:
+        signal.set_wakeup_fd(self._wakeup_w)
+        signal.signal(signal.SIGINT, self._on_signal)
+        signal.signal(signal.SIGTERM, self._on_signal)
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, self._on_signal)
+
+        self._start_due(time.monotonic())
         logger.info("✅ Все компоненты запущены. Для выхода нажмите Ctrl+C")
+        try:
+            while not self._stopping:
+                for key, _ in self.selector.select(self._timeout(time.monotonic())):
+                    if key.data is None:
+                        os.read(self._wakeup_r, 512)
+                    else:
+                        self._read(key.data)
+                if self._stopping:
+                    break
+                now = time.monotonic()
+                self._reap(now)
+                self._start_due(now)
+                if self._report_requested or (self._next_report is not None and now >= self._next_report):
+                    self._report_requested = False
+                    if self._next_report is not None:
+                        self._next_report = now + self.settings["stats_interval"]
+                    self.report()
+        finally:
+            self.stop()
 
-        # Бесконечное ожидание с проверкой статуса
-        while True:
-            time.sleep(1)
-            for proc in processes:
-                if proc.poll() is not None:
-                    logger.error(f"⚠️ Процесс {proc.pid} завершился неожиданно!")
-                    raise RuntimeError("Один из процессов завершился")
-
-    except (KeyboardInterrupt, RuntimeError):
-        logger.info("\n🛑 Инициирована остановка процессов...")
-        for proc in processes:
-            if proc.poll() is None:
-                try:
-                    os.kill(proc.pid, signal.SIGTERM)
-                    proc.wait(timeout=10)
-                except subprocess.TimeoutExpired:
-                    logger.warning("⚠️ Принудительное завершение процесса...")
-                    os.kill(proc.pid, signal.SIGKILL)
-                except Exception as e:
-                    logger.error(f"Ошибка при остановке процесса: {str(e)}")
-        
+    def stop(self) -> None:
+        """В обратном порядке: писатель останавливается последним и успевает принять остаток очередей сборщиков"""
+        logger.info("🛑 Инициирована остановка процессов...")
+        for child in reversed(self.children):
+            proc = child.proc
+            if proc is None or proc.poll() is not None:
+                continue
+            try:
+                proc.terminate()
+                deadline = time.monotonic() + self.settings["stop_timeout"]
+                # Вывод читается и во время остановки, чтобы процесс не заблокировался на полном канале
+                while proc.poll() is None and time.monotonic() < deadline:
+                    for key, _ in self.selector.select(0.2):
+                        if key.data is None:
+                            os.read(self._wakeup_r, 512)
+                        else:
+                            self._read(key.data)
+                if proc.poll() is None:
+                    logger.warning(f"⚠️ [{child.name}] принудительное завершение процесса...")
+                    proc.kill()
+                    proc.wait()
+                while not proc.stdout.closed and self._read(child):
+                    pass
+            except Exception as e:
+                logger.error(f"Ошибка при остановке процесса {child.name}: {str(e)}")
         logger.info("🧹 Все процессы остановлены")
 
+
+def build_children() -> List[Child]:
+    """Процессы в порядке запуска: сначала единый писатель, затем сборщики, процессы отчётов и бот"""
+    # Каналы распределяются по воркерам сборщика; пустые шарды не запускаем
+    workers = max(1, min(COLLECTOR_WORKERS, len(COLLECTOR_CHANNELS)))
+    shards = shard_channels(COLLECTOR_CHANNELS, workers)
+
+    children = [Child("WRITER", "Писатель в БД", "ingest_writer.py")]
+    for worker, channels in enumerate(shards):
+        if not channels:
+            continue
+        args = ["--worker", str(worker), "--workers", str(workers), "--remote-writer"]
+        children.append(Child(f"COLLECTOR-{worker}", f"Сборщик данных #{worker} ({len(channels)} каналов)",
+                              "collector.py", args))
+    for worker in range(REPORT_WORKERS["processes"]):
+        children.append(Child(f"REPORTS-{worker}", f"Процесс отчётов #{worker}", "report_worker.py",
+                              ["--worker", str(worker)]))
+    children.append(Child("BOT", "Телеграм-бот", "bot.py"))
+    return children
+
+
+if __name__ == "__main__":
+    try:
+        Supervisor(build_children()).run()
     except Exception as e:
         logger.error(f"🔥 Критическая ошибка: {str(e)}")
         sys.exit(1)
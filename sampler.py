@@ -0,0 +1,197 @@
+# sampler.py
+
+import asyncio
+import heapq
+import logging
+import time
+from collections import defaultdict
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from config import SAMPLER_SETTINGS
+from database import get_recent_posts, insert_snapshots_many
+from ingestion import WriteBehindBuffer, message_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class RateBudget:
+    """Token bucket: не больше rate запросов в минуту с запасом до одной минуты"""
+
+    def __init__(self, per_minute: int):
+        self.capacity = max(1, per_minute)
+        self.rate = self.capacity / 60.0
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Ждёт, пока в бюджете появится запрос"""
+        while True:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class SnapshotSampler:
+    """
+    Планировщик повторных замеров метрик недавних постов.
+
+    Каждый отслеживаемый пост стоит в куче по времени следующего замера.
+    Интервал растёт с возрастом поста (SAMPLER_SETTINGS["schedule"]).
+    Созревшие посты группируются по каналу и запрашиваются пачками до 100 ID
+    в одном client.get_messages, а число запросов в минуту ограничено бюджетом.
+    Каждый замер пишется в engagement_snapshots, а последние значения
+    обновляют строку поста в engagement_data через буфер записи.
+    """
+
+    def __init__(
+        self,
+        client,
+        write_buffer: WriteBehindBuffer,
+        snapshot_sink: Callable[[Iterable[Tuple]], int] = insert_snapshots_many,
+        settings: Optional[dict] = None
+    ):
+        self.client = client
+        self.write_buffer = write_buffer
+        self.snapshot_sink = snapshot_sink
+        self.settings = settings or SAMPLER_SETTINGS
+        self.schedule: List[Tuple[int, int]] = sorted(self.settings["schedule"])
+        self.max_age = self.schedule[-1][0]
+        self.budget = RateBudget(self.settings["requests_per_minute"])
+
+        # (channel, message_id) -> время публикации; куча: (срок замера, channel, message_id)
+        self._published: Dict[Tuple[str, int], int] = {}
+        self._queue: List[Tuple[int, str, int]] = []
+        self._counters = {"requests": 0, "snapshots": 0, "dropped": 0, "errors": 0}
+
+    def _interval(self, age: int) -> Optional[int]:
+        """Интервал до следующего замера для поста данного возраста"""
+        for max_age, interval in self.schedule:
+            if age < max_age:
+                return interval
+        return None
+
+    def _schedule_next(self, channel: str, message_id: int, now: int) -> None:
+        published = self._published[(channel, message_id)]
+        interval = self._interval(now - published)
+        if interval is None:
+            del self._published[(channel, message_id)]
+            self._counters["dropped"] += 1
+            return
+        heapq.heappush(self._queue, (now + interval, channel, message_id))
+
+    def track(self, channel: str, message_id: int, published: datetime) -> None:
+        """Начинает отслеживать пост (повторный вызов игнорируется)"""
+        key = (channel, message_id)
+        if key in self._published:
+            return
+        self._published[key] = int(published.timestamp())
+        self._schedule_next(channel, message_id, int(time.time()))
+
+    def load_recent(self, channels: Optional[List[str]] = None) -> int:
+        """
+        Подхватывает из базы посты, ещё не вышедшие из окна замеров.
+        channels — ключи каналов воркера в базе: посты чужих шардов
+        замеряют их воркеры
+        """
+        now = int(time.time())
+        loaded = 0
+        for channel, post_id, ts in get_recent_posts(now - self.max_age, channels):
+            if not str(post_id).isdigit() or (channel, int(post_id)) in self._published:
+                continue
+            self._published[(channel, int(post_id))] = ts
+            self._schedule_next(channel, int(post_id), now)
+            loaded += 1
+        logger.info(f"Отслеживается постов после загрузки из БД: {loaded}")
+        return loaded
+
+    def _pop_due(self, now: int) -> Dict[str, List[int]]:
+        due = defaultdict(list)
+        while self._queue and self._queue[0][0] <= now:
+            _, channel, message_id = heapq.heappop(self._queue)
+            if (channel, message_id) in self._published:
+                due[channel].append(message_id)
+        return due
+
+    async def _sample_batch(self, channel: str, ids: List[int]) -> None:
+        await self.budget.acquire()
+        entity = int(channel) if channel.lstrip("-").isdigit() else channel
+        try:
+            messages = await self.client.get_messages(entity, ids=ids)
+        except Exception as e:
+            # Пачку не теряем: попробуем на следующем проходе
+            self._counters["errors"] += 1
+            logger.warning(f"Не удалось получить замеры канала {channel}: {e}")
+            self._retry(channel, ids)
+            return
+        self._counters["requests"] += 1
+
+        now = int(time.time())
+        snapshots = []
+        # Посты, начиная с handled, ещё не переставлены в очередь
+        handled = 0
+        try:
+            for handled, (message_id, msg) in enumerate(zip(ids, messages)):
+                if msg is None:
+                    # Пост удалён — замерять больше нечего
+                    self._published.pop((channel, message_id), None)
+                    self._counters["dropped"] += 1
+                    continue
+                views, forwards, replies = message_metrics(msg)
+                snapshots.append((str(message_id), channel, now, views, forwards, replies))
+                self.write_buffer.add(
+                    post_id=str(message_id),
+                    likes=views,
+                    comments=replies,
+                    shares=forwards,
+                    channel=channel,
+                    date=msg.date.isoformat()
+                )
+                self._schedule_next(channel, message_id, now)
+            handled = len(ids)
+
+            if snapshots:
+                await asyncio.get_running_loop().run_in_executor(None, self.snapshot_sink, snapshots)
+                self._counters["snapshots"] += len(snapshots)
+        except Exception as e:
+            # Ошибка одной пачки не должна прерывать проход и терять посты остальных
+            self._counters["errors"] += 1
+            logger.warning(f"Ошибка обработки замеров канала {channel}: {e}")
+            self._retry(channel, ids[handled:])
+
+    def _retry(self, channel: str, ids: List[int]) -> None:
+        """Возвращает посты в очередь до следующего прохода"""
+        retry_at = int(time.time()) + self.settings["tick"]
+        for message_id in ids:
+            heapq.heappush(self._queue, (retry_at, channel, message_id))
+
+    async def run_once(self) -> None:
+        """Один проход: замеры всех созревших постов"""
+        due = self._pop_due(int(time.time()))
+        batch_size = self.settings["batch_size"]
+        for channel, ids in due.items():
+            for start in range(0, len(ids), batch_size):
+                await self._sample_batch(channel, ids[start:start + batch_size])
+
+    async def run(self) -> None:
+        """Бесконечный цикл планировщика (запускается задачей в цикле Telethon)"""
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                self._counters["errors"] += 1
+                logger.error(f"Ошибка планировщика замеров: {e}", exc_info=True)
+            await asyncio.sleep(self.settings["tick"])
+
+    def stats(self) -> dict:
+        stats = dict(self._counters)
+        stats["tracked"] = len(self._published)
+        stats["queued"] = len(self._queue)
+        return stats
@@ -0,0 +1,27 @@
+# sharding.py
+
+import hashlib
+from typing import List, Sequence
+
+
+def _weight(channel: str, worker: int) -> int:
+    digest = hashlib.sha1(f"{channel}#{worker}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def worker_for_channel(channel: str, workers: int) -> int:
+    """
+    Номер воркера для канала (rendezvous hashing): назначение не зависит
+    от порядка каналов, а при изменении числа воркеров переезжает
+    только минимально необходимая доля каналов
+    """
+    return max(range(workers), key=lambda worker: _weight(str(channel), worker))
+
+
+def shard_channels(channels: Sequence[str], workers: int) -> List[List[str]]:
+    """Раскладывает каналы по воркерам: shards[i] — каналы воркера i"""
+    workers = max(1, workers)
+    shards: List[List[str]] = [[] for _ in range(workers)]
+    for channel in channels:
+        shards[worker_for_channel(channel, workers)].append(channel)
+    return shards
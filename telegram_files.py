@@ -0,0 +1,164 @@
+# telegram_files.py
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from telegram.error import BadRequest
+
+from config import TELEGRAM_FILE_CACHE_SETTINGS
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramFileCache:
+    """
+    Кэш file_id загруженных в Telegram документов.
+
+    Ключ — SHA-256 содержимого файла: повторная отправка того же отчёта
+    (другому администратору, из кэша отчётов, плановая рассылка) ссылается
+    на file_id и не загружает файл заново. Записи устаревших версий отчётов
+    вытесняются по давности обращения (max_entries) и по ttl. Если Telegram
+    отвергает file_id, запись сбрасывается и файл загружается снова.
+    """
+
+    def __init__(self, settings: Optional[dict] = None):
+        self.settings = settings or TELEGRAM_FILE_CACHE_SETTINGS
+        self.enabled = self.settings["enabled"]
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Хэши уже прочитанных файлов (LRU не больше max_entries): (путь, mtime, размер) -> sha256
+        self._hashes: "OrderedDict[Tuple[str, float, int], str]" = OrderedDict()
+        if self.enabled:
+            self._init_table()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.settings["path"], timeout=10)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _init_table(self) -> None:
+        conn = self._connect()
+        conn.execute("""
+        CREATE TABLE IF NOT EXISTS telegram_files (
+            hash TEXT PRIMARY KEY,
+            name TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+        """)
+        # Индекс по имени остался от прежней инвалидации по имени файла
+        conn.execute("DROP INDEX IF EXISTS idx_telegram_files_name")
+        conn.commit()
+
+    def content_hash(self, path: str) -> str:
+        """SHA-256 содержимого; готовые отчёты не меняются на месте, поэтому хэш запоминается"""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+        with self._lock:
+            digest = self._hashes.get(key)
+            if digest is not None:
+                self._hashes.move_to_end(key)
+        if digest is None:
+            sha = hashlib.sha256()
+            with open(path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    sha.update(block)
+            digest = sha.hexdigest()
+            with self._lock:
+                self._hashes[key] = digest
+                while len(self._hashes) > self.settings["max_entries"]:
+                    self._hashes.popitem(last=False)
+        return digest
+
+    def get(self, digest: str) -> Optional[str]:
+        """file_id для содержимого или None (просроченные записи удаляются)"""
+        if not self.enabled:
+            return None
+        now = time.time()
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT file_id, created FROM telegram_files WHERE hash = ?", (digest,)).fetchone()
+            if row and now - row[1] > self.settings["ttl"]:
+                conn.execute("DELETE FROM telegram_files WHERE hash = ?", (digest,))
+                row = None
+            elif row:
+                conn.execute("UPDATE telegram_files SET last_access = ? WHERE hash = ?", (now, digest))
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.warning(f"Ошибка чтения кэша file_id: {e}")
+            row = None
+        return row[0] if row else None
+
+    def put(self, digest: str, name: str, file_id: str, size: int) -> None:
+        """Запоминает file_id и вытесняет самые давно использованные записи сверх max_entries"""
+        if not self.enabled:
+            return
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO telegram_files (hash, name, file_id, size, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (digest, name, file_id, size, now, now)
+            )
+            conn.execute("""
+            DELETE FROM telegram_files WHERE hash IN (
+                SELECT hash FROM telegram_files ORDER BY last_access DESC LIMIT -1 OFFSET ?
+            )
+            """, (self.settings["max_entries"],))
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.warning(f"Ошибка записи в кэш file_id: {e}")
+
+    def invalidate(self, digest: str) -> None:
+        """Сбрасывает отвергнутый file_id; ошибка базы не мешает загрузить файл заново"""
+        if not self.enabled:
+            return
+        conn = self._connect()
+        try:
+            conn.execute("DELETE FROM telegram_files WHERE hash = ?", (digest,))
+            conn.commit()
+        except sqlite3.Error as e:
+            conn.rollback()
+            logger.warning(f"Ошибка удаления из кэша file_id: {e}")
+
+    def send_document(self, bot, chat_id, path: str, caption: Optional[str] = None):
+        """
+        Отправляет документ: по сохранённому file_id, если это содержимое уже
+        загружалось, иначе загрузкой файла с записью полученного file_id
+        """
+        name = os.path.basename(path)
+        digest = self.content_hash(path)
+        file_id = self.get(digest)
+        if file_id is not None:
+            try:
+                with metrics.timer("report_send_cached"):
+                    message = bot.send_document(chat_id=chat_id, document=file_id, caption=caption)
+                metrics.inc("report_uploads_saved")
+                return message
+            except BadRequest as e:
+                logger.warning(f"Telegram отклонил file_id отчёта {name}, загружаем заново: {e}")
+                self.invalidate(digest)
+
+        with open(path, "rb") as doc, metrics.timer("report_upload"):
+            message = bot.send_document(chat_id=chat_id, document=doc, filename=name, caption=caption)
+        metrics.inc("report_uploads")
+        document = getattr(message, "document", None)
+        if document is not None:
+            self.put(digest, name, document.file_id, os.path.getsize(path))
+        return message
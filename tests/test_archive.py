@@ -0,0 +1,78 @@
+# tests/test_archive.py
+"""
+Перенос в архив и повторная догрузка уже перенесённых постов.
+
+Запуск из корня проекта:
+    python -m pytest -q tests
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import config
+import database as db
+
+OLD_DATE = "2024-01-15T10:00:00"
+
+
+class ArchiveReinsertTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._saved = (db.DB_PATH, config.ARCHIVE_SETTINGS["dir"], config.ARCHIVE_SETTINGS["vacuum_hot"])
+        db.close_all_connections()
+        db.DB_PATH = os.path.join(self.tmp, "engagement.db")
+        config.ARCHIVE_SETTINGS["dir"] = os.path.join(self.tmp, "archive")
+        config.ARCHIVE_SETTINGS["vacuum_hot"] = False
+        db.create_engagement_table()
+        self.start, self.end = db.date_range_to_epoch("2024-01-01", "2024-01-31")
+
+    def tearDown(self):
+        db.close_all_connections()
+        db.DB_PATH, config.ARCHIVE_SETTINGS["dir"], config.ARCHIVE_SETTINGS["vacuum_hot"] = self._saved
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _posts(self):
+        return sorted(row[1:3] for row in db.get_engagement_data_by_range("2024-01-01", "2024-01-31"))
+
+    def _rollup(self):
+        """(posts, likes_sum) за январь по дневным предагрегатам"""
+        rows = db.get_rollup_data_between(self.start, self.end)
+        posts = db.ROLLUP_COLUMNS.index("posts")
+        likes = db.ROLLUP_COLUMNS.index("likes_sum")
+        return sum(row[posts] for row in rows), sum(row[likes] for row in rows)
+
+    def test_reinserted_post_replaces_archived_row(self):
+        db.insert_engagement_data("1", 10, 0, 0, "ch", OLD_DATE)
+        db.insert_engagement_data("2", 5, 0, 0, "ch", OLD_DATE)
+        self.assertEqual(db.archive_cold_data(30), {"2024-01": 2})
+
+        # Догрузка истории возвращает пост 1 в горячую базу с новыми значениями
+        db.insert_engagement_data("1", 12, 0, 0, "ch", OLD_DATE)
+        self.assertEqual(self._posts(), [("1", 12), ("2", 5)])
+        self.assertEqual(db.get_data_fingerprint(self.start, self.end)[0], 2)
+
+        self.assertEqual(db.archive_cold_data(30), {"2024-01": 1})
+        self.assertEqual(self._posts(), [("1", 12), ("2", 5)])
+        self.assertEqual(db.get_data_fingerprint(self.start, self.end)[0], 2)
+        self.assertEqual(self._rollup(), (2, 17))
+
+    def test_extremes_include_archived_rows(self):
+        db.insert_engagement_data("1", 10, 0, 0, "ch", OLD_DATE)
+        db.insert_engagement_data("2", 5, 0, 0, "ch", OLD_DATE)
+        db.archive_cold_data(30)
+        # Заменённый пост был максимумом бакета; остальные строки бакета — в архиве
+        db.insert_engagement_data("1", 3, 0, 0, "ch", OLD_DATE)
+        db.archive_cold_data(30)
+
+        for granularity in db.ROLLUP_TABLES:
+            rows = db.get_rollup_data_between(self.start, self.end, granularity=granularity)
+            self.assertEqual(len(rows), 1)
+            row = dict(zip(db.ROLLUP_COLUMNS, rows[0]))
+            self.assertEqual((row["posts"], row["likes_sum"], row["likes_min"], row["likes_max"]), (2, 8, 3, 5))
+        self.assertEqual(db.execute_query("SELECT COUNT(*) FROM rollup_stale")[0][0], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+# tests/test_engagement_stats.py
+"""Слияние пачек в StreamingStats и сводка по предагрегатам"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+import database as db
+from engagement_stats import METRICS, EngagementSummary, StreamingStats
+
+
+def _rows(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+    return [
+        (int((start + timedelta(minutes=37 * i)).timestamp()),
+         rng.randint(0, 5000), rng.randint(0, 300), rng.randint(0, 100))
+        for i in range(count)
+    ]
+
+
+class StreamingStatsTest(unittest.TestCase):
+    def test_uneven_chunks_match_single_pass(self):
+        rows = _rows(5000)
+        stats = StreamingStats()
+        for start, end in ((0, 1), (1, 1000), (1000, 1003), (1003, 5000)):
+            stats.update(rows[start:end])
+        summary = stats.to_summary()
+
+        frame = pd.DataFrame([row[1:] for row in rows], columns=METRICS).astype(float)
+        expected = frame.describe().loc[['count', 'mean', 'std', 'min', 'max']]
+        self.assertEqual(list(summary.describe.index), list(expected.index))
+        np.testing.assert_allclose(summary.describe.values, expected.values, rtol=1e-9)
+        np.testing.assert_allclose(summary.corr.values, frame.corr().values, rtol=1e-9, atol=1e-12)
+        self.assertEqual(summary.weekday_likes.sum(), frame['likes'].sum())
+
+    def test_empty_stream_is_an_error(self):
+        with self.assertRaises(ValueError):
+            StreamingStats().to_summary()
+
+
+class RollupSummaryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._db_path = db.DB_PATH
+        db.close_all_connections()
+        db.DB_PATH = os.path.join(self.tmp, "engagement.db")
+        db.create_engagement_table()
+
+    def tearDown(self):
+        db.close_all_connections()
+        db.DB_PATH = self._db_path
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_rollups_match_stream(self):
+        db.insert_engagement_data_many(
+            db.make_engagement_row(str(i), likes, comments, shares, f"ch{i % 3}",
+                                   datetime.utcfromtimestamp(ts).isoformat())
+            for i, (ts, likes, comments, shares) in enumerate(_rows(2000))
+        )
+        start, end = db.date_range_to_epoch("2024-01-01", "2024-03-31")
+        streamed = EngagementSummary.from_stream(db.iter_engagement_metrics_between(start, end))
+        for granularity in db.ROLLUP_TABLES:
+            rolled = EngagementSummary.from_rollups(db.get_rollup_data_between(start, end, granularity=granularity))
+            self.assertEqual(rolled.posts, streamed.posts)
+            # Одинаковая таблица ключевых показателей для любого периода
+            pd.testing.assert_index_equal(rolled.describe.index, streamed.describe.index)
+            np.testing.assert_allclose(rolled.describe.values, streamed.describe.values, rtol=1e-9)
+            np.testing.assert_allclose(rolled.corr.values, streamed.corr.values, rtol=1e-6)
+            self.assertEqual(rolled.weekday_likes.sum(), streamed.weekday_likes.sum())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+# tests/test_ingestion.py
+"""Сброс WriteBehindBuffer: схлопывание, пачки и возврат строк после ошибки"""
+
+import threading
+import unittest
+
+from ingestion import WriteBehindBuffer
+
+DATE = "2024-01-15T10:00:00"
+
+
+class _Sink:
+    """Запоминает пачки; первые failures вызовов падают"""
+
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.batches = []
+        self.written = threading.Event()
+
+    def __call__(self, rows):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("database is locked")
+        self.batches.append(list(rows))
+        self.written.set()
+        return len(self.batches[-1])
+
+
+class WriteBehindBufferTest(unittest.TestCase):
+    def test_repeated_post_is_coalesced(self):
+        sink = _Sink()
+        buffer = WriteBehindBuffer(sink, batch_size=100, flush_interval=60)
+        buffer.add("1", 5, 0, 0, "ch", DATE)
+        buffer.add("1", 7, 0, 0, "ch", DATE)
+        buffer.add("1", 1, 0, 0, "other", DATE)
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(sorted((row[5], row[1]) for row in sink.batches[0]), [("ch", 7), ("other", 1)])
+        self.assertEqual(buffer.stats()["coalesced"], 1)
+        self.assertEqual(buffer.flush(), 0)
+
+    def test_failed_flush_requeues_without_overwriting_newer_rows(self):
+        sink = _Sink(failures=1)
+        buffer = WriteBehindBuffer(sink, batch_size=100, flush_interval=60)
+        buffer.add("1", 5, 0, 0, "ch", DATE)
+        buffer.add("2", 5, 0, 0, "ch", DATE)
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(buffer.queue_depth, 2)
+        # Пока пачка не записана, пост 1 замерен снова
+        buffer.add("1", 9, 0, 0, "ch", DATE)
+        self.assertEqual(buffer.flush(), 2)
+        self.assertEqual(sorted((row[0], row[1]) for row in sink.batches[0]), [("1", 9), ("2", 5)])
+        self.assertEqual(buffer.stats()["failed_flushes"], 1)
+
+    def test_full_batch_wakes_background_flush(self):
+        sink = _Sink()
+        buffer = WriteBehindBuffer(sink, batch_size=2, flush_interval=60).start()
+        try:
+            buffer.add("1", 1, 0, 0, "ch", DATE)
+            buffer.add("2", 1, 0, 0, "ch", DATE)
+            self.assertTrue(sink.written.wait(5))
+        finally:
+            buffer.close()
+        self.assertEqual(sum(len(batch) for batch in sink.batches), 2)
+
+    def test_close_flushes_remainder(self):
+        sink = _Sink()
+        buffer = WriteBehindBuffer(sink, batch_size=100, flush_interval=60).start()
+        buffer.add("1", 1, 0, 0, "ch", DATE)
+        buffer.close()
+        self.assertEqual(len(sink.batches), 1)
+        self.assertEqual(buffer.queue_depth, 0)
+
+    def test_invalid_row_is_rejected_on_add(self):
+        buffer = WriteBehindBuffer(_Sink(), batch_size=100, flush_interval=60)
+        with self.assertRaises(ValueError):
+            buffer.add("1", -1, 0, 0, "ch", DATE)
+        self.assertEqual(buffer.queue_depth, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+# tests/test_live_summary.py
+"""Финальная правка LiveSummary при лимите Telegram"""
+
+import unittest
+
+from telegram.error import RetryAfter
+
+from live_summary import LiveSummary
+
+
+class _Sent:
+    message_id = 7
+
+
+class _Bot:
+    """Первые limited правок отвечают RetryAfter"""
+
+    def __init__(self, limited: int = 0):
+        self.limited = limited
+        self.edits = []
+
+    def send_message(self, chat_id, text):
+        return _Sent()
+
+    def edit_message_text(self, text, chat_id, message_id):
+        if self.limited:
+            self.limited -= 1
+            raise RetryAfter(0)
+        self.edits.append(text)
+
+
+class LiveSummaryTest(unittest.TestCase):
+    def _summary(self, bot):
+        summary = LiveSummary(1, [(bot, 100)], interval=0)
+        summary.on_section("advanced", "текст", done=True)
+        return summary
+
+    def test_final_edit_is_retried_after_retry_after(self):
+        bot = _Bot(limited=1)
+        self._summary(bot).finish("✅ Отчёт готов")
+        self.assertEqual(len(bot.edits), 1)
+        self.assertTrue(bot.edits[0].startswith("✅ Отчёт готов"))
+
+    def test_final_edit_is_retried_once(self):
+        bot = _Bot(limited=2)
+        self._summary(bot).finish("✅ Отчёт готов")
+        self.assertEqual((bot.edits, bot.limited), ([], 0))
+
+    def test_intermediate_edit_is_postponed(self):
+        bot = _Bot(limited=1)
+        summary = self._summary(bot)
+        summary.on_section("advanced", "ещё текст", done=True)
+        self.assertEqual(bot.edits, [])
+        self.assertTrue(summary._dirty)
+
+
+if __name__ == "__main__":
+    unittest.main()
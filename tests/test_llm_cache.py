@@ -0,0 +1,50 @@
+# tests/test_llm_cache.py
+"""Попадания, промахи и размер LLMCache в реестре metrics"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from config import LLM_CACHE_SETTINGS
+from llm_cache import LLMCache
+from metrics import metrics, read_exported
+
+
+class LLMCacheMetricsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        metrics.reset()
+        self.cache = LLMCache(dict(LLM_CACHE_SETTINGS, enabled=True, path=os.path.join(self.tmp, "cache.db"),
+                                   max_entries=2))
+
+    def tearDown(self):
+        metrics.reset()
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def test_hits_misses_and_size(self):
+        self.assertIsNone(self.cache.get("a"))
+        for key in ("a", "b", "c"):
+            self.cache.put(key, "ответ")
+        self.assertEqual(self.cache.get("c"), "ответ")
+
+        self.assertEqual(metrics.counters["llm_cache_hits"], 1)
+        self.assertEqual(metrics.counters["llm_cache_misses"], 1)
+        self.assertEqual(metrics.counters["llm_cache_evicted"], 1)
+        self.assertEqual(metrics.gauges["llm_cache_entries"], 2)
+        self.assertEqual(metrics.gauges["llm_cache_bytes"], 2 * len("ответ".encode("utf-8")))
+        self.assertIn("llm_cache_entries: 2", metrics.render_text())
+
+        self.cache.clear()
+        self.assertEqual(metrics.gauges["llm_cache_entries"], 0)
+
+    def test_gauges_are_exported(self):
+        self.cache.put("a", "ответ")
+        with open(os.path.join(self.tmp, "bot.prom"), "w", encoding="utf-8") as f:
+            f.write(metrics.render_prometheus())
+        summary = read_exported(settings={"dir": self.tmp})["bot"]
+        self.assertIn("llm_cache_entries: 1", summary)
+
+
+if __name__ == "__main__":
+    unittest.main()
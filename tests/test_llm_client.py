@@ -0,0 +1,135 @@
+# tests/test_llm_client.py
+"""Автомат CircuitBreaker и выбор запасной модели в LLMClient"""
+
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+from config import LLM_SETTINGS
+from llm_client import CircuitBreaker, LLMClient, LLMTimeout, LLMUnavailable
+
+
+class _Response:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+class _Session:
+    """Заменяет requests.Session: отвечает или бросает заданное исключение"""
+
+    def __init__(self, error=None):
+        self.error = error
+        self.models = []
+
+    def post(self, url, json, timeout):
+        self.models.append(json["model"])
+        if self.error is not None:
+            raise self.error
+        return _Response({"response": "ok", "eval_count": 10, "eval_duration": 1e9})
+
+
+def _client(**overrides) -> LLMClient:
+    settings = dict(LLM_SETTINGS, fallback_model="small", **overrides)
+    client = LLMClient(settings, url="http://ollama.invalid")
+    client.session = _Session()
+    return client
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def test_opens_after_failures_and_probes_once(self):
+        breaker = CircuitBreaker(failures=2, reset=0.05)
+        breaker.failure()
+        self.assertTrue(breaker.allow())
+        breaker.failure()
+        self.assertEqual(breaker.state, "open")
+        self.assertFalse(breaker.allow())
+
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        # Пока идёт пробный запрос, остальные не пропускаются
+        self.assertFalse(breaker.allow())
+        breaker.success()
+        self.assertEqual(breaker.state, "closed")
+        self.assertTrue(breaker.allow())
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker(failures=1, reset=0.05)
+        breaker.failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.failure()
+        self.assertEqual(breaker.state, "open")
+
+    def test_release_frees_probe(self):
+        breaker = CircuitBreaker(failures=1, reset=0.05)
+        breaker.failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.release()
+        self.assertTrue(breaker.allow())
+
+
+class FallbackTest(unittest.TestCase):
+    def test_slow_primary_goes_to_fallback(self):
+        client = _client()
+        client._record("llama3", 61.0)
+        self.assertEqual(client._pick_model(None), "small")
+
+    def test_primary_is_probed_again(self):
+        client = _client(probe_interval=0.05)
+        client._record("llama3", 61.0)
+        self.assertEqual(client._pick_model(None), "small")
+        time.sleep(0.06)
+        self.assertEqual(client._pick_model(None), "llama3")
+        self.assertEqual(client._pick_model(None), "small")
+
+    def test_recovered_primary_is_used_again(self):
+        client = _client(probe_interval=0)
+        client._record("llama3", 61.0)
+        for _ in range(10):
+            client.generate("prompt")
+        self.assertLess(client._latency["llama3"], LLM_SETTINGS["slo_seconds"])
+        self.assertEqual(client._pick_model(None), "llama3")
+
+    def test_no_probe_without_time_for_it(self):
+        client = _client(probe_interval=0)
+        client._record("llama3", 61.0)
+        self.assertEqual(client._pick_model(5.0), "small")
+
+    def test_deadline_timeout_is_not_recorded(self):
+        client = _client()
+        client.session = _Session(requests.exceptions.ReadTimeout("slow"))
+        with self.assertRaises(LLMTimeout):
+            client.generate("prompt", deadline=time.monotonic() + 5)
+        self.assertNotIn("llama3", client._latency)
+        self.assertEqual(client.breaker.state, "closed")
+
+    def test_call_timeouts_open_breaker(self):
+        client = _client(breaker_failures=2)
+        client.session = _Session(requests.exceptions.ReadTimeout("slow"))
+        for _ in range(2):
+            with self.assertRaises(LLMTimeout):
+                client.generate("prompt")
+        self.assertIn("llama3", client._latency)
+        with self.assertRaises(LLMUnavailable):
+            client.generate("prompt")
+        self.assertEqual(len(client.session.models), 2)
+
+    def test_expired_deadline_does_not_call(self):
+        client = _client()
+        with mock.patch.object(client.breaker, "allow") as allow:
+            with self.assertRaises(LLMTimeout):
+                client.generate("prompt", deadline=time.monotonic() - 1)
+        allow.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
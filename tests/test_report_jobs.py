@@ -0,0 +1,104 @@
+# tests/test_report_jobs.py
+"""Очередь ReportJobQueue: объединение одинаковых запросов и отмена"""
+
+import threading
+import unittest
+
+from report_jobs import CANCELLED, DONE, FAILED, ReportJobQueue
+
+
+class ReportJobQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.finished = []
+        self.done = threading.Event()
+        self.release = threading.Event()
+        self.queue = ReportJobQueue(self._on_finish, workers=1)
+
+    def tearDown(self):
+        self.release.set()
+        self.queue.shutdown()
+
+    def _on_finish(self, job):
+        self.finished.append(job)
+        self.done.set()
+
+    def _blocking_build(self, calls):
+        def build(job):
+            calls.append(job.id)
+            while not self.release.wait(0.01):
+                job.progress.check()
+            return "report.docx"
+        return build
+
+    def _wait(self):
+        self.assertTrue(self.done.wait(5))
+        self.done.clear()
+
+    def test_same_key_is_coalesced(self):
+        calls = []
+        job, joined = self.queue.submit("daily", "отчёт", self._blocking_build(calls), "chat-1")
+        again, joined_again = self.queue.submit("daily", "отчёт", self._blocking_build(calls), "chat-2")
+        self.assertEqual((joined, joined_again), (False, True))
+        self.assertIs(again, job)
+        self.release.set()
+        self._wait()
+        self.assertEqual((calls, job.status, job.result), ([job.id], DONE, "report.docx"))
+        self.assertEqual(job.subscribers, ["chat-1", "chat-2"])
+
+    def test_finished_key_starts_a_new_build(self):
+        self.release.set()
+        first, _ = self.queue.submit("daily", "отчёт", lambda job: "a.docx", "chat-1")
+        self._wait()
+        second, joined = self.queue.submit("daily", "отчёт", lambda job: "b.docx", "chat-1")
+        self._wait()
+        self.assertFalse(joined)
+        self.assertNotEqual(first.id, second.id)
+
+    def test_cancel_stops_job_without_subscribers(self):
+        job, _ = self.queue.submit("daily", "отчёт", self._blocking_build([]), "chat-1")
+        self.assertEqual(self.queue.cancel("chat-1"), [job])
+        self._wait()
+        self.assertEqual(job.status, CANCELLED)
+        self.assertEqual(self.queue.snapshot(), ([], [job]))
+
+    def test_cancel_keeps_job_others_wait_for(self):
+        job, _ = self.queue.submit("daily", "отчёт", self._blocking_build([]), "chat-1")
+        self.queue.submit("daily", "отчёт", self._blocking_build([]), "chat-2")
+        self.queue.cancel("chat-1")
+        self.assertFalse(job.progress.cancelled.is_set())
+        self.release.set()
+        self._wait()
+        self.assertEqual((job.status, job.subscribers), (DONE, ["chat-2"]))
+
+    def test_background_job_survives_cancel(self):
+        job, _ = self.queue.submit("daily", "отчёт", self._blocking_build([]), None, background=True)
+        self.queue.submit("daily", "отчёт", self._blocking_build([]), "chat-1")
+        self.queue.cancel("chat-1")
+        self.release.set()
+        self._wait()
+        self.assertEqual(job.status, DONE)
+
+    def test_cancelled_job_is_not_joined(self):
+        calls = []
+        job, _ = self.queue.submit("daily", "отчёт", self._blocking_build(calls), "chat-1")
+        self.queue.cancel("chat-1")
+        fresh, joined = self.queue.submit("daily", "отчёт", self._blocking_build(calls), "chat-1")
+        self.assertFalse(joined)
+        self.assertIsNot(fresh, job)
+        self._wait()
+        self.release.set()
+        self._wait()
+        self.assertEqual((job.status, fresh.status), (CANCELLED, DONE))
+
+    def test_build_error_fails_job(self):
+        def build(job):
+            raise RuntimeError("boom")
+
+        job, _ = self.queue.submit("daily", "отчёт", build, "chat-1")
+        self._wait()
+        self.assertEqual(job.status, FAILED)
+        self.assertIsInstance(job.error, RuntimeError)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+# tests/test_report_scheduler.py
+"""Актуальность заранее собранных отчётов (ReportScheduler.fresh)"""
+
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+import database as db
+from report_scheduler import ReportScheduler, period_params, period_window
+from report_store import ReportArtifactStore
+
+SETTINGS = {
+    "max_age": {"daily": 3600},
+    "min_changed_rows": 50,
+    "min_changed_ratio": 0.05
+}
+
+
+class ReportSchedulerFreshTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._db_path = db.DB_PATH
+        db.close_all_connections()
+        db.DB_PATH = os.path.join(self.tmp, "engagement.db")
+        db.create_engagement_table()
+        self.store = ReportArtifactStore({"dir": os.path.join(self.tmp, "reports"), "max_age": 86400, "max_bytes": 10 ** 9,
+                                            "access_flush_interval": 60})
+        self.scheduler = ReportScheduler(None, self.store, None, dict(SETTINGS, max_age=dict(SETTINGS["max_age"])))
+
+    def tearDown(self):
+        db.close_all_connections()
+        db.DB_PATH = self._db_path
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _insert(self, post_id: str, hours_ago: float = 1) -> None:
+        date = (datetime.now(timezone.utc) - timedelta(hours=hours_ago)).isoformat()
+        db.insert_engagement_data(post_id, 1, 0, 0, "ch", date)
+
+    def _build(self) -> str:
+        fingerprint = db.get_data_fingerprint(*period_window("daily"))
+        return self.store.fetch_or_build(period_params("daily"), fingerprint, "r.docx",
+                                         lambda path: open(path, "w").close())
+
+    def test_needs_a_measurement(self):
+        self._insert("1")
+        self._build()
+        self.assertIsNone(self.scheduler.fresh("daily"))
+        self.assertFalse(self.scheduler._stale("daily"))
+        self.assertIsNotNone(self.scheduler.fresh("daily"))
+
+    def test_unchanged_data_is_fresh_at_any_age(self):
+        self._insert("1")
+        self._build()
+        self.scheduler.settings["max_age"]["daily"] = -1
+        self.assertFalse(self.scheduler._stale("daily"))
+
+    def test_small_change_within_max_age_is_fresh(self):
+        self._insert("1")
+        self._build()
+        self._insert("2")
+        self.assertFalse(self.scheduler._stale("daily"))
+        self.scheduler.settings["max_age"]["daily"] = -1
+        self.assertTrue(self.scheduler._stale("daily"))
+
+    def test_empty_window_is_not_fresh(self):
+        self._insert("1")
+        self._build()
+        db.execute_query("DELETE FROM engagement_data", commit=True)
+        self.scheduler._measure("daily")
+        self.assertIsNone(self.scheduler.fresh("daily"))
+
+    def test_lower_max_id_is_not_fresh(self):
+        self._insert("1")
+        self._insert("2")
+        self._build()
+        db.execute_query("DELETE FROM engagement_data WHERE post_id = '2'", commit=True)
+        self._insert("3", hours_ago=48)
+        self.scheduler._measure("daily")
+        self.assertIsNone(self.scheduler.fresh("daily"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+# tests/test_report_store.py
+"""Вытеснение и блокировки в ReportArtifactStore"""
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from report_store import ReportArtifactStore
+
+
+def _writer(size: int, calls: list = None, delay: float = 0):
+    def build(path):
+        if calls is not None:
+            calls.append(path)
+        time.sleep(delay)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+    return build
+
+
+class ReportStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.settings = {"dir": self.tmp, "max_age": 86400, "max_bytes": 250, "access_flush_interval": 60}
+        self.store = ReportArtifactStore(self.settings)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _build(self, name: str, size: int = 100) -> str:
+        return self.store.fetch_or_build({"period": name}, [1], f"{name}.docx", _writer(size))
+
+    def test_size_limit_evicts_least_recently_used(self):
+        self._build("a")
+        self._build("b")
+        time.sleep(0.01)
+        # Обращение к "a" ещё не записано в индекс, но учитывается при вытеснении
+        self.assertIsNotNone(self.store.get({"period": "a"}, [1]))
+        self._build("c")
+        self.assertIsNotNone(self.store.get({"period": "a"}, [1]))
+        self.assertIsNone(self.store.get({"period": "b"}, [1]))
+        self.assertFalse(os.path.exists(os.path.join(self.tmp, self.store.make_key({"period": "b"}, [1]))))
+
+    def test_expired_reports_are_evicted(self):
+        self._build("a")
+        self.store.settings["max_age"] = -1
+        self._build("b")
+        self.assertIsNone(self.store.get({"period": "a"}, [1]))
+        self.assertIsNotNone(self.store.get({"period": "b"}, [1]))
+
+    def test_hit_does_not_rewrite_index(self):
+        self._build("a")
+        signature = self.store._index_signature()
+        for _ in range(5):
+            self.assertIsNotNone(self.store.get({"period": "a"}, [1]))
+            self.assertIsNotNone(self.store.latest({"period": "a"}))
+        self.assertEqual(self.store._index_signature(), signature)
+
+        self.store.settings["access_flush_interval"] = 0
+        self.store.get({"period": "a"}, [1])
+        self.assertNotEqual(self.store._index_signature(), signature)
+
+    def test_concurrent_builds_of_one_key(self):
+        calls = []
+        builder = _writer(10, calls, delay=0.05)
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(
+                self.store.fetch_or_build({"period": "a"}, [1], "a.docx", builder)))
+            for _ in range(4)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(self.store._key_locks, {})
+
+    def test_failed_build_releases_key(self):
+        def fail(path):
+            raise RuntimeError("build failed")
+
+        with self.assertRaises(RuntimeError):
+            self.store.fetch_or_build({"period": "a"}, [1], "a.docx", fail)
+        self.assertEqual(self.store._key_locks, {})
+        self.assertEqual(os.listdir(os.path.join(self.tmp, self.store.make_key({"period": "a"}, [1]))), [])
+
+    def test_index_is_shared_between_instances(self):
+        path = self._build("a")
+        other = ReportArtifactStore(self.settings)
+        self.assertEqual(other.get({"period": "a"}, [1]), path)
+
+    def test_dead_process_build_files_are_removed(self):
+        key_dir = os.path.join(self.tmp, "somekey")
+        os.makedirs(key_dir)
+        stale = os.path.join(key_dir, ".build-999999999-x.docx")
+        open(stale, "w").close()
+        ReportArtifactStore(self.settings)
+        self.assertFalse(os.path.exists(stale))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+# tests/test_rollups.py
+"""Триггеры предагрегатов: вставка, замена, обновление и удаление строк"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+import database as db
+
+DATES = ["2024-01-15T10:05:00", "2024-01-15T10:40:00", "2024-01-15T11:10:00", "2024-01-16T09:00:00"]
+
+
+class RollupTriggerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self._db_path = db.DB_PATH
+        db.close_all_connections()
+        db.DB_PATH = os.path.join(self.tmp, "engagement.db")
+        db.create_engagement_table()
+
+    def tearDown(self):
+        db.close_all_connections()
+        db.DB_PATH = self._db_path
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def assertRollupsMatchRows(self):
+        """Каждая таблица предагрегатов совпадает с пересчётом по engagement_data"""
+        for table, width in db.ROLLUP_TABLES.values():
+            aggregates = ["COUNT(*)"]
+            for m in db.ROLLUP_METRICS:
+                aggregates += [f"SUM({m})", f"SUM({m} * {m})", f"MIN({m})", f"MAX({m})"]
+            aggregates += [f"SUM({a} * {b})" for a, b in db.ROLLUP_PAIRS]
+            expected = db.execute_query(
+                f"SELECT channel, ts - ts % {width} AS bucket, {', '.join(aggregates)} "
+                f"FROM engagement_data GROUP BY channel, bucket ORDER BY channel, bucket")
+            actual = db.execute_query(
+                f"SELECT {', '.join(db.ROLLUP_COLUMNS)} FROM {table} ORDER BY channel, bucket")
+            self.assertEqual(actual, expected, table)
+
+    def test_insert(self):
+        db.insert_engagement_data("1", 10, 2, 1, "a", DATES[0])
+        db.insert_engagement_data("2", 3, 0, 4, "a", DATES[1])
+        db.insert_engagement_data("3", 7, 1, 0, "b", DATES[2])
+        self.assertRollupsMatchRows()
+
+    def test_replace_moves_values_and_extremes(self):
+        db.insert_engagement_data("1", 10, 2, 1, "a", DATES[0])
+        db.insert_engagement_data("2", 3, 0, 4, "a", DATES[1])
+        # Повторный замер поста: максимум бакета уменьшается
+        db.insert_engagement_data("1", 1, 0, 0, "a", DATES[0])
+        self.assertRollupsMatchRows()
+        # Тот же пост с другой датой переезжает в другой бакет
+        db.insert_engagement_data("1", 5, 5, 5, "a", DATES[3])
+        self.assertRollupsMatchRows()
+
+    def test_update(self):
+        db.insert_engagement_data("1", 10, 2, 1, "a", DATES[0])
+        db.insert_engagement_data("2", 3, 0, 4, "a", DATES[1])
+        db.execute_query("UPDATE engagement_data SET likes = 0 WHERE post_id = '1'", commit=True)
+        self.assertRollupsMatchRows()
+        db.execute_query("UPDATE engagement_data SET ts = ts + 86400, channel = 'b' WHERE post_id = '2'",
+                         commit=True)
+        self.assertRollupsMatchRows()
+
+    def test_delete_drops_empty_buckets(self):
+        db.insert_engagement_data("1", 10, 2, 1, "a", DATES[0])
+        db.insert_engagement_data("2", 3, 0, 4, "a", DATES[1])
+        db.execute_query("DELETE FROM engagement_data WHERE post_id = '1'", commit=True)
+        self.assertRollupsMatchRows()
+        db.execute_query("DELETE FROM engagement_data", commit=True)
+        for table, _ in db.ROLLUP_TABLES.values():
+            self.assertEqual(db.execute_query(f"SELECT COUNT(*) FROM {table}")[0][0], 0)
+
+    def test_random_changes(self):
+        rng = random.Random(7)
+        for step in range(300):
+            post_id = str(rng.randint(1, 40))
+            if rng.random() < 0.2:
+                db.execute_query("DELETE FROM engagement_data WHERE post_id = ?", (post_id,), commit=True)
+            else:
+                db.insert_engagement_data(post_id, rng.randint(0, 50), rng.randint(0, 5), rng.randint(0, 5),
+                                          rng.choice("ab"), rng.choice(DATES))
+        self.assertRollupsMatchRows()
+
+
+if __name__ == "__main__":
+    unittest.main()
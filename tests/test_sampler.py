@@ -0,0 +1,79 @@
+# tests/test_sampler.py
+"""Повторные замеры SnapshotSampler: ошибки пачки не теряют посты"""
+
+import asyncio
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from config import SAMPLER_SETTINGS
+from sampler import SnapshotSampler
+
+
+class _Message:
+    def __init__(self, message_id):
+        self.id = message_id
+        self.date = datetime.now(timezone.utc)
+        self.views = 10
+        self.forwards = 1
+        self.replies = None
+
+
+class _Client:
+    def __init__(self, fail_channels=()):
+        self.fail_channels = set(fail_channels)
+        self.calls = []
+
+    async def get_messages(self, entity, ids):
+        self.calls.append((entity, list(ids)))
+        if entity in self.fail_channels:
+            raise ConnectionError("flood")
+        return [_Message(message_id) for message_id in ids]
+
+
+class _Buffer:
+    def __init__(self):
+        self.rows = []
+
+    def add(self, **row):
+        self.rows.append(row)
+
+
+class SamplerTest(unittest.TestCase):
+    def _sampler(self, client, sink):
+        settings = dict(SAMPLER_SETTINGS, requests_per_minute=1000, batch_size=2)
+        sampler = SnapshotSampler(client, _Buffer(), snapshot_sink=sink, settings=settings)
+        published = datetime.now(timezone.utc) - timedelta(hours=1)
+        for channel in ("a", "b"):
+            for message_id in (1, 2, 3):
+                sampler.track(channel, message_id, published)
+        # Все посты созрели
+        sampler._queue = [(0, channel, message_id) for _, channel, message_id in sampler._queue]
+        return sampler
+
+    def _queued(self, sampler):
+        return sorted((channel, message_id) for _, channel, message_id in sampler._queue)
+
+    def test_sink_error_keeps_every_post_scheduled(self):
+        def sink(rows):
+            raise RuntimeError("database is locked")
+
+        sampler = self._sampler(_Client(), sink)
+        asyncio.run(sampler.run_once())
+        # Все пачки опрошены, несмотря на ошибку записи первой
+        self.assertEqual(len(sampler.client.calls), 4)
+        self.assertEqual(self._queued(sampler), sorted(sampler._published))
+        self.assertEqual(sampler.stats()["errors"], 4)
+
+    def test_fetch_error_retries_batch(self):
+        written = []
+        sampler = self._sampler(_Client(fail_channels={"a"}), written.extend)
+        asyncio.run(sampler.run_once())
+        self.assertEqual(sorted(row[1] for row in written), ["b", "b", "b"])
+        self.assertEqual(self._queued(sampler), sorted(sampler._published))
+        retry_at = min(due for due, channel, _ in sampler._queue if channel == "a")
+        self.assertLessEqual(retry_at, int(time.time()) + SAMPLER_SETTINGS["tick"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+# tests/test_sharding.py
+"""Распределение каналов по воркерам (rendezvous hashing)"""
+
+import unittest
+
+from sharding import shard_channels, worker_for_channel
+
+CHANNELS = [f"channel_{i}" for i in range(1000)]
+
+
+class ShardingTest(unittest.TestCase):
+    def test_every_channel_in_exactly_one_shard(self):
+        shards = shard_channels(CHANNELS, 4)
+        self.assertEqual(len(shards), 4)
+        self.assertEqual(sorted(c for shard in shards for c in shard), sorted(CHANNELS))
+        # Примерно равные шарды
+        for shard in shards:
+            self.assertGreater(len(shard), 200)
+
+    def test_assignment_does_not_depend_on_order(self):
+        self.assertEqual(
+            [sorted(shard) for shard in shard_channels(CHANNELS, 3)],
+            [sorted(shard) for shard in shard_channels(list(reversed(CHANNELS)), 3)]
+        )
+
+    def test_adding_worker_moves_only_its_share(self):
+        before = {c: worker_for_channel(c, 4) for c in CHANNELS}
+        after = {c: worker_for_channel(c, 5) for c in CHANNELS}
+        moved = [c for c in CHANNELS if before[c] != after[c]]
+        # Переезжают только каналы нового воркера: ~1/5 всех
+        self.assertTrue(all(after[c] == 4 for c in moved))
+        self.assertLess(len(moved), len(CHANNELS) * 0.3)
+
+    def test_removing_worker_moves_only_its_channels(self):
+        before = {c: worker_for_channel(c, 5) for c in CHANNELS}
+        after = {c: worker_for_channel(c, 4) for c in CHANNELS}
+        self.assertTrue(all(before[c] == 4 for c in CHANNELS if before[c] != after[c]))
+
+    def test_numeric_ids_and_single_worker(self):
+        self.assertEqual(worker_for_channel(-1001234567890, 3), worker_for_channel("-1001234567890", 3))
+        self.assertEqual(shard_channels(CHANNELS[:5], 0), [CHANNELS[:5]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+# tests/test_telegram_files.py
+"""Кэш file_id TelegramFileCache: ключ по содержимому, вытеснение, повторная загрузка"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from telegram.error import BadRequest
+
+from telegram_files import TelegramFileCache
+
+
+class _Document:
+    def __init__(self, file_id):
+        self.file_id = file_id
+
+
+class _Message:
+    def __init__(self, file_id):
+        self.document = _Document(file_id)
+
+
+class _Bot:
+    """Запоминает отправленные документы; file_id из rejected отвергаются"""
+
+    def __init__(self, rejected=()):
+        self.rejected = set(rejected)
+        self.sent = []
+
+    def send_document(self, chat_id, document, filename=None, caption=None):
+        if isinstance(document, str):
+            self.sent.append(("file_id", document))
+            if document in self.rejected:
+                raise BadRequest("Wrong file identifier")
+            return _Message(document)
+        self.sent.append(("upload", filename))
+        return _Message(f"id-{len(self.sent)}")
+
+
+class TelegramFileCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = TelegramFileCache({"enabled": True, "path": os.path.join(self.tmp, "files.db"),
+                                        "ttl": 3600, "max_entries": 2})
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _file(self, name: str, content: str) -> str:
+        path = os.path.join(self.tmp, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+    def test_repeated_send_uses_file_id(self):
+        bot = _Bot()
+        path = self._file("report.docx", "v1")
+        self.cache.send_document(bot, 1, path)
+        self.cache.send_document(bot, 2, path)
+        self.assertEqual(bot.sent, [("upload", "report.docx"), ("file_id", "id-1")])
+
+    def test_same_name_keeps_other_versions(self):
+        first = self.cache.content_hash(self._file("daily.docx", "v1"))
+        self.cache.put(first, "daily.docx", "id-1", 2)
+        # Другой отчёт под тем же именем (например, из другого каталога кэша)
+        second = self.cache.content_hash(self._file("other.docx", "v2"))
+        self.cache.put(second, "daily.docx", "id-2", 2)
+        self.assertEqual(self.cache.get(first), "id-1")
+        self.assertEqual(self.cache.get(second), "id-2")
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.put("a", "a.docx", "id-a", 1)
+        self.cache.put("b", "b.docx", "id-b", 1)
+        self.cache.get("a")
+        self.cache.put("c", "c.docx", "id-c", 1)
+        self.assertEqual(self.cache.get("a"), "id-a")
+        self.assertIsNone(self.cache.get("b"))
+
+    def test_expired_entry_is_dropped(self):
+        self.cache.put("a", "a.docx", "id-a", 1)
+        self.cache.settings["ttl"] = -1
+        self.assertIsNone(self.cache.get("a"))
+        self.cache.settings["ttl"] = 3600
+        self.assertIsNone(self.cache.get("a"))
+
+    def test_rejected_file_id_is_uploaded_again(self):
+        path = self._file("report.docx", "v1")
+        digest = self.cache.content_hash(path)
+        self.cache.put(digest, "report.docx", "stale", 2)
+        bot = _Bot(rejected={"stale"})
+        self.cache.send_document(bot, 1, path)
+        self.assertEqual(bot.sent, [("file_id", "stale"), ("upload", "report.docx")])
+        self.assertEqual(self.cache.get(digest), "id-2")
+
+
+if __name__ == "__main__":
+    unittest.main()